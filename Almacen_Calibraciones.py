@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+
+#################################################################
+# Almacén de calibraciones del filtro por familia de mercado
+#################################################################
+# Los mercados consecutivos de una misma familia (p.ej. "btc updown 15m") tienen
+# Q, R, sigma y Kappa muy parecidos, sobre todo a la misma hora del día. Guardar
+# la última calibración buena permite:
+#  - Empezar a cotizar casi sin calentamiento si hay una calibración reciente.
+#  - Arrancar la MLE desde la última solución (warm start) en lugar de desde cero.
+#
+# Formato (JSON): {familia: {franja: {'instante', 'Q', 'R', 'sigma', 'kappa'}}}
+# donde 'franja' es el índice del tramo horario (UTC) en el que se calibró.
+
+RUTA_ALMACEN = os.path.join("Data", "cache", "calibraciones.json")
+
+class AlmacenCalibraciones:
+    """
+    Calibraciones persistidas por (familia de mercado, franja horaria).
+    Es seguro usarlo desde varios hilos.
+    """
+
+    def __init__(self, ruta=RUTA_ALMACEN, minutos_por_franja=60):
+        """
+        :param ruta: Fichero JSON del almacén (None = solo memoria).
+        :param minutos_por_franja: Duración de cada franja horaria (UTC).
+        """
+        self.ruta = ruta
+        self.segundos_por_franja = minutos_por_franja * 60
+        self._datos = None
+        self._lock = threading.Lock()
+
+    def franja(self, instante):
+        """Índice de la franja horaria (UTC) de un instante epoch."""
+        return str(int((instante % 86400) // self.segundos_por_franja))
+
+    # ==============================================================================
+    # SECCIÓN: DISCO
+    # ==============================================================================
+
+    def _cargar(self):
+        """Lee el almacén de disco la primera vez que se necesita (llamar con el lock tomado)."""
+        if self._datos is not None: return
+        self._datos = {}
+        if not self.ruta or not os.path.exists(self.ruta): return
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                self._datos = json.load(f)
+        except (OSError, ValueError):
+            self._datos = {}
+
+    def _escribir(self):
+        """Escribe el almacén en disco de forma atómica (llamar con el lock tomado)."""
+        if not self.ruta: return
+        try:
+            os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+            temporal = f"{self.ruta}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(self._datos, f)
+            os.replace(temporal, self.ruta)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el almacén de calibraciones: {e}")
+
+    # ==============================================================================
+    # SECCIÓN: CONSULTAS
+    # ==============================================================================
+
+    def obtener(self, familia, instante=None, max_antiguedad=3600.0):
+        """
+        Calibración de la familia en la franja horaria de 'instante', si es reciente.
+
+        :param max_antiguedad: Segundos máximos desde que se guardó (None = sin límite).
+        :return: Diccionario {'instante', 'Q', 'R', 'sigma', 'kappa'} o None.
+        """
+        instante = time.time() if instante is None else instante
+        with self._lock:
+            self._cargar()
+            entrada = self._datos.get(familia, {}).get(self.franja(instante))
+        if entrada is None: return None
+        if max_antiguedad is not None and instante - entrada["instante"] > max_antiguedad:
+            return None
+        return entrada
+
+    def ultima(self, familia):
+        """Calibración más reciente de la familia en cualquier franja (punto de partida de la MLE)."""
+        with self._lock:
+            self._cargar()
+            entradas = list(self._datos.get(familia, {}).values())
+        return max(entradas, key=lambda e: e["instante"]) if entradas else None
+
+    def guardar(self, familia, Q_diag, R_diag, sigma, kappa=None, instante=None):
+        """
+        Guarda una calibración buena de la familia en la franja actual (sustituye la anterior).
+
+        :param kappa: Kappa base de la sesión (None = conservar el que hubiera guardado).
+        """
+        instante = time.time() if instante is None else instante
+        entrada = {
+            "instante": instante,
+            "Q": [float(q) for q in Q_diag], "R": [float(r) for r in R_diag], "sigma": float(sigma),
+            "kappa": float(kappa) if kappa is not None and np.isfinite(kappa) else None,
+        }
+        with self._lock:
+            self._cargar()
+            franjas = self._datos.setdefault(familia, {})
+            anterior = franjas.get(self.franja(instante))
+            if entrada["kappa"] is None and anterior is not None:
+                entrada["kappa"] = anterior.get("kappa")
+            franjas[self.franja(instante)] = entrada
+            self._escribir()
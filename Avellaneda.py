@@ -5,18 +5,40 @@ import numpy as np
 #################################################################
 
 class AvellanedaStrategy:
-    def __init__(self, gamma_base, tiempo_total, max_inventario):
+    def __init__(self, gamma_base, tiempo_total, max_inventario, n_capas=1, ticks_entre_capas=1,
+                 perfil_tamano=None, tick=0.01):
         """
         Inicializa la estrategia con los parámetros de riesgo y tiempo.
         
         :param gamma_base: Aversión al riesgo base.
         :param tiempo_total: Duración total de la sesión (para el horizonte de tiempo).
         :param max_inventario: Límite de inventario para frenar operaciones.
+        :param n_capas: Niveles de la escalera por lado (ver 'calcular_escalera').
+        :param ticks_entre_capas: Separación entre niveles consecutivos, en ticks.
+        :param perfil_tamano: Multiplicador del tamaño de cada nivel (None = todos iguales).
+        :param tick: Tamaño del tick del mercado (Polymarket: 0.01).
         """
         self.gamma_base = gamma_base
         self.tiempo_total = tiempo_total
         self.max_inventario = max_inventario
 
+        # Escalera de cotizaciones
+        if perfil_tamano is None: perfil_tamano = [1.0] * n_capas
+        if len(perfil_tamano) != n_capas:
+            raise ValueError(f"El perfil de tamaño tiene {len(perfil_tamano)} niveles y la escalera {n_capas}")
+        self.n_capas = n_capas
+        self.perfil_tamano = np.asarray(perfil_tamano, dtype=float)
+        self.ticks_por_unidad = round(1 / tick) # Precios como enteros de ticks: sin errores de redondeo
+        self._desplazamientos = np.arange(n_capas) * ticks_entre_capas
+
+        # Tablas por inventario (ver 'precalcular_tablas')
+        self._tablas = None
+        self.kappa_tablas = None
+        self.medir_desviacion = False
+        self.desviacion_max = 0.0
+        self._desviacion_acumulada = 0.0
+        self.estadisticas = {"consultas_tabla": 0, "consultas_directas": 0}
+
     def calcular_spread_optimo(self, inventario, precio_justo_kalman, kappa, sigma, tiempo_transcurrido):
         """
         Calcula el precio de reserva y el spread óptimo para una sola capa.
@@ -58,4 +80,130 @@ class AvellanedaStrategy:
         if inventario <= -self.max_inventario:
             ask_optimo = np.nan  # Inventario lleno (Short): Dejar de vender
 
-        return bid_optimo, ask_optimo, precio_reserva, gamma_actual
\ No newline at end of file
+        return bid_optimo, ask_optimo, precio_reserva, gamma_actual
+
+    def calcular_spread_optimo_lote(self, inventario, precio_justo_kalman, kappa, sigma, tiempo_transcurrido):
+        """
+        Versión vectorizada de 'calcular_spread_optimo': misma fórmula, en una sola
+        pasada sobre arrays (backtests, barridos de parámetros, escaleras de capas).
+        Los argumentos se combinan con broadcasting de NumPy, así que se pueden
+        mezclar arrays y escalares. Cada elemento da exactamente el mismo resultado
+        que la llamada escalar equivalente.
+
+        :return: Arrays (bid_optimo, ask_optimo, precio_reserva, gamma_actual);
+                 NaN en bid/ask donde salta el kill switch de inventario.
+        """
+        inventario = np.asarray(inventario, dtype=float)
+        precio_justo_kalman = np.asarray(precio_justo_kalman, dtype=float)
+        kappa = np.asarray(kappa, dtype=float)
+        sigma = np.asarray(sigma, dtype=float)
+        tiempo_transcurrido = np.asarray(tiempo_transcurrido, dtype=float)
+
+        # Mismos pasos (y mismo orden de operaciones) que la versión escalar
+        T_t = np.maximum((self.tiempo_total - tiempo_transcurrido) / self.tiempo_total, 0.001)
+        gamma_actual = self.gamma_base * np.exp(0.1 * np.abs(inventario))
+        penalizacion = inventario * gamma_actual * (sigma**2) * T_t
+        precio_reserva = precio_justo_kalman - penalizacion
+        spread_base = (1 / gamma_actual) * np.log(1 + gamma_actual / kappa) * (1 + sigma)
+
+        bid_optimo = precio_reserva - (spread_base / 2)
+        ask_optimo = precio_reserva + (spread_base / 2)
+
+        # Kill switch por inventario máximo
+        bid_optimo = np.where(inventario >= self.max_inventario, np.nan, bid_optimo)
+        ask_optimo = np.where(inventario <= -self.max_inventario, np.nan, ask_optimo)
+
+        return bid_optimo, ask_optimo, precio_reserva, gamma_actual
+
+    # ==============================================================================
+    # SECCIÓN: TABLAS PRECALCULADAS (FASE 3)
+    # ==============================================================================
+    # Dentro de una sesión gamma_base, tiempo_total, max_inventario y KAPPA_BASE son
+    # fijos y el inventario es un entero en [-max_inventario, max_inventario]: todo lo
+    # que depende solo del inventario se tabula una vez tras la Fase 2, y en cada tick
+    # solo se calculan los términos de sigma y del tiempo.
+
+    def precalcular_tablas(self, kappa, medir_desviacion=False):
+        """
+        Tabula gamma, q * gamma, el factor de spread log(1 + gamma/kappa) / gamma y las
+        máscaras del kill switch para cada inventario posible.
+
+        :param kappa: Kappa calibrado de la sesión (KAPPA_BASE).
+        :param medir_desviacion: Calcular también la fórmula directa en cada consulta
+                                 y registrar la diferencia (solo diagnóstico).
+        """
+        inventarios = np.arange(-int(self.max_inventario), int(self.max_inventario) + 1)
+        gamma = self.gamma_base * np.exp(0.1 * np.abs(inventarios.astype(float)))
+        # Se conservan los productos parciales de la fórmula escalar (mismo orden de
+        # operaciones), así que la cotización tabulada es idéntica a la directa
+        self._tablas = (
+            gamma.tolist(),
+            (inventarios * gamma).tolist(),
+            ((1 / gamma) * np.log(1 + gamma / kappa)).tolist(),
+            (inventarios < self.max_inventario).tolist(),   # Se puede comprar
+            (inventarios > -self.max_inventario).tolist(),  # Se puede vender
+        )
+        self.kappa_tablas = kappa
+        self.medir_desviacion = medir_desviacion
+
+    def cotizar(self, inventario, precio_justo_kalman, kappa, sigma, tiempo_transcurrido):
+        """
+        Igual que 'calcular_spread_optimo', pero servido desde las tablas cuando el
+        inventario es un entero dentro de rango y Kappa es el de las tablas; si no
+        (o si no se han precalculado), usa la fórmula directa.
+        """
+        indice = inventario + self.max_inventario
+        if (self._tablas is None or kappa != self.kappa_tablas or type(inventario) is not int
+                or not 0 <= indice < len(self._tablas[0])):
+            self.estadisticas["consultas_directas"] += 1
+            return self.calcular_spread_optimo(inventario, precio_justo_kalman, kappa, sigma, tiempo_transcurrido)
+
+        self.estadisticas["consultas_tabla"] += 1
+        gamma, penalizacion_q, factor_spread, puede_comprar, puede_vender = self._tablas
+        T_t = max((self.tiempo_total - tiempo_transcurrido) / self.tiempo_total, 0.001)
+        precio_reserva = precio_justo_kalman - penalizacion_q[indice] * (sigma**2) * T_t
+        spread_base = factor_spread[indice] * (1 + sigma)
+        bid_optimo = precio_reserva - (spread_base / 2) if puede_comprar[indice] else np.nan
+        ask_optimo = precio_reserva + (spread_base / 2) if puede_vender[indice] else np.nan
+
+        if self.medir_desviacion:
+            directo = self.calcular_spread_optimo(inventario, precio_justo_kalman, kappa, sigma, tiempo_transcurrido)
+            desviacion = max(abs(a - b) for a, b in zip((bid_optimo, ask_optimo, precio_reserva), directo)
+                             if not (np.isnan(a) and np.isnan(b)))
+            self.desviacion_max = max(self.desviacion_max, desviacion)
+            self._desviacion_acumulada += desviacion
+
+        return bid_optimo, ask_optimo, precio_reserva, gamma[indice]
+
+    @property
+    def desviacion_media(self):
+        """Desviación absoluta media frente a la fórmula directa (solo con 'medir_desviacion')."""
+        consultas = self.estadisticas["consultas_tabla"]
+        return self._desviacion_acumulada / consultas if consultas and self.medir_desviacion else 0.0
+
+    # ==============================================================================
+    # SECCIÓN: ESCALERA DE COTIZACIONES
+    # ==============================================================================
+
+    def calcular_escalera(self, bid_optimo, ask_optimo):
+        """
+        Escalera de 'n_capas' niveles por lado a partir de la cotización óptima.
+        El nivel 0 es la cotización redondeada al tick sin mejorarla (bid hacia abajo,
+        ask hacia arriba) y cada nivel siguiente se aleja 'ticks_entre_capas' ticks.
+        Los niveles fuera de (0, 1) y los lados bloqueados (NaN) quedan a NaN.
+        Acepta escalares o arrays de cotizaciones: la escalera se añade como último eje.
+
+        :return: (bids, asks, perfil_tamano), con bids/asks de forma (..., n_capas).
+        """
+        escala = self.ticks_por_unidad
+        bid = np.asarray(bid_optimo, dtype=float)[..., None]
+        ask = np.asarray(ask_optimo, dtype=float)[..., None]
+
+        # El 1e-9 absorbe el error de coma flotante de precios que ya están en el tick (0.29 * 100 = 28.999...)
+        ticks_bid = np.floor(bid * escala + 1e-9) - self._desplazamientos
+        ticks_ask = np.ceil(ask * escala - 1e-9) + self._desplazamientos
+
+        with np.errstate(invalid="ignore"): # Comparaciones con NaN (lado bloqueado)
+            bids = np.where((ticks_bid >= 1) & (ticks_bid <= escala - 1), ticks_bid / escala, np.nan)
+            asks = np.where((ticks_ask >= 1) & (ticks_ask <= escala - 1), ticks_ask / escala, np.nan)
+        return bids, asks, self.perfil_tamano
@@ -0,0 +1,378 @@
+import sys
+import json
+import time
+import numpy as np
+
+import Decodificador_WS
+from Rastreador_Polymarket import RastreadorPolymarket
+from Libro_Ordenes import LibroOrdenes
+from Kalman_Filter import KalmanMLECalibrator, FiltroKalmanAdaptativo, CacheGananciasKalman
+from Volatilidad_Movil import VolatilidadMovil, VolatilidadEWMA
+from Avellaneda import AvellanedaStrategy
+
+#################################################################
+# Micro-benchmarks del bot (python Benchmarks.py [nombre])
+#################################################################
+
+# ==============================================================================
+# SECCIÓN: DATOS DE PRUEBA
+# ==============================================================================
+
+def generar_libros_sinteticos(n_libros=500, niveles_por_lado=40, semilla=0):
+    """
+    Genera mensajes 'book' con el mismo formato que el WebSocket de Polymarket.
+    El volumen de cada nivel sigue A * exp(-k * delta) con ruido log-normal,
+    así se conoce el Kappa verdadero con el que se generó cada libro.
+
+    :return: Lista de (evento_book, kappa_real).
+    """
+    rng = np.random.default_rng(semilla)
+    libros = []
+    for _ in range(n_libros):
+        kappa_real = rng.uniform(5, 60)
+        A = rng.uniform(200, 5000)
+        mid = round(rng.uniform(0.2, 0.8), 2)
+        deltas = 0.01 * np.arange(niveles_por_lado)
+
+        def _lado(signo):
+            niveles = []
+            for d in deltas:
+                precio = round(mid + signo * (0.01 + d), 2)
+                if not 0 < precio < 1: continue
+                size = A * np.exp(-kappa_real * d) * rng.lognormal(0, 0.3)
+                niveles.append({"price": f"{precio:.2f}", "size": f"{size:.2f}"})
+            return niveles
+
+        evento = {"event_type": "book", "asset_id": "SINTETICO", "market": "0x0",
+                  "bids": _lado(-1)[::-1], "asks": _lado(1)[::-1], "timestamp": "0"}
+        libros.append((evento, kappa_real))
+    return libros
+
+def generar_frames_sinteticos(n_frames=2000, semilla=0):
+    """
+    Genera frames crudos (texto JSON) con la mezcla típica del canal 'market':
+    un snapshot 'book' cada 20 frames y 'price_change' de 1-3 niveles en el resto.
+    """
+    rng = np.random.default_rng(semilla)
+    libros = generar_libros_sinteticos(n_frames // 20 + 1, semilla=semilla)
+    frames = []
+    for i in range(n_frames):
+        if i % 20 == 0:
+            frames.append(json.dumps(libros[i // 20][0]))
+            continue
+        cambios = [{"asset_id": "SINTETICO", "price": f"{rng.integers(1, 100) / 100:.2f}",
+                    "size": f"{rng.uniform(0, 3000):.2f}", "side": "BUY" if rng.random() < 0.5 else "SELL",
+                    "hash": "0x0", "best_bid": "0.49", "best_ask": "0.51"}
+                   for _ in range(rng.integers(1, 4))]
+        frames.append(json.dumps({"market": "0x0", "price_changes": cambios,
+                                  "timestamp": "0", "event_type": "price_change"}))
+    return frames
+
+def generar_calentamiento_sintetico(n_ticks=20, semilla=0):
+    """
+    Genera un calentamiento (WMP, VolDiff) como paseos aleatorios,
+    con las mismas escalas que los datos reales de la Fase 1.
+    """
+    rng = np.random.default_rng(semilla)
+    wmp = np.clip(0.5 + np.cumsum(rng.normal(0, 0.005, n_ticks)), 0.01, 0.99)
+    vol_diff = np.cumsum(rng.normal(0, 50, n_ticks))
+    return wmp, vol_diff
+
+def _cronometrar(funcion, argumentos, repeticiones=1):
+    """
+    Ejecuta 'funcion' sobre cada argumento y devuelve (resultados, µs medios por llamada).
+    Con varias repeticiones se toma la más rápida (menos ruido del sistema).
+    """
+    mejor = np.inf
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultados = [funcion(*a) for a in argumentos]
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return resultados, mejor / len(argumentos) * 1e6
+
+# ==============================================================================
+# SECCIÓN: BENCHMARKS
+# ==============================================================================
+
+def benchmark_kappa(n_libros=500):
+    """Compara velocidad y precisión de 'curve_fit' frente al ajuste 'log_lineal'."""
+    argumentos, kappas_reales = [], []
+    for evento, kappa_real in generar_libros_sinteticos(n_libros):
+        libro = LibroOrdenes()
+        libro.aplicar_snapshot(*Decodificador_WS.niveles_a_arrays(evento["bids"]),
+                               *Decodificador_WS.niveles_a_arrays(evento["asks"]))
+        argumentos.append((*libro.arrays_bid(), *libro.arrays_ask(), libro.mejor_bid, libro.mejor_ask))
+        kappas_reales.append(kappa_real)
+    kappas_reales = np.array(kappas_reales)
+
+    resultados = {}
+    for metodo in ("curve_fit", "log_lineal"):
+        tracker = RastreadorPolymarket("benchmark", metodo_kappa=metodo)
+        kappas, us = _cronometrar(tracker._estimar_kappa, argumentos)
+        resultados[metodo] = np.array(kappas, dtype=float)
+        error_real = np.nanmedian(np.abs(resultados[metodo] / kappas_reales - 1))
+        print(f"  {metodo:<11} {us:9.1f} µs/libro | error relativo mediano vs Kappa real: {error_real:.2%}")
+
+    diferencia = np.nanmedian(np.abs(resultados["log_lineal"] / resultados["curve_fit"] - 1))
+    print(f"  Diferencia relativa mediana log_lineal vs curve_fit: {diferencia:.2%}")
+
+def _decodificar_original(msg):
+    """
+    Réplica del camino anterior: json.loads y conversiones float() repetidas
+    sobre los strings en cada uso (mejor precio, volúmenes y arrays para Kappa).
+    """
+    data = json.loads(msg)
+    for ev in (data if isinstance(data, list) else [data]):
+        if ev.get("event_type") != "book": continue
+        bids, asks = ev.get("bids", []), ev.get("asks", [])
+        max([float(b["price"]) for b in bids]) if bids else 0
+        min([float(a["price"]) for a in asks]) if asks else 0
+        np.array([float(a['price']) for a in asks]); np.array([float(a['size']) for a in asks])
+        np.array([float(b['price']) for b in bids]); np.array([float(b['size']) for b in bids])
+        sum([float(b.get("size", 0)) for b in bids]); sum([float(a.get("size", 0)) for a in asks])
+    return data
+
+def benchmark_decodificacion(frames=None):
+    """
+    Coste de decodificación por frame: camino original frente a 'Decodificador_WS'
+    (con la librería estándar y, si está instalado, con orjson).
+    Se separan los snapshots 'book' del resto de frames.
+
+    :param frames: Lista de frames crudos (por defecto, frames sintéticos).
+    """
+    frames = frames if frames is not None else generar_frames_sinteticos()
+    grupos = {
+        "book": [(f,) for f in frames if '"book"' in f],
+        "resto": [(f,) for f in frames if '"book"' not in f],
+        "todos": [(f,) for f in frames],
+    }
+
+    decodificadores = [("original (json + float repetido)", _decodificar_original, None),
+                       ("Decodificador_WS (json)", Decodificador_WS.decodificar_frame, False)]
+    if Decodificador_WS.ORJSON_AVAILABLE:
+        decodificadores.append(("Decodificador_WS (orjson)", Decodificador_WS.decodificar_frame, True))
+
+    orjson_original = Decodificador_WS.ORJSON_AVAILABLE
+    try:
+        for nombre, funcion, usar_orjson in decodificadores:
+            if usar_orjson is not None:
+                Decodificador_WS.ORJSON_AVAILABLE = usar_orjson
+            tiempos = []
+            for grupo, argumentos in grupos.items():
+                if not argumentos: continue
+                _, us = _cronometrar(funcion, argumentos, repeticiones=5)
+                tiempos.append(f"{grupo} {us:6.1f}")
+            print(f"  {nombre:<34} µs/frame -> " + " | ".join(tiempos))
+    finally:
+        Decodificador_WS.ORJSON_AVAILABLE = orjson_original
+
+def benchmark_kalman(n_ticks=(20, 100), n_parametros=50):
+    """
+    Compara la log-likelihood escalar por bloques con la de pykalman:
+    diferencia máxima sobre parámetros aleatorios, µs por evaluación y duración de 'fit'.
+    """
+    rng = np.random.default_rng(0)
+    for n in n_ticks:
+        calibrador = KalmanMLECalibrator(*generar_calentamiento_sintetico(n))
+        argumentos = [(10 ** rng.uniform(-6, 1, 6),) for _ in range(n_parametros)]
+
+        ll_escalar, us_escalar = _cronometrar(calibrador._log_likelihood, argumentos, repeticiones=5)
+        ll_pykalman, us_pykalman = _cronometrar(calibrador._log_likelihood_pykalman, argumentos)
+        error = np.max(np.abs(np.array(ll_escalar) - ll_pykalman) / np.maximum(np.abs(ll_pykalman), 1))
+
+        inicio = time.perf_counter()
+        calibrador.fit()
+        ms_fit = (time.perf_counter() - inicio) * 1e3
+        print(f"  {n:4d} ticks | escalar {us_escalar:8.1f} µs | pykalman {us_pykalman:9.1f} µs "
+              f"| x{us_pykalman / us_escalar:5.0f} | error relativo máx {error:.1e} | fit {ms_fit:7.1f} ms")
+
+def benchmark_calibracion(n_series=8, n_ticks=20, n_lote=512):
+    """
+    'fit' (un arranque) frente a 'fit_multiarranque' sobre varios calentamientos sintéticos:
+    coste final (log-likelihood negativa, menor es mejor) y duración. Incluye el coste
+    por vector de la evaluación vectorizada en lote.
+    """
+    mejoras, tiempos_fit, tiempos_multi = [], [], []
+    for semilla in range(n_series):
+        calibrador = KalmanMLECalibrator(*generar_calentamiento_sintetico(n_ticks, semilla=semilla))
+
+        inicio = time.perf_counter()
+        coste_fit = calibrador._log_likelihood(np.concatenate(calibrador.fit()))
+        tiempos_fit.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        coste_multi = calibrador._log_likelihood(np.concatenate(calibrador.fit_multiarranque()))
+        tiempos_multi.append(time.perf_counter() - inicio)
+        mejoras.append(coste_fit - coste_multi)
+
+    lote = 10 ** np.random.default_rng(0).uniform(-6, 3, size=(n_lote, 6))
+    _, us_lote = _cronometrar(calibrador._log_likelihood_lote, [(lote,)], repeticiones=5)
+    print(f"  fit {np.mean(tiempos_fit) * 1e3:6.1f} ms | multiarranque {np.mean(tiempos_multi) * 1e3:6.1f} ms "
+          f"| mejora del coste: media {np.mean(mejoras):.2f}, mín {np.min(mejoras):.2f} "
+          f"| lote {us_lote / n_lote:5.2f} µs/vector")
+
+def _filtro_matricial(wmp, vol_diff, Q_base_diag, R_base_diag):
+    """Filtro adaptativo de 4 estados con matrices (implementación original de la Fase 3)."""
+    F = np.array([[1, 1, 0, 0], [0, 1, 0, 0], [0, 0, 1, 1], [0, 0, 0, 1]])
+    H = np.array([[1, 0, 0, 0], [0, 0, 1, 0]])
+    I = np.eye(4)
+    estado = {"mean": np.array([wmp[0], 0, vol_diff[0], 0]), "cov": np.eye(4)}
+
+    def actualizar(wmp_obs, vol_diff_obs, factor_q, factor_r):
+        z_t = np.array([wmp_obs, vol_diff_obs])
+        Q_dynamic = np.diag(Q_base_diag) * factor_q
+        R_dynamic = np.diag(R_base_diag) * factor_r
+        predicted_state_mean = F @ estado["mean"]
+        predicted_state_cov = F @ estado["cov"] @ F.T + Q_dynamic
+        innovation = z_t - H @ predicted_state_mean
+        innovation_cov = H @ predicted_state_cov @ H.T + R_dynamic
+        kalman_gain = predicted_state_cov @ H.T @ np.linalg.inv(innovation_cov)
+        estado["mean"] = predicted_state_mean + kalman_gain @ innovation
+        estado["cov"] = (I - kalman_gain @ H) @ predicted_state_cov
+        return estado["mean"][0]
+    return actualizar
+
+def benchmark_filtro_kalman(n_ticks=5000):
+    """Coste por actualización del filtro en vivo: matricial 4x4 frente a 'FiltroKalmanAdaptativo'."""
+    wmp, vol_diff = generar_calentamiento_sintetico(n_ticks, semilla=1)
+    rng = np.random.default_rng(1)
+    Q_base_diag, R_base_diag = [1e-5, 1e-6, 100.0, 50.0], [1e-4, 500.0]
+    argumentos = [(w, d, 1 + rng.uniform(0, 2), 1 + rng.uniform(0, 2)) for w, d in zip(wmp, vol_diff)]
+
+    matricial = _filtro_matricial(wmp, vol_diff, Q_base_diag, R_base_diag)
+    precios_matricial, us_matricial = _cronometrar(matricial, argumentos)
+
+    filtro = FiltroKalmanAdaptativo(wmp[0], vol_diff[0])
+    filtro.configurar(Q_base_diag, R_base_diag)
+    precios_escalar, us_escalar = _cronometrar(filtro.actualizar, argumentos)
+
+    identicos = np.array_equal(precios_matricial, precios_escalar)
+    print(f"  matricial {us_matricial:6.2f} µs/tick | escalar {us_escalar:6.2f} µs/tick "
+          f"| x{us_matricial / us_escalar:4.1f} | resultados idénticos: {identicos}")
+
+def benchmark_cache_kalman(n_ticks=5000, capacidad=64, paso=0.01, repeticiones=30):
+    """
+    Filtro exacto frente al filtro con caché de ganancias estacionarias, con los factores
+    de Config calculados como en la Fase 3: sigma móvil del precio filtrado (ventana de
+    Config) y un spread en ticks de 0.01 que cambia de vez en cuando. 'misma celda' es la
+    fracción de ticks cuyos factores caen en la celda del tick anterior (el acierto barato).
+    """
+    import Config
+    wmp, vol_diff = generar_calentamiento_sintetico(n_ticks, semilla=2)
+    wmp, vol_diff = wmp.tolist(), vol_diff.tolist() # Floats de Python, como los del rastreador
+    Q_base_diag, R_base_diag = [1e-5, 1e-6, 100.0, 50.0], [1e-4, 500.0]
+    rng = np.random.default_rng(2)
+    referencia = FiltroKalmanAdaptativo(wmp[0], vol_diff[0])
+    referencia.configurar(Q_base_diag, R_base_diag)
+    volatilidad = VolatilidadMovil(Config.ROLLING_VOL_WINDOW)
+    spread = 0.01
+    argumentos = []
+    for w, d in zip(wmp, vol_diff):
+        if rng.random() < 0.1:
+            spread = float(rng.choice([0.01, 0.02, 0.03, 0.04], p=[0.6, 0.25, 0.1, 0.05]))
+        argumentos.append((w, d, 1 + volatilidad.sigma * Config.Q_FACTOR_VOL, 1 + spread * Config.R_FACTOR_SPREAD))
+        volatilidad.actualizar(referencia.actualizar(*argumentos[-1]))
+    celdas = [(round(fq / paso), round(fr / paso)) for _, _, fq, fr in argumentos]
+    misma_celda = np.mean([a == b for a, b in zip(celdas, celdas[1:])])
+
+    exacto = FiltroKalmanAdaptativo(wmp[0], vol_diff[0])
+    exacto.configurar(Q_base_diag, R_base_diag)
+    cache = CacheGananciasKalman(capacidad, paso)
+    con_cache = FiltroKalmanAdaptativo(wmp[0], vol_diff[0], cache)
+    con_cache.configurar(Q_base_diag, R_base_diag)
+    # Repeticiones alternadas (el ruido del sistema afecta por igual a las dos versiones) y sin el
+    # coste del propio bucle de medida, del orden del paso del filtro
+    us_exacto = us_cache = us_vacio = np.inf
+    for _ in range(repeticiones):
+        us_vacio = min(us_vacio, _cronometrar(lambda *_: None, argumentos)[1])
+        us_exacto = min(us_exacto, _cronometrar(exacto.actualizar, argumentos)[1])
+        us_cache = min(us_cache, _cronometrar(con_cache.actualizar, argumentos)[1])
+    us_exacto -= us_vacio
+    us_cache -= us_vacio
+
+    medido = FiltroKalmanAdaptativo(wmp[0], vol_diff[0], CacheGananciasKalman(capacidad, paso), medir_error=True)
+    medido.configurar(Q_base_diag, R_base_diag)
+    for a in argumentos: medido.actualizar(*a)
+
+    print(f"  exacto {us_exacto:5.2f} µs/tick | caché {us_cache:5.2f} µs/tick | x{us_exacto / us_cache:4.2f} "
+          f"| aciertos {cache.tasa_aciertos:.1%} (misma celda {misma_celda:.1%}) "
+          f"| error precio medio {medido.error_medio:.1e}, máx {medido.error_max:.1e}")
+
+def benchmark_volatilidad(n_ticks=200000, ventana=20):
+    """
+    Sigma móvil de la Fase 3: expresión original (np.std sobre la cola de la lista)
+    frente a 'VolatilidadMovil' y 'VolatilidadEWMA'. 'n_ticks' simula una sesión
+    de varias horas para comprobar que el error de redondeo no se acumula.
+    """
+    # Paseo aleatorio en logit: el precio nunca se queda pegado a 0 o 1 en sesiones largas
+    rng = np.random.default_rng(3)
+    precios = (1 / (1 + np.exp(-np.cumsum(rng.normal(0, 0.02, n_ticks))))).tolist()
+
+    def original(i):
+        window = min(i, ventana)
+        return np.std(np.diff(precios[i - window:i])) if window > 1 else 0.0
+
+    referencia, us_original = _cronometrar(original, [(i,) for i in range(1, n_ticks + 1)])
+
+    movil = VolatilidadMovil(ventana)
+    _, us_movil = _cronometrar(movil.actualizar, [(p,) for p in precios])
+    movil = VolatilidadMovil(ventana)
+    sigmas = np.array([movil.actualizar(p) for p in precios])
+    referencia = np.array(referencia)
+    error = np.abs(sigmas - referencia)[ventana:] / referencia[ventana:]
+
+    ewma = VolatilidadEWMA(ventana)
+    _, us_ewma = _cronometrar(ewma.actualizar, [(p,) for p in precios])
+
+    print(f"  np.std {us_original:5.2f} µs/tick | ventana O(1) {us_movil:5.2f} µs/tick (x{us_original / us_movil:.0f}) "
+          f"| ewma {us_ewma:5.2f} µs/tick | error relativo máx {error.max():.1e} en {n_ticks} ticks")
+
+def benchmark_avellaneda(n_estados=100000):
+    """
+    Estrategia sobre muchos estados (inventario, precio, kappa, sigma, tiempo):
+    una llamada escalar por estado frente a 'calcular_spread_optimo_lote'.
+    """
+    rng = np.random.default_rng(4)
+    estrategia = AvellanedaStrategy(gamma_base=0.1, tiempo_total=900, max_inventario=20)
+    inventario = rng.integers(-25, 26, n_estados)
+    precio = rng.uniform(0.01, 0.99, n_estados)
+    kappa = rng.uniform(1, 500, n_estados)
+    sigma = np.abs(rng.normal(0.003, 0.002, n_estados))
+    tiempo = rng.uniform(0, 1000, n_estados)
+
+    argumentos = list(zip(inventario.tolist(), precio.tolist(), kappa.tolist(), sigma.tolist(), tiempo.tolist()))
+    escalar, us_escalar = _cronometrar(estrategia.calcular_spread_optimo, argumentos)
+
+    inicio = time.perf_counter()
+    lote = estrategia.calcular_spread_optimo_lote(inventario, precio, kappa, sigma, tiempo)
+    us_lote = (time.perf_counter() - inicio) / n_estados * 1e6
+
+    identicos = all(np.array_equal(a, b, equal_nan=True) for a, b in zip(np.array(escalar).T, lote))
+    print(f"  escalar {us_escalar:6.3f} µs/estado | lote {us_lote:6.3f} µs/estado (x{us_escalar / us_lote:.0f}) "
+          f"| resultados idénticos: {identicos}")
+
+    # Tablas por inventario: Kappa fijo de la sesión e inventario dentro de rango, como en la Fase 3
+    argumentos = [(int(np.clip(q, -20, 20)), p, 50.0, s, t) for q, p, _, s, t in argumentos]
+    directo, us_directo = _cronometrar(estrategia.calcular_spread_optimo, argumentos)
+    estrategia.precalcular_tablas(50.0)
+    tabulado, us_tabla = _cronometrar(estrategia.cotizar, argumentos)
+    identicos = np.array_equal(np.array(directo, dtype=float), np.array(tabulado, dtype=float), equal_nan=True)
+    print(f"  directo {us_directo:6.3f} µs/tick | tablas {us_tabla:6.3f} µs/tick (x{us_directo / us_tabla:.1f}) "
+          f"| resultados idénticos: {identicos}")
+
+BENCHMARKS = {
+    "kappa": benchmark_kappa,
+    "decodificacion": benchmark_decodificacion,
+    "kalman": benchmark_kalman,
+    "filtro_kalman": benchmark_filtro_kalman,
+    "cache_kalman": benchmark_cache_kalman,
+    "calibracion": benchmark_calibracion,
+    "volatilidad": benchmark_volatilidad,
+    "avellaneda": benchmark_avellaneda,
+}
+
+if __name__ == "__main__":
+    nombres = sys.argv[1:] or list(BENCHMARKS)
+    for nombre in nombres:
+        print(f"--- {nombre} ---")
+        BENCHMARKS[nombre]()
@@ -10,15 +10,58 @@ TIEMPO_TOTAL = 180
 # 0.5s significa que el bot "piensa" y recalcula 2 veces por segundo.
 INTERVALO_TICK = 0.5  
 
+# Modo por eventos: el bot se despierta en cuanto cambia el libro del token
+# que sigue (sin esperar al siguiente tick). Si es False se usa INTERVALO_TICK.
+MODO_EVENTOS = True
+
+# Intervalo mínimo (segundos) entre dos recálculos de cotizaciones en modo por eventos.
+# 0 = reaccionar a cada cambio del libro.
+INTERVALO_MIN_RECOTIZACION = 0.0
+
+# Antigüedad máxima (segundos) de los datos del libro para seguir cotizando.
+# Si la conexión cae o deja de responder, el bot retira sus órdenes y no vuelve
+# a cotizar hasta que el rastreador se reconecta y recibe un snapshot nuevo.
+MAX_ANTIGUEDAD_DATOS = 10.0
+
 # Identificador único del mercado en Polymarket (se saca de la URL).
 # En este caso: Un mercado de Bitcoin (Up/Down) de 15 minutos.
 SLUG_MERCADO = "btc updown 15m 1765197000?" 
 
+# --- Rollover entre ventanas consecutivas (solo 'ejecutar_sesiones_continuas') ---
+# Duración de cada ventana de mercado en segundos (mercados de 15 minutos).
+DURACION_VENTANA = 900
+
+# Segundos antes del cierre de la ventana en los que se suscribe el siguiente mercado
+# y se empieza a recoger su calentamiento (debe dar tiempo a completar WARMUP_TICKS).
+ANTELACION_ROLLOVER = 60
+
+# Segundos antes del cierre en los que se deja de operar el mercado que expira.
+MARGEN_CIERRE_VENTANA = 5
+
 # --- Gestión de Datos ---
+# Grabar cada frame crudo del WebSocket (comprimido, con marca de tiempo en ns)
+# para poder reproducir la sesión exactamente después.
+GRABAR_MERCADO = False
+
+# Carpeta donde se guardan las capturas (bloques .gz + índice por activo y tiempo).
+DIRECTORIO_CAPTURAS = "Data/capturas"
+
+# Reproducir una captura en lugar de conectarse al mercado (None = en vivo).
+# Ej: "Data/capturas". La sesión usa un reloj virtual: mismos resultados en cada ejecución.
+REPRODUCIR_CAPTURA = None
+
+# Velocidad de la reproducción: 1 = tiempo real, 10 = diez veces más rápido, None = lo más rápido posible.
+VELOCIDAD_REPRODUCCION = None
+
 # Tamaño de la ventana para calcular la volatilidad móvil.
 # Mira los últimos 20 precios para decidir qué tan "nervioso" está el mercado.
 ROLLING_VOL_WINDOW = 20 
 
+# Cómo se mide esa volatilidad (se actualiza en O(1) con cada precio nuevo):
+# "ventana" = desviación típica de los incrementos en la ventana (igual que np.std).
+# "ewma"    = media móvil exponencial con span ROLLING_VOL_WINDOW (reacciona antes a cambios de régimen).
+METODO_VOLATILIDAD = "ventana"
+
 # Duración de la Fase 1 (Calentamiento).
 # Número de datos que recolecta para calibrar el modelo antes de empezar a operar.
 WARMUP_TICKS = 20 
@@ -45,6 +88,33 @@ GAMMA_BASE = 0.001
 # - Kappa bajo: Mercado fácil de mover (poca liquidez).
 KAPPA_FALLBACK = 50 
 
+# Método de estimación de Kappa a partir de la forma del libro.
+# - "curve_fit": Ajuste no lineal con SciPy (preciso pero lento, ~ms por mensaje).
+# - "log_lineal": Mínimos cuadrados ponderados sobre ln(volumen), en forma cerrada (µs por mensaje).
+METODO_KAPPA = "curve_fit"
+
+# Segundos mínimos entre dos estimaciones de Kappa del mismo activo.
+# 0 = recalcular en cada mensaje. Con un valor > 0 una ráfaga de mensajes reutiliza el último ajuste.
+INTERVALO_KAPPA = 0.0
+
+# Fuente de Kappa para la estrategia.
+# - "libro": Forma del libro de órdenes (media del Warmup, fija durante la Fase 3).
+# - "trades": Intensidad de ejecuciones reales ('last_trade_price') por distancia al mid,
+#             con decaimiento exponencial. Se actualiza también durante la Fase 3.
+FUENTE_KAPPA = "libro"
+
+# Escalera de cotizaciones: niveles por lado alrededor de la cotización óptima.
+# El nivel 0 es la cotización óptima redondeada al tick; cada nivel siguiente se aleja TICKS_ENTRE_CAPAS ticks.
+# Con varios niveles hay profundidad en reposo y se captura más flujo por cada recotización.
+N_CAPAS = 1
+TICKS_ENTRE_CAPAS = 1
+
+# Multiplicador de SIZE_USDC para cada nivel (None = todos iguales). Ej: [1.0, 1.5, 2.0] con N_CAPAS = 3.
+PERFIL_TAMANO_CAPAS = None
+
+# Tamaño del tick de precio del mercado.
+TICK_PRECIO = 0.01
+
 # ==============================================================================
 # PARÁMETROS DEL FILTRO DE KALMAN ADAPTATIVO (CEREBRO)
 # ==============================================================================
@@ -55,6 +125,41 @@ Q_BASE_DIAG = None # Incertidumbre del modelo (cuánto cambia el precio real).
 R_BASE_DIAG = None # Ruido de medición (cuánto miente el precio observado).
 SIGMA_BASE = None  # Volatilidad base inicial.
 
+# Calibración (MLE) fuera del bucle de eventos, para que el WebSocket siga leyendo mientras tanto.
+# True = en otro proceso (no comparte el GIL). False = en un hilo.
+CALIBRAR_EN_PROCESO = True
+
+# Segundos máximos de la calibración. Si se superan se siguen usando los parámetros de respaldo.
+TIMEOUT_CALIBRACION = 60.0
+
+# False = esperar a la calibración antes de cotizar (el libro se sigue actualizando).
+# True  = cotizar desde el primer momento con los parámetros de respaldo y pasar
+#         a los calibrados en cuanto estén listos.
+COTIZAR_DURANTE_CALIBRACION = False
+
+# Parámetros de respaldo (mientras no hay calibración o si esta falla).
+Q_BASE_FALLBACK = [0.01, 0.01, 0.1, 0.1]
+R_BASE_FALLBACK = [0.1, 1.0]
+
+# Calibración global: criba vectorizada de muchos candidatos y L-BFGS-B desde los mejores.
+# Evita los óptimos degenerados de un único punto de partida (Q_v en el límite, R enorme).
+CALIBRACION_MULTIARRANQUE = False
+
+# Segundos máximos de la calibración multiarranque (se queda con el mejor resultado hasta entonces).
+PRESUPUESTO_CALIBRACION = 1.0
+
+# Almacén de calibraciones por familia de mercado y franja horaria (Data/cache/calibraciones.json).
+# Cada calibración buena se guarda; la MLE arranca desde la última y, si hay una reciente de la
+# misma franja, se cotiza con ella casi sin calentamiento y se recalibra en segundo plano.
+USAR_ALMACEN_CALIBRACIONES = False
+
+# Segundos que una calibración guardada se considera reciente.
+MAX_ANTIGUEDAD_CALIBRACION = 3600.0
+
+# Ticks de calentamiento cuando hay una calibración reciente. Mientras la ventana de volatilidad
+# no está llena se cotiza con la sigma guardada en la calibración.
+WARMUP_TICKS_CALIBRACION_CACHEADA = 2
+
 # Multiplicadores de Adaptabilidad Dinámica
 # Controlan qué tan sensible es el filtro a los cambios del mercado en vivo.
 
@@ -66,6 +171,25 @@ R_FACTOR_SPREAD = 50.0
 # Efecto: El filtro se vuelve más rápido para seguir la nueva tendencia.
 Q_FACTOR_VOL = 30.0
 
+# Caché de ganancias estacionarias del filtro (regímenes de volatilidad/spread repetidos).
+# 0 = filtro exacto en cada tick. N > 0 = guarda hasta N regímenes y, cuando uno se repite,
+# usa su ganancia ya convergida en lugar de la recursión de covarianza (aproximación).
+CACHE_GANANCIAS_KALMAN = 0
+
+# Resolución con la que se agrupan los multiplicadores de Q y R (son >= 1: 0.01 = error <= 1%).
+PASO_CACHE_KALMAN = 0.01
+
+# Ejecutar también el filtro exacto para medir el error de la caché (solo diagnóstico).
+MEDIR_ERROR_CACHE_KALMAN = False
+
+# Tablas de la estrategia: gamma, penalización y factor de spread por inventario se calculan
+# una vez tras la calibración (Kappa fijo) y cada tick solo añade los términos de sigma y tiempo.
+# Si Kappa cambia en vivo (FUENTE_KAPPA = "trades") se usa la fórmula directa.
+USAR_TABLAS_ESTRATEGIA = True
+
+# Calcular también la fórmula directa en cada tick y medir la diferencia (solo diagnóstico).
+MEDIR_DESVIACION_TABLAS = False
+
 # ==============================================================================
 # CONFIGURACIÓN DE EJECUCIÓN (REAL vs SIMULACIÓN)
 # ==============================================================================
@@ -77,4 +201,12 @@ MODO_REAL = False
 
 # Tamaño de la apuesta por orden en USDC (Solo afecta si MODO_REAL = True)
 # Ejemplo: 1.0 significa que cada orden de compra/venta será de 1 USDC.
-SIZE_USDC = 1.0
\ No newline at end of file
+SIZE_USDC = 1.0
+
+# Las órdenes reales se actualizan por diferencias: solo se cancela/coloca lo que cambia tras redondear
+# al tick. Las ejecuciones no se ven localmente, así que cada X segundos se consultan las órdenes abiertas.
+INTERVALO_RECONCILIACION_ORDENES = 30.0
+
+# Una orden ejecutada en parte se conserva con lo que le queda (mantiene su prioridad en la cola).
+# True = se cancela y se vuelve a colocar con el tamaño completo de la escalera.
+REPONER_ORDENES_PARCIALES = False
\ No newline at end of file
@@ -0,0 +1,125 @@
+import json
+import numpy as np
+
+# Importación opcional de orjson (decodificador JSON en Rust, varias veces más rápido)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+#################################################################
+# Decodificación de mensajes del WebSocket de Polymarket
+#################################################################
+# Convierte cada frame crudo en eventos normalizados en los que los precios y
+# tamaños ya son números (float), parseados UNA sola vez. El resto del bot
+# (libro de órdenes, Kappa, métricas) solo trabaja con estos valores numéricos.
+#
+# Eventos normalizados:
+#   {"event_type": "book", "asset_id": str,
+#    "bids": (precios, tamaños), "asks": (precios, tamaños)}      <- arrays float64
+#   {"event_type": "price_change", "cambios": [(asset_id, lado, precio, tamaño), ...]}
+#   {"event_type": "last_trade_price", "asset_id": str, "precio": float, "timestamp": float | None}
+#
+# Los eventos (o cambios de un 'price_change') mal formados -campos que faltan, nulos, lado
+# desconocido o precios no numéricos- se descartan uno a uno sin perder el resto del frame.
+
+LADOS_VALIDOS = ("BUY", "SELL")
+
+# Errores de un evento mal formado al normalizarlo
+ERRORES_EVENTO = (KeyError, TypeError, ValueError, AttributeError)
+
+def cargar_json(msg):
+    """
+    Decodifica un frame JSON con orjson si está disponible (si no, con la librería estándar).
+    Lanza ValueError si el frame no es JSON válido (json.JSONDecodeError y
+    orjson.JSONDecodeError heredan de ValueError).
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.loads(msg)
+    return json.loads(msg)
+
+def niveles_a_arrays(niveles):
+    """
+    Convierte la lista de niveles [{'price': str, 'size': str}, ...] en dos arrays float64.
+
+    :return: (precios, tamaños)
+    """
+    precios = np.array([n["price"] for n in niveles], dtype=float)
+    sizes = np.array([n["size"] for n in niveles], dtype=float)
+    return precios, sizes
+
+def _normalizar_cambio(c, asset_id=None):
+    """
+    Un cambio de nivel de un 'price_change' -> (asset_id, lado, precio, tamaño).
+    Lanza uno de ERRORES_EVENTO si está mal formado.
+    """
+    asset_id = c.get("asset_id", asset_id)
+    lado = c["side"].upper()
+    if asset_id is None or lado not in LADOS_VALIDOS:
+        raise ValueError(f"Cambio de nivel inválido: {c}")
+    return (asset_id, lado, float(c["price"]), float(c.get("size", 0)))
+
+def _normalizar_evento(ev, estadisticas):
+    """Un evento JSON -> evento normalizado (None si el bot no usa ese tipo o no queda nada válido)."""
+    tipo = ev.get("event_type")
+    if tipo == "book":
+        if ev.get("asset_id") is None:
+            raise ValueError("Snapshot sin asset_id")
+        return {
+            "event_type": "book",
+            "asset_id": ev["asset_id"],
+            "bids": niveles_a_arrays(ev.get("bids", [])),
+            "asks": niveles_a_arrays(ev.get("asks", [])),
+        }
+    elif tipo == "price_change":
+        # Formato con lista 'price_changes' (un asset_id por cambio) o el antiguo 'asset_id' + 'changes'
+        if "price_changes" in ev:
+            crudos, asset_id = ev["price_changes"], None
+        else:
+            crudos, asset_id = ev.get("changes", []), ev.get("asset_id")
+        cambios = []
+        for c in crudos:
+            try:
+                cambios.append(_normalizar_cambio(c, asset_id))
+            except ERRORES_EVENTO:
+                if estadisticas is not None: estadisticas["eventos_invalidos"] += 1
+        return {"event_type": "price_change", "cambios": cambios} if cambios else None
+    elif tipo == "last_trade_price":
+        if ev.get("asset_id") is None:
+            raise ValueError("Trade sin asset_id")
+        return {
+            "event_type": "last_trade_price",
+            "asset_id": ev["asset_id"],
+            "precio": float(ev["price"]),
+            # Marca de tiempo del exchange en ms -> segundos
+            "timestamp": float(ev["timestamp"]) / 1000 if ev.get("timestamp") else None,
+        }
+    return None
+
+def normalizar_eventos(data, estadisticas=None):
+    """
+    Convierte el JSON ya decodificado (un evento o una lista de eventos) en eventos normalizados.
+    Los tipos de evento que el bot no usa se descartan.
+    
+    :param estadisticas: Diccionario opcional donde contar en 'eventos_invalidos' los eventos
+                         (o cambios de nivel) mal formados que se descartan.
+    """
+    eventos = data if isinstance(data, list) else [data]
+    normalizados = []
+    for ev in eventos:
+        try:
+            normalizado = _normalizar_evento(ev, estadisticas)
+        except ERRORES_EVENTO:
+            if estadisticas is not None: estadisticas["eventos_invalidos"] += 1
+            continue
+        if normalizado is not None:
+            normalizados.append(normalizado)
+    return normalizados
+
+def decodificar_frame(msg, estadisticas=None):
+    """
+    Frame crudo del WebSocket -> lista de eventos normalizados.
+    Lanza ValueError si el frame no es JSON válido.
+    """
+    return normalizar_eventos(cargar_json(msg), estadisticas)
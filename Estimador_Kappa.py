@@ -0,0 +1,126 @@
+import math
+import numpy as np
+
+#################################################################
+# Estimadores rápidos de KAPPA (densidad de liquidez)
+#################################################################
+
+def ajustar_kappa_log_lineal(distancias, volumenes, pesos=None):
+    """
+    Ajuste en forma cerrada del perfil de liquidez V(delta) = A * exp(-k * delta).
+
+    Tomando logaritmos el modelo es lineal: ln V = ln A - k * delta, y se resuelve
+    con mínimos cuadrados ponderados (sin iteraciones, solo productos de NumPy).
+    Se pondera con V^2 para que el ajuste se parezca al de 'curve_fit' sobre la
+    escala original (los niveles grandes pesan más que los casi vacíos).
+
+    :param distancias: Array de distancias al mejor precio (delta > 0).
+    :param volumenes: Array de volúmenes en cada nivel (V > 0).
+    :param pesos: Pesos opcionales de cada punto (por defecto V^2).
+    :return: (A, k). Devuelve (np.nan, np.nan) si el sistema es degenerado.
+    """
+    log_v = np.log(volumenes)
+    if pesos is None:
+        pesos = volumenes * volumenes
+    suma_pesos = pesos.sum()
+    if not suma_pesos > 0:
+        return np.nan, np.nan
+
+    # Medias ponderadas
+    media_x = (pesos @ distancias) / suma_pesos
+    media_y = (pesos @ log_v) / suma_pesos
+
+    # Pendiente = Cov_w(x, ln V) / Var_w(x)
+    dx = distancias - media_x
+    sxx = pesos @ (dx * dx)
+    if not sxx > 0:
+        return np.nan, np.nan
+    pendiente = (pesos @ (dx * (log_v - media_y))) / sxx
+
+    A = np.exp(media_y - pendiente * media_x)
+    return A, -pendiente
+
+
+#################################################################
+# Clase EstimadorKappaTrades (Kappa online a partir de ejecuciones)
+#################################################################
+
+class EstimadorKappaTrades:
+    """
+    Estima Kappa a partir de la LLEGADA DE EJECUCIONES (eventos 'last_trade_price'),
+    que es lo que realmente modela Avellaneda-Stoikov: la intensidad de fills
+    lambda(delta) = A * exp(-k * delta) a una distancia delta del precio medio.
+
+    Cuenta las ejecuciones por cubos de distancia (1 tick por cubo) con
+    decaimiento exponencial en el tiempo, de modo que los trades antiguos pesan
+    menos. Cada trade cuesta O(1); el ajuste solo se hace al consultar Kappa
+    y opera sobre un número fijo de cubos.
+    """
+
+    def __init__(self, vida_media=60.0, tick=0.01, n_cubos=10, min_trades=5.0):
+        """
+        :param vida_media: Segundos tras los cuales el peso de un trade se reduce a la mitad.
+        :param tick: Anchura de cada cubo de distancia (tick de precio de Polymarket).
+        :param n_cubos: Número de cubos (distancia máxima considerada = n_cubos * tick).
+        :param min_trades: Peso efectivo mínimo de trades para dar una estimación.
+        """
+        self.tau = vida_media / math.log(2)
+        self.tick = tick
+        self.n_cubos = n_cubos
+        self.min_trades = min_trades
+
+        # Conteos escalados por exp((t - t_ref) / tau): sumar un trade es O(1)
+        # y el decaimiento de todos los cubos se aplica solo al leerlos.
+        self._conteos = [0.0] * n_cubos
+        self._t_ref = None
+        self._t_ultimo = None
+
+        # Distancias representativas (centro de cada cubo)
+        self._distancias = (np.arange(n_cubos) + 0.5) * tick
+
+    def registrar_trade(self, precio, mid, instante):
+        """
+        Registra una ejecución.
+
+        :param precio: Precio de la ejecución.
+        :param mid: Precio medio del libro en el momento del trade.
+        :param instante: Marca de tiempo del trade en segundos.
+        """
+        cubo = int(abs(precio - mid) / self.tick + 1e-9)
+        if cubo >= self.n_cubos:
+            return
+
+        if self._t_ref is None:
+            self._t_ref = instante
+        elif instante - self._t_ref > 50 * self.tau:
+            # Re-escalar para que exp() no desborde en sesiones largas (poco frecuente)
+            factor = math.exp(-(instante - self._t_ref) / self.tau)
+            self._conteos = [c * factor for c in self._conteos]
+            self._t_ref = instante
+
+        self._conteos[cubo] += math.exp((instante - self._t_ref) / self.tau)
+        self._t_ultimo = instante if self._t_ultimo is None else max(self._t_ultimo, instante)
+
+    def intensidades(self, instante=None):
+        """Devuelve el array de conteos decaídos por cubo, evaluados en 'instante' (o en el último trade)."""
+        if self._t_ref is None:
+            return np.zeros(self.n_cubos)
+        if instante is None:
+            instante = self._t_ultimo
+        return np.array(self._conteos) * math.exp(-(instante - self._t_ref) / self.tau)
+
+    def kappa(self, instante=None):
+        """
+        Ajusta ln(lambda) = ln(A) - k * delta sobre los cubos con ejecuciones.
+        Devuelve np.nan si aún no hay suficiente información.
+        """
+        lam = self.intensidades(instante)
+        validos = lam > 0
+        if lam.sum() < self.min_trades or np.count_nonzero(validos) < 2:
+            return np.nan
+
+        # Ponderamos por la intensidad (varianza de ln(conteo) ~ 1 / conteo)
+        _, k = ajustar_kappa_log_lineal(self._distancias[validos], lam[validos], pesos=lam[validos])
+        if not k >= 1e-4:
+            return np.nan
+        return k
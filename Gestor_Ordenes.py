@@ -0,0 +1,195 @@
+import math
+import time
+
+#################################################################
+# Gestor de órdenes por diferencias (sobre 'GestorWallet')
+#################################################################
+# En lugar de cancelar todo y volver a publicar la escalera en cada tick, se
+# guarda localmente qué órdenes hay vivas (token, lado, precio) y solo se
+# cancela lo que sobra y se coloca lo que falta. Una recotización que, tras
+# redondear al tick, deja los mismos precios no cuesta ninguna llamada y las
+# órdenes que siguen en su precio conservan la prioridad en la cola.
+#
+# Las ejecuciones reales no llegan por aquí: un trade del mercado a uno de
+# nuestros precios (ver 'registrar_trades'), un error o el paso del tiempo
+# marcan el token y su estado local se rehace con las órdenes abiertas del CLOB
+# (cantidad pendiente = original - ejecutada).
+#
+# Los tamaños se comparan como los deja el constructor de órdenes del CLOB
+# (truncados a 2 decimales, no redondeados): si no, un nivel cuyo tamaño
+# redondeado y truncado difieren no coincidiría nunca y se repondría en cada tick.
+
+# Órdenes por petición de lote al publicar (MAX_ORDENES_POR_LOTE de 'Gestor_Wallet')
+ORDENES_POR_LOTE = 15
+
+class GestorOrdenes:
+    """
+    Estado local de las órdenes vivas y sincronización mínima con el exchange.
+    """
+
+    def __init__(self, wallet, intervalo_reconciliacion=30.0, tick=0.01, reloj=None, reponer_parciales=False):
+        """
+        :param wallet: 'GestorWallet' conectado.
+        :param intervalo_reconciliacion: Segundos entre dos reconciliaciones con el CLOB.
+        :param tick: Tick de precio (las cotizaciones se comparan ya redondeadas).
+        :param reloj: Objeto con 'ahora()' (p.ej. el reloj del rastreador). None = time.time.
+        :param reponer_parciales: True = una orden ejecutada en parte se cancela y se vuelve a colocar
+                                  con el tamaño completo. False = se conserva (y su prioridad en la
+                                  cola) con lo que le queda hasta que se ejecute del todo o el nivel cambie.
+        """
+        self.wallet = wallet
+        self.intervalo_reconciliacion = intervalo_reconciliacion
+        self.decimales = max(round(-math.log10(tick)), 0)
+        self.ahora = reloj.ahora if reloj is not None else time.time
+        self.reponer_parciales = reponer_parciales
+
+        self._vivas = {} # token_id -> {(lado, precio): (order_id, cantidad_original, cantidad_pendiente)}
+        self._ultima_reconciliacion = {} # token_id -> instante
+        self._reconciliar = set() # Tokens cuyo estado local puede no ser fiable
+
+        self.estadisticas = {
+            "recotizaciones": 0, "sin_cambios": 0, "ordenes_conservadas": 0,
+            "parciales_conservadas": 0,        # Niveles conservados aunque estén ejecutados en parte
+            "cancelaciones": 0, "colocaciones": 0, "reconciliaciones": 0,
+            "invalidaciones_por_trade": 0,     # Reconciliaciones pedidas por un trade a un precio nuestro
+            "llamadas_api": 0,                 # Peticiones enviadas de verdad (reconciliaciones incluidas)
+            "llamadas_reenvio_en_lote": 0,     # Las que habría hecho cancelar todo + reenviar la escalera en lote
+        }
+
+    @property
+    def llamadas_ahorradas(self):
+        """Peticiones ahorradas frente a cancelar todo y reenviar la escalera en lote en cada recotización."""
+        return self.estadisticas["llamadas_reenvio_en_lote"] - self.estadisticas["llamadas_api"]
+
+    # ==============================================================================
+    # SECCIÓN: SINCRONIZACIÓN
+    # ==============================================================================
+
+    @staticmethod
+    def tamano(cantidad):
+        """Tamaño efectivo de una orden: truncado a 2 decimales como hace el constructor del CLOB."""
+        return math.floor(round(cantidad * 100, 6)) / 100
+
+    def _sin_cambios(self, orden, cantidad):
+        """True si la orden viva 'orden' ya cubre un nivel cuyo tamaño objetivo es 'cantidad'."""
+        _, original, pendiente = orden
+        if abs(original - cantidad) > 1e-9:
+            return False # Se colocó para otro tamaño
+        return pendiente >= original - 1e-9 or not self.reponer_parciales
+
+    def sincronizar(self, token_id, objetivo):
+        """
+        Lleva las órdenes vivas del token a las cotizaciones objetivo con el mínimo de llamadas.
+
+        :param objetivo: Lista de (lado, precio, cantidad_shares) con lado "BUY"/"SELL".
+        :return: Lista con el orderID de cada cotización objetivo colocada en ESTA llamada (None si
+                 ya estaba viva y se conserva, o si no se pudo colocar).
+        """
+        deseadas = {}
+        for lado, precio, cantidad in objetivo:
+            deseadas[(lado.upper(), round(precio, self.decimales))] = self.tamano(cantidad)
+        self.estadisticas["recotizaciones"] += 1
+        # Referencia: cancelar todo + publicar en lote las órdenes que 'GestorWallet' aceptaría
+        validas = sum(1 for _, precio in deseadas if 0 < precio < 1)
+        self.estadisticas["llamadas_reenvio_en_lote"] += 1 + math.ceil(validas / ORDENES_POR_LOTE)
+
+        if (token_id in self._reconciliar
+                or self.ahora() - self._ultima_reconciliacion.get(token_id, -math.inf) >= self.intervalo_reconciliacion):
+            self.reconciliar(token_id)
+        vivas = self._vivas.setdefault(token_id, {})
+
+        # Sobra lo que ya no se cotiza o se cotiza con otro tamaño (p.ej. el precio pasó a otro nivel)
+        a_cancelar = [clave for clave, orden in vivas.items()
+                      if clave not in deseadas or not self._sin_cambios(orden, deseadas[clave])]
+        conservadas = [clave for clave in deseadas if clave in vivas and clave not in a_cancelar]
+        self.estadisticas["ordenes_conservadas"] += len(conservadas)
+        self.estadisticas["parciales_conservadas"] += sum(1 for clave in conservadas
+                                                          if vivas[clave][2] < vivas[clave][1] - 1e-9)
+        if a_cancelar:
+            self._cancelar(token_id, a_cancelar)
+        # Un nivel cuya cancelación no se confirmó sigue en 'vivas': no se duplica (lo arregla la reconciliación)
+        a_colocar = [clave for clave in deseadas if clave not in vivas]
+
+        nuevas = {}
+        if a_colocar:
+            lotes_previos = self.wallet.lotes_enviados
+            ids = self.wallet.colocar_ordenes([(token_id, precio, deseadas[(lado, precio)], lado)
+                                               for lado, precio in a_colocar])
+            self.estadisticas["llamadas_api"] += self.wallet.lotes_enviados - lotes_previos
+            for clave, order_id in zip(a_colocar, ids):
+                if order_id:
+                    vivas[clave] = (order_id, deseadas[clave], deseadas[clave])
+                    nuevas[clave] = order_id
+                    self.estadisticas["colocaciones"] += 1
+        elif not a_cancelar:
+            self.estadisticas["sin_cambios"] += 1
+
+        return [nuevas.get((lado.upper(), round(precio, self.decimales))) for lado, precio, _ in objetivo]
+
+    def _cancelar(self, token_id, claves):
+        """
+        Cancela en una sola llamada las órdenes de 'claves'. Solo se quitan del estado local
+        las que el servidor confirma como canceladas; si hay dudas, el token se reconcilia.
+        """
+        vivas = self._vivas[token_id]
+        ids = {vivas[clave][0]: clave for clave in claves}
+        self.estadisticas["llamadas_api"] += 1
+        respuesta = self.wallet.cancelar_ordenes(list(ids))
+        canceladas = set(respuesta.get("canceled") or []) if isinstance(respuesta, dict) else set()
+        for order_id in canceladas & ids.keys():
+            vivas.pop(ids[order_id])
+        self.estadisticas["cancelaciones"] += len(canceladas & ids.keys())
+        if len(canceladas & ids.keys()) < len(ids):
+            # Error de red o 'not_canceled' (p.ej. ya ejecutada): el estado local se rehace desde el CLOB
+            self._reconciliar.add(token_id)
+
+    def registrar_trades(self, token_id, precios):
+        """
+        Trades del mercado desde la última recotización (p.ej. 'consumir_precios_trade' del rastreador).
+        Un trade a un precio en el que tenemos una orden viva puede haberla ejecutado (del todo o en
+        parte), así que el token se reconcilia en la próxima recotización en lugar de esperar al intervalo.
+        """
+        precios_vivos = {precio for _, precio in self._vivas.get(token_id, {})}
+        if precios_vivos.intersection(round(p, self.decimales) for p in precios):
+            if token_id not in self._reconciliar:
+                self.estadisticas["invalidaciones_por_trade"] += 1
+            self._reconciliar.add(token_id)
+
+    def cancelar_todo(self):
+        """Cancela todas las órdenes (pausas y cierre) y vacía el estado local."""
+        self.estadisticas["llamadas_api"] += 1
+        if not self.wallet.cancelar_todas_las_ordenes():
+            self._reconciliar.update(self._vivas) # Puede que quede alguna viva
+        self._vivas = {}
+
+    # ==============================================================================
+    # SECCIÓN: RECONCILIACIÓN
+    # ==============================================================================
+
+    def reconciliar(self, token_id):
+        """
+        Rehace el estado local del token con sus órdenes abiertas en el CLOB. Se guarda la cantidad
+        original y la pendiente (original - ejecutada); qué se hace con una orden ejecutada en parte
+        lo decide 'reponer_parciales' en la siguiente sincronización.
+        """
+        self.estadisticas["llamadas_api"] += 1
+        self.estadisticas["reconciliaciones"] += 1
+        self._ultima_reconciliacion[token_id] = self.ahora()
+        abiertas = self.wallet.obtener_ordenes_abiertas(token_id)
+        if abiertas is None: return # Error de red: se reintenta en la próxima recotización
+        self._reconciliar.discard(token_id)
+
+        vivas = {}
+        duplicadas = []
+        for orden in abiertas:
+            clave = (orden["side"].upper(), round(float(orden["price"]), self.decimales))
+            if clave in vivas:
+                duplicadas.append(orden["id"]) # Dos órdenes al mismo precio: se deja solo una
+                continue
+            original = float(orden["original_size"])
+            pendiente = original - float(orden.get("size_matched") or 0)
+            vivas[clave] = (orden["id"], self.tamano(original), round(pendiente, 2))
+        self._vivas[token_id] = vivas
+        if duplicadas:
+            self.estadisticas["llamadas_api"] += 1
+            self.wallet.cancelar_ordenes(duplicadas)
@@ -2,8 +2,12 @@ import os
 from dotenv import load_dotenv
 from py_clob_client.client import ClobClient
 # Importaciones necesarias para operar
-from py_clob_client.clob_types import OrderArgs, OrderType, AssetType, BalanceAllowanceParams
+from py_clob_client.clob_types import OrderArgs, OrderType, AssetType, BalanceAllowanceParams, PostOrdersArgs, OpenOrderParams
 from py_clob_client.constants import POLYGON
+from py_clob_client.order_builder.constants import BUY, SELL
+
+# Máximo de órdenes por petición de lote que acepta el CLOB
+MAX_ORDENES_POR_LOTE = 15
 
 # Cargar variables de entorno (Private Key)
 load_dotenv()
@@ -25,6 +29,7 @@ class GestorWallet:
             raise ValueError("ERROR CRÍTICO: No se encontró 'PK_POLYMARKET' en el archivo .env")
 
         print("[WALLET] Conectando a Polymarket (Polygon)...")
+        self.lotes_enviados = 0 # Peticiones 'post_orders' enviadas (llamadas reales a la API)
         
         # 1. Inicializar cliente con la Private Key
         self.client = ClobClient(
@@ -81,6 +86,31 @@ class GestorWallet:
             # print(f"[WALLET] Info cancelacion: {e}")
             return False
 
+    def cancelar_ordenes(self, order_ids):
+        """
+        Cancela un conjunto concreto de órdenes en una sola petición.
+        
+        :param order_ids: Lista de orderID.
+        :return: Respuesta del servidor ({'canceled': [...], 'not_canceled': {...}}) o None si falla.
+        """
+        try:
+            return self.client.cancel_orders(order_ids)
+        except Exception as e:
+            print(f"[WALLET] Error cancelando {len(order_ids)} órdenes: {e}")
+            return None
+
+    def obtener_ordenes_abiertas(self, token_id):
+        """
+        Órdenes abiertas de un token (para reconciliar el estado local con el CLOB).
+        
+        :return: Lista de órdenes ('id', 'side', 'price', 'original_size', 'size_matched', ...) o None si falla.
+        """
+        try:
+            return self.client.get_orders(OpenOrderParams(asset_id=token_id))
+        except Exception as e:
+            print(f"[WALLET] Error consultando órdenes abiertas: {e}")
+            return None
+
     def colocar_orden(self, token_id, precio, cantidad_shares, lado):
         """
         Envía una orden LIMIT al libro de órdenes.
@@ -99,8 +129,8 @@ class GestorWallet:
             if cantidad_shares <= 0:
                 return None
 
-            # 2. Configurar tipo de orden
-            side_enum = OrderType.BUY if lado.upper() == "BUY" else OrderType.SELL
+            # 2. Configurar lado de la orden ('OrderType' es GTC/FOK/..., no el lado)
+            side_enum = BUY if lado.upper() == "BUY" else SELL
             
             # 3. Construir payload
             order_args = OrderArgs(
@@ -124,6 +154,51 @@ class GestorWallet:
             print(f"[WALLET] Excepción crítica al ordenar: {e}")
             return None
 
+    def colocar_ordenes(self, ordenes):
+        """
+        Envía varias órdenes LIMIT (p.ej. una escalera de cotizaciones) en peticiones de lote:
+        se firman todas y se publican juntas con 'post_orders' en lugar de una petición por orden.
+        
+        Cada petición enviada suma uno a 'lotes_enviados' (las órdenes que no se pudieron firmar no cuentan).
+        
+        :param ordenes: Lista de (token_id, precio, cantidad_shares, lado).
+        :return: Lista con el orderID de cada orden (None si no se envió o fue rechazada), en el mismo orden.
+        """
+        ids = [None] * len(ordenes)
+        firmadas = [] # (posición en 'ordenes', PostOrdersArgs)
+        for i, (token_id, precio, cantidad_shares, lado) in enumerate(ordenes):
+            precio = round(precio, 2) # Polymarket solo acepta 2 decimales
+            if precio <= 0 or precio >= 1 or cantidad_shares <= 0:
+                continue
+            try:
+                order_args = OrderArgs(
+                    price=precio,
+                    size=cantidad_shares,
+                    side=BUY if lado.upper() == "BUY" else SELL,
+                    token_id=token_id
+                )
+                firmadas.append((i, PostOrdersArgs(order=self.client.create_order(order_args), orderType=OrderType.GTC)))
+            except Exception as e:
+                print(f"[WALLET] Excepción firmando la orden {lado} @ {precio}: {e}")
+        
+        for inicio in range(0, len(firmadas), MAX_ORDENES_POR_LOTE):
+            lote = firmadas[inicio:inicio + MAX_ORDENES_POR_LOTE]
+            self.lotes_enviados += 1
+            try:
+                respuestas = self.client.post_orders([args for _, args in lote])
+            except Exception as e:
+                print(f"[WALLET] Excepción crítica al enviar el lote: {e}")
+                continue
+            if not isinstance(respuestas, list):
+                print(f"[WALLET] Respuesta inesperada al lote de órdenes: {respuestas}")
+                continue
+            for (i, _), resp in zip(lote, respuestas):
+                if resp and resp.get("success"):
+                    ids[i] = resp.get("orderID")
+                else:
+                    print(f"[WALLET] Orden rechazada por el servidor: {resp.get('errorMsg') if resp else resp}")
+        return ids
+
 # Bloque de prueba (Solo se ejecuta si corres este archivo directamente)
 if __name__ == "__main__":
     try:
@@ -0,0 +1,209 @@
+import os
+import re
+import gzip
+import json
+import time
+import struct
+import asyncio
+
+#################################################################
+# Grabación de los frames crudos del WebSocket
+#################################################################
+# Guarda EXACTAMENTE lo que envía el exchange, con la marca de tiempo de
+# recepción en nanosegundos, para poder reproducir una sesión después.
+#
+# Formato (solo se añade, nunca se reescribe):
+#   <directorio>/bloque_<t_inicio_ns>.gz   Bloques de captura. Cada volcado es un
+#                                          miembro gzip independiente con registros
+#                                          binarios [ns: int64][longitud: uint32][frame utf-8].
+#   <directorio>/indice.jsonl              Una línea JSON por volcado: fichero, offset del
+#                                          miembro, rango de tiempos, nº de frames y activos.
+#   <directorio>/mercados.json             Eventos de la gamma API de los mercados grabados
+#                                          (mismo formato que la caché de 'Metadatos_Mercado').
+# Con el índice se puede leer un rango de tiempo o un activo descomprimiendo
+# solo los volcados que lo contienen.
+
+CABECERA_REGISTRO = struct.Struct("<qI")
+PATRON_ASSET_ID = re.compile(r'"asset_id"\s*:\s*"([^"]+)"')
+FICHERO_INDICE = "indice.jsonl"
+FICHERO_MERCADOS = "mercados.json"
+
+class GrabadorMercado:
+    """
+    Grabador de frames con escritura en segundo plano.
+    'registrar' solo añade el frame a un buffer en memoria; una tarea aparte
+    comprime y escribe los lotes en un hilo, sin bloquear el bucle de eventos.
+    """
+
+    def __init__(self, directorio=os.path.join("Data", "capturas"), intervalo_volcado=1.0,
+                 max_frames_buffer=5000, frames_por_bloque=200000, segundos_por_bloque=900):
+        """
+        :param directorio: Carpeta de la captura.
+        :param intervalo_volcado: Segundos entre volcados a disco.
+        :param max_frames_buffer: Frames pendientes que fuerzan un volcado anticipado.
+        :param frames_por_bloque: Frames tras los que se empieza un bloque nuevo.
+        :param segundos_por_bloque: Duración máxima de un bloque.
+        """
+        self.directorio = directorio
+        self.intervalo_volcado = intervalo_volcado
+        self.max_frames_buffer = max_frames_buffer
+        self.frames_por_bloque = frames_por_bloque
+        self.segundos_por_bloque = segundos_por_bloque
+
+        self._buffer = [] # Lista de (ns de recepción, frame)
+        self._hay_volcado = asyncio.Event()
+        self._tarea = None
+        self._activo = False
+
+        # Bloque en curso
+        self._ruta_bloque = None
+        self._frames_bloque = 0
+        self._inicio_bloque_ns = 0
+
+        self.estadisticas = {"frames_grabados": 0, "volcados": 0, "bytes_escritos": 0}
+
+    # ==============================================================================
+    # SECCIÓN: CAPTURA (BUCLE DE EVENTOS)
+    # ==============================================================================
+
+    def registrar(self, frame):
+        """Añade un frame crudo con su instante de recepción. Coste O(1), sin E/S."""
+        self._buffer.append((time.time_ns(), frame))
+        if len(self._buffer) >= self.max_frames_buffer:
+            self._hay_volcado.set()
+
+    def registrar_mercado(self, slug, evento):
+        """
+        Guarda los metadatos (sub-mercados, IDs de tokens) de un mercado grabado,
+        para que la captura se pueda reproducir sin consultar la API.
+        Se hace una vez por mercado: el fichero es pequeño y se escribe directamente.
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = os.path.join(self.directorio, FICHERO_MERCADOS)
+        mercados = {}
+        if os.path.exists(ruta):
+            with open(ruta, encoding="utf-8") as f:
+                mercados = json.load(f)
+        mercados[slug] = {"instante": time.time(), "evento": evento}
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(mercados, f)
+
+    def iniciar(self):
+        """Lanza la tarea de escritura (idempotente)."""
+        if self._tarea is not None and not self._tarea.done(): return
+        self._activo = True
+        self._tarea = asyncio.create_task(self._escritor())
+
+    async def cerrar(self):
+        """Vuelca lo pendiente y detiene la tarea de escritura."""
+        self._activo = False
+        self._hay_volcado.set()
+        if self._tarea is not None:
+            await self._tarea
+            self._tarea = None
+
+    async def _escritor(self):
+        """Cada 'intervalo_volcado' segundos (o antes si el buffer se llena) escribe el lote pendiente."""
+        while True:
+            try:
+                await asyncio.wait_for(self._hay_volcado.wait(), self.intervalo_volcado)
+            except asyncio.TimeoutError:
+                pass
+            self._hay_volcado.clear()
+
+            if self._buffer:
+                lote, self._buffer = self._buffer, []
+                try:
+                    await asyncio.to_thread(self._escribir_lote, lote)
+                except OSError as e:
+                    print(f"⚠️ Error grabando la captura ({len(lote)} frames perdidos): {e}")
+
+            if not self._activo and not self._buffer:
+                break
+
+    # ==============================================================================
+    # SECCIÓN: ESCRITURA (HILO)
+    # ==============================================================================
+
+    def _escribir_lote(self, lote):
+        """Comprime el lote como un miembro gzip, lo añade al bloque actual y lo indexa."""
+        os.makedirs(self.directorio, exist_ok=True)
+        inicio_ns = lote[0][0]
+        if (self._ruta_bloque is None or self._frames_bloque >= self.frames_por_bloque
+                or inicio_ns - self._inicio_bloque_ns >= self.segundos_por_bloque * 1e9):
+            self._ruta_bloque = os.path.join(self.directorio, f"bloque_{inicio_ns}.gz")
+            self._frames_bloque = 0
+            self._inicio_bloque_ns = inicio_ns
+
+        partes = []
+        activos = set()
+        for ns, frame in lote:
+            datos = frame.encode("utf-8") if isinstance(frame, str) else frame
+            partes.append(CABECERA_REGISTRO.pack(ns, len(datos)))
+            partes.append(datos)
+            activos.update(PATRON_ASSET_ID.findall(frame if isinstance(frame, str) else frame.decode("utf-8", "replace")))
+        comprimido = gzip.compress(b"".join(partes), compresslevel=6)
+
+        with open(self._ruta_bloque, "ab") as f:
+            offset = f.tell()
+            f.write(comprimido)
+
+        entrada = {
+            "fichero": os.path.basename(self._ruta_bloque), "offset": offset, "bytes": len(comprimido),
+            "desde_ns": inicio_ns, "hasta_ns": lote[-1][0], "frames": len(lote), "activos": sorted(activos),
+        }
+        with open(os.path.join(self.directorio, FICHERO_INDICE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entrada) + "\n")
+
+        self._frames_bloque += len(lote)
+        self.estadisticas["frames_grabados"] += len(lote)
+        self.estadisticas["volcados"] += 1
+        self.estadisticas["bytes_escritos"] += len(comprimido)
+
+
+# ==============================================================================
+# SECCIÓN: LECTURA DE CAPTURAS
+# ==============================================================================
+
+def leer_indice(directorio):
+    """Devuelve la lista de entradas del índice de una captura (un dict por volcado)."""
+    ruta = os.path.join(directorio, FICHERO_INDICE)
+    if not os.path.exists(ruta): return []
+    entradas = []
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                entradas.append(json.loads(linea))
+    return entradas
+
+def leer_captura(directorio, desde_ns=None, hasta_ns=None, activos=None):
+    """
+    Recorre los frames de una captura en orden de recepción.
+    Solo se descomprimen los volcados que solapan el rango y contienen alguno de los activos.
+
+    :param desde_ns: Instante mínimo de recepción (ns), incluido.
+    :param hasta_ns: Instante máximo de recepción (ns), incluido.
+    :param activos: IDs de activos a conservar (None = todos). Se conservan los frames que mencionan alguno.
+    :return: Generador de (ns de recepción, frame como str).
+    """
+    activos = set(activos) if activos is not None else None
+    for entrada in leer_indice(directorio):
+        if desde_ns is not None and entrada["hasta_ns"] < desde_ns: continue
+        if hasta_ns is not None and entrada["desde_ns"] > hasta_ns: continue
+        if activos is not None and not activos.intersection(entrada["activos"]): continue
+
+        with open(os.path.join(directorio, entrada["fichero"]), "rb") as f:
+            f.seek(entrada["offset"])
+            datos = gzip.decompress(f.read(entrada["bytes"]))
+
+        posicion = 0
+        while posicion < len(datos):
+            ns, longitud = CABECERA_REGISTRO.unpack_from(datos, posicion)
+            posicion += CABECERA_REGISTRO.size
+            frame = datos[posicion:posicion + longitud].decode("utf-8")
+            posicion += longitud
+
+            if desde_ns is not None and ns < desde_ns: continue
+            if hasta_ns is not None and ns > hasta_ns: continue
+            if activos is not None and not activos.intersection(PATRON_ASSET_ID.findall(frame)): continue
+            yield ns, frame
@@ -1,7 +1,84 @@
+import math
+import time
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import numpy as np
 from pykalman import KalmanFilter  # Librería optimizada para filtro de Kalman
 from scipy.optimize import minimize  # Optimizador numérico para MLE
 
+LOG_2PI = math.log(2 * math.pi)
+
+#################################################################
+# 1. Log-likelihood especializada del modelo de velocidad constante
+#################################################################
+# Con Q, R y la covarianza inicial diagonales, el modelo de 4 estados se separa
+# en dos bloques independientes [nivel, velocidad] con una sola observación cada uno
+# (Precio y VolDiff). La log-likelihood total es la suma de la de cada bloque y cada
+# bloque se filtra con escalares: sin matrices, sin inversas y sin crear objetos.
+
+def _log_likelihood_bloque(obs, q_nivel, q_velocidad, r):
+    """
+    Log-likelihood de un bloque [nivel, velocidad] con F = [[1, 1], [0, 1]] y H = [1, 0].
+    Mismo convenio que pykalman: el estado inicial es la predicción para la primera observación.
+
+    :param obs: Lista de observaciones del bloque (floats).
+    :param q_nivel: Varianza del ruido de proceso del nivel.
+    :param q_velocidad: Varianza del ruido de proceso de la velocidad.
+    :param r: Varianza del ruido de medición.
+    """
+    # Predicción: media (x, v) y covarianza simétrica [[a, b], [b, c]]
+    x, v = obs[0], 0.0
+    a, b, c = 1.0, 0.0, 1.0
+    ll = 0.0
+    for y in obs:
+        # Innovación y su varianza
+        s = a + r
+        e = y - x
+        ll -= 0.5 * (LOG_2PI + math.log(s) + e * e / s)
+
+        # Actualización (ganancia K = [a, b] / s)
+        k0, k1 = a / s, b / s
+        x += k0 * e
+        v += k1 * e
+        a, b, c = a - k0 * a, b - k0 * b, c - k1 * b
+
+        # Predicción del siguiente paso: P = F P F' + Q
+        x += v
+        a, b, c = a + 2 * b + c + q_nivel, b + c, c + q_velocidad
+    return ll
+
+def _log_likelihood_bloque_lote(obs, q_nivel, q_velocidad, r):
+    """
+    Misma recursión que '_log_likelihood_bloque' para M juegos de parámetros a la vez:
+    'q_nivel', 'q_velocidad' y 'r' son arrays (M,) y el estado son arrays (M,).
+    Un solo recorrido de la serie evalúa todo el lote.
+
+    :return: Array (M,) con la log-likelihood de cada juego de parámetros.
+    """
+    m = len(r)
+    x = np.full(m, obs[0])
+    v = np.zeros(m)
+    a, b, c = np.ones(m), np.zeros(m), np.ones(m)
+    ll = np.zeros(m)
+    for y in obs:
+        s = a + r
+        e = y - x
+        ll -= 0.5 * (LOG_2PI + np.log(s) + e * e / s)
+
+        k0, k1 = a / s, b / s
+        x += k0 * e
+        v += k1 * e
+        a, b, c = a - k0 * a, b - k0 * b, c - k1 * b
+
+        x += v
+        a, b, c = a + 2 * b + c + q_nivel, b + c, c + q_velocidad
+    return ll
+
+class _PresupuestoAgotado(Exception):
+    """Interrumpe una optimización cuando se acaba el tiempo de calibración."""
+
 #################################################################
 # 2. Clase KalmanMLECalibrator (Calibrador de Kalman)
 #################################################################
@@ -27,6 +104,10 @@ class KalmanMLECalibrator:
         # Apilar las observaciones en una matriz (N muestras x 2 variables)
         self.observations = np.column_stack([self.wmp_obs, self.vol_diff_obs])
 
+        # Copias como listas de floats para el filtro escalar (iterar un array de numpy es más lento)
+        self._wmp_lista = self.wmp_obs.astype(float).tolist()
+        self._vol_diff_lista = self.vol_diff_obs.astype(float).tolist()
+
         # --- Definición del Modelo de Espacio de Estados ---
         # Estado x = [Precio, Velocidad_Precio, VolDiff, Velocidad_VolDiff]
         
@@ -51,6 +132,38 @@ class KalmanMLECalibrator:
         Función de coste que el optimizador intenta minimizar.
         Calcula la probabilidad (Log-Likelihood) de que los datos observados
         hayan sido generados por un filtro de Kalman con los parámetros dados.
+        Usa el filtro escalar por bloques ('_log_likelihood_bloque'); devuelve
+        lo mismo que '_log_likelihood_pykalman' en una fracción del tiempo.
+        """
+        Q_p, Q_v, Q_d, Q_s, R_price, R_volume = params
+        try:
+            ll = (_log_likelihood_bloque(self._wmp_lista, Q_p, Q_v, R_price)
+                  + _log_likelihood_bloque(self._vol_diff_lista, Q_d, Q_s, R_volume))
+        except (ValueError, ZeroDivisionError, OverflowError):
+            # Si los parámetros son matemáticamente inválidos, devolver infinito
+            return np.inf
+        # Devolvemos negativo porque 'minimize' busca el mínimo
+        return -ll if math.isfinite(ll) else np.inf
+
+    def _log_likelihood_lote(self, lote):
+        """
+        Coste (log-likelihood negativa) de un lote de vectores de parámetros en una pasada vectorizada.
+
+        :param lote: Array (M, 6) con filas [Q_p, Q_v, Q_d, Q_s, R_price, R_volume].
+        :return: Array (M,) de costes (inf donde los parámetros no son válidos).
+        """
+        lote = np.asarray(lote, dtype=float)
+        with np.errstate(all="ignore"):
+            ll = (_log_likelihood_bloque_lote(self._wmp_lista, lote[:, 0], lote[:, 1], lote[:, 4])
+                  + _log_likelihood_bloque_lote(self._vol_diff_lista, lote[:, 2], lote[:, 3], lote[:, 5]))
+        coste = -ll
+        coste[~np.isfinite(coste)] = np.inf
+        return coste
+
+    def _log_likelihood_pykalman(self, params):
+        """
+        Versión de referencia con pykalman (genérica, crea un filtro por llamada).
+        Se conserva para validar la versión escalar (ver 'Benchmarks.benchmark_kalman').
         """
         # Desempaquetar los 6 parámetros que estamos optimizando
         # Q (ruido proceso): Precio, Vel_Precio, VolDiff, Vel_VolDiff
@@ -82,30 +195,100 @@ class KalmanMLECalibrator:
             # Si los parámetros son matemáticamente inválidos, devolver infinito
             return np.inf
 
-    def fit(self):
+    def _minimizar_con_limite(self, x0, limite=None):
+        """
+        L-BFGS-B desde 'x0' que se corta al llegar a 'limite' (instante de time.perf_counter),
+        quedándose con el mejor punto evaluado hasta entonces. limite=None = sin límite.
+        
+        :return: (x, coste)
+        """
+        # Restricciones: Todos los valores deben ser positivos (> 0)
+        # Usamos 1e-6 como límite inferior para evitar divisiones por cero
+        bounds = [(1e-6, None)] * 6
+        visto = {"x": np.asarray(x0, dtype=float), "coste": np.inf}
+        def coste_con_limite(params):
+            if limite is not None and time.perf_counter() >= limite:
+                raise _PresupuestoAgotado
+            coste = self._log_likelihood(params)
+            if coste < visto["coste"]:
+                visto["x"], visto["coste"] = np.array(params), coste
+            return coste
+
+        try:
+            result = minimize(coste_con_limite, x0, method='L-BFGS-B', bounds=bounds)
+            return result.x, result.fun
+        except _PresupuestoAgotado:
+            return visto["x"], visto["coste"]
+
+    def fit(self, punto_inicial=None, tiempo_maximo=None):
         """
         Ejecuta la optimización para encontrar los mejores parámetros Q y R.
         Utiliza el algoritmo L-BFGS-B.
         
+        :param punto_inicial: (Q_diag, R_diag) desde los que empezar, p.ej. la última calibración
+                              buena del mismo tipo de mercado (warm start).
+        :param tiempo_maximo: Segundos máximos de optimización (None = sin límite). Al agotarse
+                              se devuelve el mejor punto evaluado hasta entonces.
         :return: (Q_base_diagonal, R_base_diagonal)
         """
         # Valores iniciales razonables para empezar la búsqueda
         initial_params = [0.01, 0.01, 0.1, 0.1, 0.1, 1.0]
+        if punto_inicial is not None:
+            initial_params = np.maximum(np.concatenate(punto_inicial), 1e-6)
         
-        # Restricciones: Todos los valores deben ser positivos (> 0)
-        # Usamos 1e-6 como límite inferior para evitar divisiones por cero
-        bounds = [(1e-6, None)] * 6
-
-        # Ejecutar optimización
-        result = minimize(
-            self._log_likelihood, 
-            initial_params,
-            method='L-BFGS-B', 
-            bounds=bounds
-        )
+        limite = None if tiempo_maximo is None else time.perf_counter() + tiempo_maximo
+        x, _ = self._minimizar_con_limite(initial_params, limite)
         
         # Devolver los resultados separados en dos vectores (diag Q y diag R)
-        return result.x[:4], result.x[4:] 
+        return x[:4], x[4:] 
+
+    def _candidatos_iniciales(self, n_candidatos, rng):
+        """
+        Vectores de parámetros aleatorios (log-uniformes) a la escala de los datos:
+        cada bloque entre el límite inferior (1e-6) y 100 veces la varianza de sus incrementos.
+        Incluye el punto inicial de 'fit' para no empeorar nunca el resultado de partida.
+        """
+        var_precio = np.var(np.diff(self.wmp_obs)) if len(self.wmp_obs) > 1 else 0.0
+        var_volumen = np.var(np.diff(self.vol_diff_obs)) if len(self.vol_diff_obs) > 1 else 0.0
+        techo_precio = np.log10(max(100 * var_precio, 1e-3))
+        techo_volumen = np.log10(max(100 * var_volumen, 1e-3))
+        techos = np.array([techo_precio, techo_precio, techo_volumen, techo_volumen, techo_precio, techo_volumen])
+        candidatos = 10 ** rng.uniform(-6, techos, size=(n_candidatos, 6))
+        return np.vstack([[0.01, 0.01, 0.1, 0.1, 0.1, 1.0], candidatos])
+
+    def fit_multiarranque(self, n_candidatos=512, n_arranques=4, presupuesto=1.0, semilla=0, punto_inicial=None):
+        """
+        Calibración global: evalúa un lote de candidatos en una pasada vectorizada y lanza
+        L-BFGS-B desde los mejores, quedándose con el mejor óptimo local. Evita que un único
+        punto de partida acabe en los límites (p.ej. Q_v = 1e-6 con R de volumen enorme).
+
+        :param n_candidatos: Vectores de parámetros evaluados en el cribado inicial.
+        :param n_arranques: Optimizaciones locales como máximo (desde los mejores candidatos).
+        :param presupuesto: Segundos totales. La primera optimización siempre se hace, pero
+                            se corta (quedándose con el mejor punto visto) si agota el tiempo.
+        :param punto_inicial: (Q_diag, R_diag) que se añade a los candidatos (warm start).
+        :return: (Q_base_diagonal, R_base_diagonal)
+        """
+        limite = time.perf_counter() + presupuesto
+
+        # 1. Cribado vectorizado
+        candidatos = self._candidatos_iniciales(n_candidatos, np.random.default_rng(semilla))
+        if punto_inicial is not None:
+            candidatos = np.vstack([np.maximum(np.concatenate(punto_inicial), 1e-6), candidatos])
+        costes = self._log_likelihood_lote(candidatos)
+        orden = np.argsort(costes)[:n_arranques]
+        mejor_x, mejor_coste = candidatos[orden[0]], costes[orden[0]]
+
+        # 2. Optimizaciones locales desde los mejores candidatos mientras quede tiempo
+        for i, indice in enumerate(orden):
+            if not np.isfinite(costes[indice]): break
+            if i > 0 and time.perf_counter() >= limite: break
+
+            x, coste = self._minimizar_con_limite(candidatos[indice], limite)
+            if coste < mejor_coste:
+                mejor_x, mejor_coste = x, coste
+
+        return mejor_x[:4], mejor_x[4:]
     
     def filter_data(self, Q_diag, R_diag):
         """
@@ -135,4 +318,372 @@ class KalmanMLECalibrator:
         states_mean, _ = optimal_kf.filter(self.observations)
         
         # Retornar solo la columna 0 (Precio estimado)
-        return states_mean[:, 0]
\ No newline at end of file
+        return states_mean[:, 0]
+
+#################################################################
+# 3. Clase FiltroKalmanAdaptativo (Filtro en vivo, Fase 3)
+#################################################################
+
+class _BloqueKalman:
+    """
+    Un bloque [nivel, velocidad] del filtro con observación del nivel.
+    Guarda la covarianza completa (p01 y p10 por separado, como la versión matricial,
+    que no la simetriza) para reproducir exactamente sus resultados.
+    """
+    __slots__ = ("x", "v", "p00", "p01", "p10", "p11")
+
+    def __init__(self, nivel):
+        self.x, self.v = float(nivel), 0.0
+        self.p00, self.p01, self.p10, self.p11 = 1.0, 0.0, 0.0, 1.0
+
+    def propagar(self, nivel):
+        """Calentamiento: el nivel se fija a la observación y la velocidad se mantiene."""
+        self.x = float(nivel)
+
+    def actualizar(self, y, q_nivel, q_velocidad, r):
+        """Predicción + corrección con una observación 'y'. Devuelve el nivel filtrado."""
+        # Predicción: x = F x, P = F P F' + Q
+        x = self.x + self.v
+        v = self.v
+        f00 = self.p00 + self.p10
+        f01 = self.p01 + self.p11
+        p00 = f00 + f01 + q_nivel
+        p01 = f01
+        p10 = self.p10 + self.p11
+        p11 = self.p11 + q_velocidad
+
+        # Corrección: K = P H' S^-1, x += K e, P = (I - K H) P
+        inversa = 1.0 / (p00 + r)
+        k0, k1 = p00 * inversa, p10 * inversa
+        e = y - x
+        self.x = x + k0 * e
+        self.v = v + k1 * e
+        self.p00, self.p01 = (1 - k0) * p00, (1 - k0) * p01
+        self.p10, self.p11 = -k1 * p00 + p10, -k1 * p01 + p11
+        return self.x
+
+    def fijar_covarianza(self, covarianza):
+        """Fija la covarianza a posteriori (p00, p01, p10, p11), p.ej. la estacionaria de un régimen."""
+        self.p00, self.p01, self.p10, self.p11 = covarianza
+
+    @staticmethod
+    def ganancia_estacionaria(q_nivel, q_velocidad, r):
+        """
+        Ganancia y covarianza a posteriori a las que converge el filtro con Q y R constantes,
+        resolviendo en forma cerrada la ecuación de Riccati estacionaria del bloque (sin iterar
+        el filtro, que con Q pequeña frente a R necesitaba miles de pasos).
+        Con la covarianza a priori [[a, b], [b, c]] y S = a + r, la Riccati se reduce a
+        b = sqrt(q_velocidad * S), c = b (a + b) / S y, con t = sqrt(S), a la cuártica
+            t^4 - sqrt(q_v) t^3 - (2 r + q_n) t^2 - sqrt(q_v) r t + r^2 = 0,
+        que tiene una única raíz con t^2 > r (a > 0). Se afina con Newton sobre 'a'.
+
+        :return: Tupla (k0, k1, p00, p01, p10, p11).
+        """
+        raiz_qv = math.sqrt(q_velocidad)
+        raices = np.roots((1.0, -raiz_qv, -(2 * r + q_nivel), -raiz_qv * r, r * r))
+        t = max(raiz.real for raiz in raices if abs(raiz.imag) <= 1e-9 * abs(raiz))
+        a = t * t - r
+        for _ in range(3):
+            s = a + r
+            b = math.sqrt(q_velocidad * s)
+            residuo = a * a - b * (a + 2 * r) - q_nivel * s
+            derivada = 2 * a - raiz_qv * (a + 2 * r) / (2 * math.sqrt(s)) - b - q_nivel
+            a -= residuo / derivada
+
+        s = a + r
+        b = math.sqrt(q_velocidad * s)
+        c = b * (a + b) / s
+        # Corrección: K = P H' / S y covarianza a posteriori (I - K H) P
+        return a / s, b / s, a * r / s, b * r / s, b * r / s, c - b * b / s
+
+# Distancia relativa a la covarianza estacionaria a partir de la cual el filtro usa la caché
+TOLERANCIA_TRANSITORIO = 0.05
+
+class CacheGananciasKalman:
+    """
+    LRU de ganancias estacionarias indexadas por los multiplicadores de Q y R cuantizados.
+    En la Fase 3 Q y R son las diagonales base por un escalar; cuando un régimen
+    (volatilidad, spread) se repite, el filtro usa la ganancia ya convergida y se
+    ahorra la recursión de covarianza. Es una aproximación: se asume que el filtro
+    está en régimen estacionario (ver 'error_max' con 'medir_error').
+
+    Cada régimen se calcula una sola vez por (Q_base, R_base) y se guarda ya listo para
+    el filtro, con los límites de su celda. Tick a tick los factores suelen quedarse en
+    la misma celda: el filtro lo comprueba con esos límites y solo consulta la caché al
+    salir de ella (ver 'benchmark_cache_kalman' en Benchmarks.py).
+    """
+
+    def __init__(self, capacidad=64, paso=0.01):
+        """
+        :param capacidad: Número máximo de regímenes guardados.
+        :param paso: Resolución de la cuantización de los factores. Como los factores son >= 1,
+                     un paso de 0.01 es como mucho un 1% de error relativo en Q o R.
+        """
+        self.capacidad = capacidad
+        self.paso = paso
+        self._inverso_paso = 1.0 / paso
+        self.Q_base = (0.0, 0.0, 0.0, 0.0)
+        self.R_base = (0.0, 0.0)
+        # (índice_q, índice_r) -> (k0_precio, k1_precio, k0_volumen, k1_volumen,
+        #                          (cov_precio, cov_volumen), (q_min, q_max, r_min, r_max))
+        self._ganancias = OrderedDict()
+        self.estadisticas = {"aciertos": 0, "fallos": 0}
+
+    def configurar(self, Q_base, R_base):
+        """Fija los ruidos base de los que se derivan los regímenes y descarta los guardados."""
+        self.Q_base, self.R_base = tuple(Q_base), tuple(R_base)
+        self.vaciar()
+
+    def cuantizar(self, factor):
+        """Índice del factor en la rejilla (redondeo al múltiplo de 'paso' más cercano)."""
+        return int(factor * self._inverso_paso + 0.5)
+
+    def obtener(self, factor_q, factor_r):
+        """
+        Devuelve la entrada del régimen (k0_precio, k1_precio, k0_volumen, k1_volumen, covarianzas,
+        celda) si ya estaba guardada. En un fallo se calcula y guarda para los siguientes ticks,
+        pero se devuelve None: el primer tick de un régimen nuevo lo da el filtro exacto (aún no
+        está en su estacionario).
+        """
+        clave = (self.cuantizar(factor_q), self.cuantizar(factor_r))
+        ganancias = self._ganancias.get(clave)
+        if ganancias is not None:
+            self._ganancias.move_to_end(clave)
+            self.estadisticas["aciertos"] += 1
+            return ganancias
+
+        # Fallo: ganancia estacionaria con los factores ya cuantizados (la misma para toda la celda)
+        self.estadisticas["fallos"] += 1
+        fq, fr = clave[0] * self.paso, clave[1] * self.paso
+        Q_p, Q_v, Q_d, Q_s = self.Q_base
+        R_price, R_volume = self.R_base
+        k0_p, k1_p, *cov_precio = _BloqueKalman.ganancia_estacionaria(Q_p * fq, Q_v * fq, R_price * fr)
+        k0_v, k1_v, *cov_volumen = _BloqueKalman.ganancia_estacionaria(Q_d * fq, Q_s * fq, R_volume * fr)
+        medio_paso = 0.5 * self.paso
+        celda = (fq - medio_paso, fq + medio_paso, fr - medio_paso, fr + medio_paso)
+        self._ganancias[clave] = (k0_p, k1_p, k0_v, k1_v, (cov_precio, cov_volumen), celda)
+        if len(self._ganancias) > self.capacidad:
+            self._ganancias.popitem(last=False)
+        return None
+
+    def vaciar(self):
+        """Descarta las ganancias guardadas."""
+        self._ganancias.clear()
+
+    @property
+    def tasa_aciertos(self):
+        total = self.estadisticas["aciertos"] + self.estadisticas["fallos"]
+        return self.estadisticas["aciertos"] / total if total else 0.0
+
+class FiltroKalmanAdaptativo:
+    """
+    Filtro de Kalman en vivo de la Fase 3, con Q y R que se reescalan en cada tick.
+    Aprovecha que F, H, Q y R son diagonales por bloques: Precio y VolDiff son dos
+    filtros de velocidad constante independientes que se actualizan con aritmética
+    escalar, sin matrices ni temporales de numpy por tick. Da exactamente los mismos
+    valores que el filtro matricial de 4 estados.
+    """
+
+    def __init__(self, wmp, vol_diff, cache_ganancias=None, medir_error=False):
+        """
+        Inicializa el estado con la primera observación (velocidades a 0, covarianza identidad).
+
+        :param wmp: Primer precio observado (Weighted Mid-Price).
+        :param vol_diff: Primera diferencia de volumen observada.
+        :param cache_ganancias: CacheGananciasKalman opcional (None = filtro exacto).
+        :param medir_error: Con caché, ejecutar también el filtro exacto para medir el error del precio.
+        """
+        self.precio = _BloqueKalman(wmp)
+        self.volumen = _BloqueKalman(vol_diff)
+        self.Q_base = (0.0, 0.0, 0.0, 0.0)
+        self.R_base = (0.0, 0.0)
+
+        self.cache_ganancias = cache_ganancias
+        self._covarianzas_cache = None # Covarianzas estacionarias del último régimen cacheado
+        self._regimen = None # Última entrada de la caché usada y límites de su celda
+        self._celda = (math.inf, math.inf, math.inf, math.inf)
+        self._transitorio = True # La covarianza inicial (identidad) aún no está cerca de la estacionaria
+        self._exacto = None
+        if cache_ganancias is not None and medir_error:
+            self._exacto = FiltroKalmanAdaptativo(wmp, vol_diff)
+        self.error_max = 0.0
+        self._error_acumulado = 0.0
+        self._n_errores = 0
+
+    def configurar(self, Q_base_diag, R_base_diag):
+        """
+        Fija los ruidos base calibrados en la Fase 2.
+
+        :param Q_base_diag: Diagonal de Q (Precio, Vel_Precio, VolDiff, Vel_VolDiff).
+        :param R_base_diag: Diagonal de R (Precio, VolDiff).
+        """
+        self.Q_base = tuple(float(q) for q in Q_base_diag)
+        self.R_base = tuple(float(r) for r in R_base_diag)
+        if self.cache_ganancias is not None:
+            self.cache_ganancias.configurar(self.Q_base, self.R_base)
+            self._regimen, self._celda = None, (math.inf, math.inf, math.inf, math.inf)
+        if self._exacto is not None: self._exacto.configurar(Q_base_diag, R_base_diag)
+
+    def propagar_calentamiento(self, wmp, vol_diff):
+        """Durante el calentamiento el estado sigue a las observaciones sin filtrar."""
+        self.precio.propagar(wmp)
+        self.volumen.propagar(vol_diff)
+        if self._exacto is not None: self._exacto.propagar_calentamiento(wmp, vol_diff)
+
+    def actualizar(self, wmp, vol_diff, factor_q=1.0, factor_r=1.0):
+        """
+        Un paso del filtro con Q = Q_base * factor_q y R = R_base * factor_r.
+
+        :return: Precio justo filtrado (estado 0).
+        """
+        ganancias = None
+        if self.cache_ganancias is not None:
+            q_min, q_max, r_min, r_max = self._celda
+            if q_min <= factor_q < q_max and r_min <= factor_r < r_max:
+                # Misma celda que el tick anterior: sin cuantizar ni buscar en la caché
+                ganancias = self._regimen
+                self.cache_ganancias.estadisticas["aciertos"] += 1
+            else:
+                ganancias = self._buscar_regimen(factor_q, factor_r)
+
+        if ganancias is not None:
+            # Régimen cacheado: solo la media (predicción + corrección con la ganancia estacionaria).
+            # La covarianza no se toca en cada tick; se fija si el siguiente paso es exacto.
+            k0_p, k1_p, k0_v, k1_v, self._covarianzas_cache, _ = ganancias
+            bloque = self.volumen
+            x = bloque.x + bloque.v
+            e = vol_diff - x
+            bloque.x = x + k0_v * e
+            bloque.v += k1_v * e
+            bloque = self.precio
+            x = bloque.x + bloque.v
+            e = wmp - x
+            bloque.x = precio = x + k0_p * e
+            bloque.v += k1_p * e
+        else:
+            # Sin caché o régimen nuevo: paso exacto con la recursión de covarianza
+            if self._covarianzas_cache is not None:
+                # Se viene de ticks cacheados: se parte de la covarianza estacionaria de ese régimen
+                self.precio.fijar_covarianza(self._covarianzas_cache[0])
+                self.volumen.fijar_covarianza(self._covarianzas_cache[1])
+                self._covarianzas_cache = None
+            Q_p, Q_v, Q_d, Q_s = self.Q_base
+            R_price, R_volume = self.R_base
+            self.volumen.actualizar(vol_diff, Q_d * factor_q, Q_s * factor_q, R_volume * factor_r)
+            precio = self.precio.actualizar(wmp, Q_p * factor_q, Q_v * factor_q, R_price * factor_r)
+
+        if self._exacto is not None:
+            error = abs(precio - self._exacto.actualizar(wmp, vol_diff, factor_q, factor_r))
+            self.error_max = max(self.error_max, error)
+            self._error_acumulado += error
+            self._n_errores += 1
+        return precio
+
+    def _buscar_regimen(self, factor_q, factor_r):
+        """Entrada de la caché para los factores (None = paso exacto) y, si se usa, su celda."""
+        ganancias = self.cache_ganancias.obtener(factor_q, factor_r)
+        if ganancias is not None and self._transitorio:
+            # Arranque: pasos exactos hasta que la covarianza del precio se acerque a la estacionaria
+            # (unas decenas de ticks); antes, la ganancia cacheada se alejaría mucho del filtro exacto
+            p00, _, _, p11 = ganancias[4][0]
+            if (abs(self.precio.p00 - p00) <= TOLERANCIA_TRANSITORIO * p00
+                    and abs(self.precio.p11 - p11) <= TOLERANCIA_TRANSITORIO * p11):
+                self._transitorio = False
+            else:
+                ganancias = None
+        self._regimen = ganancias
+        self._celda = ganancias[5] if ganancias is not None else (math.inf, math.inf, math.inf, math.inf)
+        return ganancias
+
+    @property
+    def error_medio(self):
+        """Error absoluto medio del precio frente al filtro exacto (solo con 'medir_error')."""
+        return self._error_acumulado / self._n_errores if self._n_errores else 0.0
+
+    @property
+    def estado(self):
+        """Estado completo [Precio, Vel_Precio, VolDiff, Vel_VolDiff]."""
+        return [self.precio.x, self.precio.v, self.volumen.x, self.volumen.v]
+
+#################################################################
+# 4. Calibración fuera del bucle de eventos
+#################################################################
+# La MLE es CPU pura: ejecutada en el bucle de eventos bloquearía la lectura del
+# WebSocket (libro obsoleto, PING sin contestar). Se lanza en un proceso aparte
+# (sin GIL compartido) y, si el pool de procesos no está disponible, en un hilo.
+# Esperar con timeout no detiene al trabajador, así que el límite de tiempo se
+# aplica dentro de la propia optimización (proceso o hilo). Una calibración con
+# límite usa su propio pool de un proceso: si aun así se supera, se abandona ese
+# pool (el trabajador acaba solo al agotar su tiempo) sin tocar otras calibraciones.
+
+# Segundos de la espera reservados para devolver el resultado (arranque del proceso, filtrado, sigma)
+MARGEN_CALIBRACION = 1.0
+
+def calibrar_kalman(hist_wmp, hist_vol_diff, Q_diag=None, R_diag=None, multiarranque=False, presupuesto=1.0,
+                    punto_inicial=None, tiempo_maximo=None):
+    """
+    Fase 2 completa sobre el calentamiento: MLE de Q y R (si no se dan) y sigma base
+    como volatilidad de los precios filtrados. Función de módulo para poder enviarla a otro proceso.
+
+    :param multiarranque: Usar 'fit_multiarranque' (global, acotado por 'presupuesto' segundos).
+    :param punto_inicial: (Q_diag, R_diag) desde los que arrancar la MLE (warm start).
+    :param tiempo_maximo: Segundos máximos de la MLE (None = sin límite); se devuelve el mejor punto hasta entonces.
+    :return: (Q_base_diagonal, R_base_diagonal, sigma_base)
+    """
+    calibrator = KalmanMLECalibrator(hist_wmp, hist_vol_diff)
+    if Q_diag is None or R_diag is None:
+        if multiarranque:
+            if tiempo_maximo is not None: presupuesto = min(presupuesto, tiempo_maximo)
+            Q_diag, R_diag = calibrator.fit_multiarranque(presupuesto=presupuesto, punto_inicial=punto_inicial)
+        else:
+            Q_diag, R_diag = calibrator.fit(punto_inicial, tiempo_maximo)
+    sigma = np.std(np.diff(calibrator.filter_data(Q_diag, R_diag)))
+    return Q_diag, R_diag, (sigma if sigma != 0 else 0.01)
+
+_ejecutor_calibracion = None
+
+def ejecutor_calibracion():
+    """Pool de procesos compartido por las calibraciones sin límite de tiempo (se crea la primera vez)."""
+    global _ejecutor_calibracion
+    if _ejecutor_calibracion is None:
+        _ejecutor_calibracion = ProcessPoolExecutor(max_workers=2)
+    return _ejecutor_calibracion
+
+async def calibrar_en_segundo_plano(hist_wmp, hist_vol_diff, Q_diag=None, R_diag=None, timeout=None, usar_proceso=True,
+                                    multiarranque=False, presupuesto=1.0, punto_inicial=None):
+    """
+    Ejecuta 'calibrar_kalman' en el pool de procesos (o en un hilo) sin bloquear el bucle de eventos.
+
+    :param timeout: Segundos máximos de espera (None = sin límite). La MLE se corta sola
+                    MARGEN_CALIBRACION segundos antes; si aun así no termina, lanza asyncio.TimeoutError.
+                    Con procesos, la calibración corre en un pool propio de un trabajador que se
+                    cierra al terminar o al agotarse la espera.
+    :param usar_proceso: False = usar un hilo (el optimizador comparte el GIL con el bucle).
+    :return: (Q_base_diagonal, R_base_diagonal, sigma_base)
+    """
+    global _ejecutor_calibracion
+    bucle = asyncio.get_running_loop()
+    tiempo_maximo = None if timeout is None else max(timeout - MARGEN_CALIBRACION, timeout / 2)
+    argumentos = (list(hist_wmp), list(hist_vol_diff), Q_diag, R_diag, multiarranque, presupuesto, punto_inicial,
+                  tiempo_maximo)
+
+    if usar_proceso:
+        ejecutor = None
+        try:
+            ejecutor = ejecutor_calibracion() if timeout is None else ProcessPoolExecutor(max_workers=1)
+            futuro = bucle.run_in_executor(ejecutor, calibrar_kalman, *argumentos)
+            return await asyncio.wait_for(futuro, timeout)
+        except asyncio.TimeoutError:
+            raise # Hereda de OSError, pero no es un fallo del pool
+        except (BrokenProcessPool, OSError) as e:
+            # Sin procesos disponibles (entorno restringido, proceso caído): se recurre a un hilo
+            print(f"⚠️ Pool de procesos no disponible para calibrar ({e}). Usando un hilo.")
+            if ejecutor is _ejecutor_calibracion: _ejecutor_calibracion = None
+        finally:
+            if timeout is not None and ejecutor is not None:
+                # Solo afecta a este trabajo: si sigue en marcha, el proceso sale al agotar 'tiempo_maximo'
+                ejecutor.shutdown(wait=False, cancel_futures=True)
+
+    # Un hilo tampoco se puede detener desde fuera: lo corta 'tiempo_maximo' dentro de la MLE
+    futuro = bucle.run_in_executor(None, calibrar_kalman, *argumentos)
+    return await asyncio.wait_for(futuro, timeout)
@@ -0,0 +1,149 @@
+import bisect
+import numpy as np
+
+#################################################################
+# Clase LibroOrdenes (Libro L2 incremental por activo)
+#################################################################
+
+class LibroOrdenes:
+    """
+    Libro de órdenes L2 de un único activo (token).
+    Mantiene los niveles de precio ordenados para poder aplicar tanto
+    snapshots completos ('book') como cambios incrementales ('price_change')
+    sin reconstruir el libro entero en cada mensaje.
+
+    Los precios y tamaños se convierten a float UNA SOLA VEZ al entrar.
+    """
+
+    # Cada cuántos cambios incrementales se recalculan los volúmenes totales desde cero
+    # (acota el error de redondeo acumulado en sesiones largas; coste amortizado O(1)).
+    RESYNC_CAMBIOS = 1000
+
+    def __init__(self):
+        # Precios ordenados de menor a mayor en ambos lados.
+        # Mejor Bid = último elemento de 'precios_bid'; Mejor Ask = primero de 'precios_ask'.
+        self.precios_bid = []
+        self.precios_ask = []
+
+        # Mapeo Precio -> Tamaño de cada nivel
+        self.niveles_bid = {}
+        self.niveles_ask = {}
+
+        # Agregados mantenidos de forma incremental (O(1) por cambio)
+        self.vol_total_bid = 0.0
+        self.vol_total_ask = 0.0
+
+        # Contador que aumenta con cada modificación del libro
+        self.version = 0
+
+        # Cambios incrementales desde la última suma completa de volúmenes
+        self._cambios_desde_resync = 0
+
+    # ==============================================================================
+    # SECCIÓN: ACTUALIZACIÓN DEL LIBRO
+    # ==============================================================================
+
+    def aplicar_snapshot(self, bid_precios, bid_sizes, ask_precios, ask_sizes):
+        """
+        Sustituye el libro completo por un snapshot del exchange.
+        Recibe los niveles ya convertidos a arrays numéricos (ver 'Decodificador_WS').
+
+        :param bid_precios: Array de precios de compra.
+        :param bid_sizes: Array de tamaños de compra.
+        :param ask_precios: Array de precios de venta.
+        :param ask_sizes: Array de tamaños de venta.
+        """
+        self.niveles_bid = self._niveles_desde_arrays(bid_precios, bid_sizes)
+        self.niveles_ask = self._niveles_desde_arrays(ask_precios, ask_sizes)
+        self.precios_bid = sorted(self.niveles_bid)
+        self.precios_ask = sorted(self.niveles_ask)
+        self._resincronizar_totales()
+        self.version += 1
+
+    def aplicar_cambio(self, lado, precio, size):
+        """
+        Aplica un cambio incremental en un nivel de precio.
+        Un tamaño 0 elimina el nivel. Cambiar el tamaño de un nivel existente es O(1); crear o
+        eliminar un nivel busca su posición en O(log n) pero desplaza la lista de precios, O(n).
+        Como n no pasa de 1/tick niveles por lado (99 con tick 0.01), ese desplazamiento es una
+        copia de memoria corta y sale más barato que un árbol ordenado.
+
+        :param lado: "BUY" (bids) o "SELL" (asks). Cualquier otro valor lanza ValueError.
+        :param precio: Precio del nivel (float).
+        :param size: Nuevo tamaño total en ese nivel (float).
+        """
+        lado = lado.upper()
+        if lado not in ("BUY", "SELL"):
+            raise ValueError(f"Lado desconocido: {lado!r}")
+        es_bid = lado == "BUY"
+        if es_bid:
+            niveles, precios = self.niveles_bid, self.precios_bid
+        else:
+            niveles, precios = self.niveles_ask, self.precios_ask
+
+        size_anterior = niveles.get(precio, 0.0)
+        if size > 0:
+            if precio not in niveles:
+                bisect.insort(precios, precio)
+            niveles[precio] = size
+        elif precio in niveles:
+            del niveles[precio]
+            del precios[bisect.bisect_left(precios, precio)]
+            size = 0.0
+
+        # Actualizar el volumen total del lado con la diferencia del nivel
+        if es_bid:
+            self.vol_total_bid += size - size_anterior
+        else:
+            self.vol_total_ask += size - size_anterior
+
+        self._cambios_desde_resync += 1
+        if self._cambios_desde_resync >= self.RESYNC_CAMBIOS:
+            self._resincronizar_totales()
+
+        self.version += 1
+
+    def _resincronizar_totales(self):
+        """Recalcula los volúmenes totales sumando todos los niveles (mismo orden que el snapshot)."""
+        self.vol_total_bid = sum(self.niveles_bid.values())
+        self.vol_total_ask = sum(self.niveles_ask.values())
+        self._cambios_desde_resync = 0
+
+    def _niveles_desde_arrays(self, precios, sizes):
+        """
+        Convierte los arrays de un lado en un diccionario {precio: tamaño}, ignorando niveles vacíos.
+        A diferencia del cálculo original sobre la lista cruda del snapshot, un nivel de tamaño 0
+        no cuenta como mejor precio y un precio repetido se queda con su último tamaño: el libro
+        guarda un único tamaño total por precio, que es lo que fijan los 'price_change'.
+        """
+        validos = sizes > 0
+        if not validos.all():
+            precios, sizes = precios[validos], sizes[validos]
+        return dict(zip(precios.tolist(), sizes.tolist()))
+
+    # ==============================================================================
+    # SECCIÓN: CONSULTAS (TOP OF BOOK Y ARRAYS)
+    # ==============================================================================
+
+    @property
+    def mejor_bid(self):
+        """Mejor precio de compra en O(1). Devuelve 0 si el lado está vacío."""
+        return self.precios_bid[-1] if self.precios_bid else 0
+
+    @property
+    def mejor_ask(self):
+        """Mejor precio de venta en O(1). Devuelve 0 si el lado está vacío."""
+        return self.precios_ask[0] if self.precios_ask else 0
+
+    def arrays_bid(self):
+        """Devuelve (precios, tamaños) del lado comprador como arrays de numpy."""
+        return (np.fromiter(self.niveles_bid.keys(), dtype=float, count=len(self.niveles_bid)),
+                np.fromiter(self.niveles_bid.values(), dtype=float, count=len(self.niveles_bid)))
+
+    def arrays_ask(self):
+        """Devuelve (precios, tamaños) del lado vendedor como arrays de numpy."""
+        return (np.fromiter(self.niveles_ask.keys(), dtype=float, count=len(self.niveles_ask)),
+                np.fromiter(self.niveles_ask.values(), dtype=float, count=len(self.niveles_ask)))
+
+    def __len__(self):
+        return len(self.precios_bid) + len(self.precios_ask)
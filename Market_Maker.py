@@ -10,9 +10,15 @@ from IPython.display import clear_output, display
 
 # Importaciones de módulos propios
 from Rastreador_Polymarket import RastreadorPolymarket
-from Kalman_Filter import KalmanMLECalibrator
+from Kalman_Filter import FiltroKalmanAdaptativo, CacheGananciasKalman, calibrar_kalman, calibrar_en_segundo_plano
 from Ploteo_vivo import LivePlotter
 from Avellaneda import AvellanedaStrategy
+from Volatilidad_Movil import crear_volatilidad
+from Rollover import PlanificadorRollover, epoch_de_mercado, familia_de_mercado
+from Almacen_Calibraciones import AlmacenCalibraciones
+from Gestor_Ordenes import GestorOrdenes
+from Grabador_Mercado import GrabadorMercado
+from Reproductor_Mercado import ReproductorMercado, catalogo_de_captura
 
 # Importación opcional del Gestor de Wallet
 try:
@@ -25,10 +31,17 @@ except ImportError:
 # 3. Función Principal de Market Making Asíncrona
 #################################################################
 
-async def ejecutar_sesion_market_maker(params, run_id="RUN", enable_live_plotting=True, save_individual_files=True):
+async def ejecutar_sesion_market_maker(params, run_id="RUN", enable_live_plotting=True, save_individual_files=True,
+                                       tracker=None, token=None, precalentamiento=None):
     """
     Ejecuta una sesión completa de market making.
     Se detiene inmediatamente si falla la conexión o NO HAY FONDOS en Modo Real.
+    
+    :param tracker: RastreadorPolymarket ya conectado y compartido (opcional). Si se pasa,
+                    la sesión no abre su propia conexión ni la cierra al terminar.
+    :param token: ID del token a seguir cuando se pasa un 'tracker' compartido.
+    :param precalentamiento: Historial previo {'wmp': [...], 'vol_diff': [...], 'kappa': [...]}
+                             con el que se rellena (o se salta) la Fase 1.
     """
     
     # ==============================================================================
@@ -36,14 +49,26 @@ async def ejecutar_sesion_market_maker(params, run_id="RUN", enable_live_plottin
     # ==============================================================================
     
     TIEMPO_TOTAL_EJECUCION = params.get('TIEMPO_TOTAL') 
+    FIN_SESION = params.get('FIN_SESION')               # Instante (epoch) de cierre fijo, p.ej. fin de ventana
     INTERVALO_TICK = params.get('INTERVALO_TICK')       
+    MODO_EVENTOS = params.get('MODO_EVENTOS', True)
+    INTERVALO_MIN_RECOTIZACION = params.get('INTERVALO_MIN_RECOTIZACION', 0.0)
     SLUG_MERCADO = params.get('SLUG_MERCADO')           
     ROLLING_VOL_WINDOW = params.get('ROLLING_VOL_WINDOW') 
+    METODO_VOLATILIDAD = params.get('METODO_VOLATILIDAD', "ventana") # "ventana" (como np.std) o "ewma"
     WARMUP_TICKS = params.get('WARMUP_TICKS')           
 
     GAMMA_BASE = params.get('GAMMA_BASE')               
     MAX_INVENTARIO = params.get('MAX_INVENTARIO')       
     KAPPA_FALLBACK = params.get('KAPPA_FALLBACK', 50.0) 
+    METODO_KAPPA = params.get('METODO_KAPPA', "curve_fit")
+    INTERVALO_KAPPA = params.get('INTERVALO_KAPPA', 0.0)
+    FUENTE_KAPPA = params.get('FUENTE_KAPPA', "libro")
+    MAX_ANTIGUEDAD_DATOS = params.get('MAX_ANTIGUEDAD_DATOS', 10.0)
+    GRABAR_MERCADO = params.get('GRABAR_MERCADO', False)
+    DIRECTORIO_CAPTURAS = params.get('DIRECTORIO_CAPTURAS', "Data/capturas")
+    REPRODUCIR_CAPTURA = params.get('REPRODUCIR_CAPTURA')         # Carpeta de captura a reproducir (None = en vivo)
+    VELOCIDAD_REPRODUCCION = params.get('VELOCIDAD_REPRODUCCION') # 1 = tiempo real, >1 acelerado, None = máxima
 
     Q_BASE_DIAG_PARAM = params.get('Q_BASE_DIAG')       
     R_BASE_DIAG_PARAM = params.get('R_BASE_DIAG')       
@@ -51,9 +76,30 @@ async def ejecutar_sesion_market_maker(params, run_id="RUN", enable_live_plottin
     
     R_FACTOR_SPREAD = params.get('R_FACTOR_SPREAD')     
     Q_FACTOR_VOL = params.get('Q_FACTOR_VOL')           
+    CACHE_GANANCIAS_KALMAN = params.get('CACHE_GANANCIAS_KALMAN', 0) # Regímenes cacheados (0 = filtro exacto)
+    PASO_CACHE_KALMAN = params.get('PASO_CACHE_KALMAN', 0.01)
+    MEDIR_ERROR_CACHE_KALMAN = params.get('MEDIR_ERROR_CACHE_KALMAN', False)
+    USAR_TABLAS_ESTRATEGIA = params.get('USAR_TABLAS_ESTRATEGIA', True)     # Cotizaciones desde tablas por inventario
+    MEDIR_DESVIACION_TABLAS = params.get('MEDIR_DESVIACION_TABLAS', False)  # Comparar con la fórmula directa
+    CALIBRAR_EN_PROCESO = params.get('CALIBRAR_EN_PROCESO', True)          # False = calibrar en un hilo
+    TIMEOUT_CALIBRACION = params.get('TIMEOUT_CALIBRACION', 60.0)          # Segundos máximos de la MLE
+    COTIZAR_DURANTE_CALIBRACION = params.get('COTIZAR_DURANTE_CALIBRACION', False)
+    Q_BASE_FALLBACK = params.get('Q_BASE_FALLBACK', [0.01, 0.01, 0.1, 0.1]) # Q/R mientras no hay calibración
+    CALIBRACION_MULTIARRANQUE = params.get('CALIBRACION_MULTIARRANQUE', False) # MLE global con varios arranques
+    PRESUPUESTO_CALIBRACION = params.get('PRESUPUESTO_CALIBRACION', 1.0)      # Segundos máximos del multiarranque
+    USAR_ALMACEN_CALIBRACIONES = params.get('USAR_ALMACEN_CALIBRACIONES', False) # Reutilizar calibraciones de la familia
+    MAX_ANTIGUEDAD_CALIBRACION = params.get('MAX_ANTIGUEDAD_CALIBRACION', 3600.0)
+    WARMUP_TICKS_CALIBRACION_CACHEADA = params.get('WARMUP_TICKS_CALIBRACION_CACHEADA', 2)
+    R_BASE_FALLBACK = params.get('R_BASE_FALLBACK', [0.1, 1.0])
 
     MODO_REAL = params.get('MODO_REAL', False)          
     SIZE_USDC = params.get('SIZE_USDC', 1.0)            
+    N_CAPAS = params.get('N_CAPAS', 1)                          # Niveles de la escalera por lado
+    TICKS_ENTRE_CAPAS = params.get('TICKS_ENTRE_CAPAS', 1)
+    PERFIL_TAMANO_CAPAS = params.get('PERFIL_TAMANO_CAPAS')     # Multiplicador de SIZE_USDC por nivel
+    TICK_PRECIO = params.get('TICK_PRECIO', 0.01)
+    INTERVALO_RECONCILIACION_ORDENES = params.get('INTERVALO_RECONCILIACION_ORDENES', 30.0) # Segundos entre consultas al CLOB
+    REPONER_ORDENES_PARCIALES = params.get('REPONER_ORDENES_PARCIALES', False) # Reponer órdenes ejecutadas en parte
     
     Q_BASE_DIAG = None
     R_BASE_DIAG = None
@@ -101,36 +147,66 @@ async def ejecutar_sesion_market_maker(params, run_id="RUN", enable_live_plottin
     # 3. CONEXIÓN AL MERCADO
     # ==============================================================================
 
-    F = np.array([[1, 1, 0, 0], [0, 1, 0, 0], [0, 0, 1, 1], [0, 0, 0, 1]]) 
-    H = np.array([[1, 0, 0, 0], [0, 0, 1, 0]])                             
-    I = np.eye(4)                                                          
-
-    print(f"[{run_id}] Buscando mercado: {SLUG_MERCADO}")
-    tracker = RastreadorPolymarket(SLUG_MERCADO) 
+    tracker_propio = tracker is None
+    listener_task = None
     
-    if not tracker.obtener_datos_evento(): 
-        raise ValueError(f"No se encontró el evento: {SLUG_MERCADO}")
-    if not tracker.seleccionar_sub_mercado(0): 
-        raise ValueError("No se pudo seleccionar el mercado.")
+    if tracker_propio:
+        print(f"[{run_id}] Buscando mercado: {SLUG_MERCADO}")
+        grabador = GrabadorMercado(DIRECTORIO_CAPTURAS) if GRABAR_MERCADO else None
+        # En reproducción los metadatos del mercado salen de la propia captura
+        catalogo = catalogo_de_captura(REPRODUCIR_CAPTURA) if REPRODUCIR_CAPTURA else None
+        tracker = RastreadorPolymarket(SLUG_MERCADO, metodo_kappa=METODO_KAPPA, intervalo_kappa=INTERVALO_KAPPA,
+                                       catalogo=catalogo, grabador=grabador) 
+        
+        if not tracker.obtener_datos_evento(): 
+            raise ValueError(f"No se encontró el evento: {SLUG_MERCADO}")
+        if not tracker.seleccionar_sub_mercado(0): 
+            raise ValueError("No se pudo seleccionar el mercado.")
+        
+        if REPRODUCIR_CAPTURA:
+            print(f"[{run_id}] ⏪ Reproduciendo captura '{REPRODUCIR_CAPTURA}' (velocidad: {VELOCIDAD_REPRODUCCION or 'máxima'})")
+            ReproductorMercado(REPRODUCIR_CAPTURA, velocidad=VELOCIDAD_REPRODUCCION).instalar(tracker)
+        
+        TOKEN_A_SEGUIR = json.loads(tracker.datos_mercado_seleccionado.get("outcomes", "[]"))[0]
+        TOKEN_ID_LARGO = tracker.mapa_tokens.get(TOKEN_A_SEGUIR)
+    else:
+        # Tracker compartido (multiplexado): los nombres se repiten entre mercados, se usa el ID
+        TOKEN_A_SEGUIR = TOKEN_ID_LARGO = token
     
-    TOKEN_A_SEGUIR = json.loads(tracker.datos_mercado_seleccionado.get("outcomes", "[]"))[0]
-    TOKEN_ID_LARGO = tracker.mapa_tokens.get(TOKEN_A_SEGUIR)
     print(f"[{run_id}] Rastreando el token: '{TOKEN_A_SEGUIR}' (ID: {TOKEN_ID_LARGO})")
+    # Todos los tiempos de la sesión salen del reloj del rastreador (virtual al reproducir capturas)
+    reloj = tracker.reloj
+    # En real las órdenes se actualizan por diferencias (solo lo que cambia tras redondear al tick)
+    gestor_ordenes = GestorOrdenes(wallet, INTERVALO_RECONCILIACION_ORDENES, TICK_PRECIO, reloj,
+                                   REPONER_ORDENES_PARCIALES) if wallet else None
+    # Solo se publican (y se calculan métricas) del token que seguimos
+    tracker.registrar_interes(TOKEN_A_SEGUIR)
 
-    listener_task = asyncio.create_task(tracker.conectar_y_escuchar())
-    await asyncio.sleep(3) 
+    if tracker_propio:
+        listener_task = asyncio.create_task(tracker.conectar_y_escuchar())
+    
+    # Listo en cuanto llega el primer snapshot del libro (sin espera fija)
+    inicio_espera_libro = time.time()
+    await tracker.esperar_libro(TOKEN_A_SEGUIR)
+    print(f"[{run_id}] Libro recibido en {time.time() - inicio_espera_libro:.2f}s")
     
     # Inicialización de variables
-    current_state_mean = None
-    current_state_cov = np.eye(4)
+    filtro_kalman = None
+    avellaneda_strategy = None
+    tarea_calibracion = None
     inventario = 0
     cash = 0.0
     total_pnl = 0.0
     
-    trades_bid_colocados = 0
-    trades_ask_colocados = 0
-    trades_bid_ejecutados = 0
-    trades_ask_ejecutados = 0
+    # Contadores por nivel de la escalera
+    bid_colocados_capa = [0] * N_CAPAS
+    ask_colocados_capa = [0] * N_CAPAS
+    bid_ejecutados_capa = [0] * N_CAPAS
+    ask_ejecutados_capa = [0] * N_CAPAS
+    
+    # Guarda de datos obsoletos (conexión caída o libro sin resincronizar)
+    cotizacion_pausada = False
+    pausas_datos_obsoletos = 0
     
     hist_wmp, hist_vol_diff = [], []
     hist_kalman_p, hist_reserva_p = [], []
@@ -140,6 +216,8 @@ async def ejecutar_sesion_market_maker(params, run_id="RUN", enable_live_plottin
     hist_gamma, hist_sigma = [], []
     hist_Q, hist_R = [], []
     hist_kappa = [] 
+    hist_bid_capas = [[] for _ in range(N_CAPAS)] # Precio de cada nivel de la escalera
+    hist_ask_capas = [[] for _ in range(N_CAPAS)]
     
     hist_data = {
         'wmp': hist_wmp, 'kalman_p': hist_kalman_p, 'reserva_p': hist_reserva_p,
@@ -148,82 +226,195 @@ async def ejecutar_sesion_market_maker(params, run_id="RUN", enable_live_plottin
         'sigma': hist_sigma, 'Q': hist_Q, 'R': hist_R,
         'kappa': hist_kappa 
     }
+    for capa in range(N_CAPAS):
+        hist_data[f'bid_capa_{capa}'] = hist_bid_capas[capa]
+        hist_data[f'ask_capa_{capa}'] = hist_ask_capas[capa]
     
     is_calibrated = False 
     ultimo_wmp_visto = None
     
-    while current_state_mean is None:
+    # Control del modo por eventos: última versión del libro procesada y último recálculo
+    version_vista = 0
+    ultima_recotizacion = 0.0
+
+    async def esperar_siguiente_tick(timeout=None):
+        """
+        Modo eventos: duerme hasta el siguiente cambio del libro del token seguido,
+        respetando INTERVALO_MIN_RECOTIZACION entre dos recálculos.
+        Modo polling: duerme INTERVALO_TICK segundos.
+        """
+        nonlocal version_vista, ultima_recotizacion
+        if not MODO_EVENTOS:
+            await reloj.dormir(INTERVALO_TICK)
+            return
+        
+        espera = ultima_recotizacion + INTERVALO_MIN_RECOTIZACION - reloj.ahora()
+        if espera > 0:
+            await reloj.dormir(espera)
+        
+        version = await tracker.esperar_actualizacion(TOKEN_A_SEGUIR, version_vista, timeout=timeout)
+        if version is not None:
+            version_vista = version
+        ultima_recotizacion = reloj.ahora()
+    
+    while filtro_kalman is None:
         wmp = tracker.obtener_wmp_l2(TOKEN_A_SEGUIR)
         if wmp > 0:
             vol_diff = tracker.obtener_volume_diff(TOKEN_A_SEGUIR)
-            current_state_mean = np.array([wmp, 0, vol_diff, 0])
+            cache_ganancias = CacheGananciasKalman(CACHE_GANANCIAS_KALMAN, PASO_CACHE_KALMAN) if CACHE_GANANCIAS_KALMAN else None
+            filtro_kalman = FiltroKalmanAdaptativo(wmp, vol_diff, cache_ganancias, medir_error=MEDIR_ERROR_CACHE_KALMAN)
             print(f"[{run_id}] Filtro inicializado. Precio: {wmp:.5f}")
+        elif MODO_EVENTOS:
+            await esperar_siguiente_tick()
         else:
-            await asyncio.sleep(0.5)
+            await reloj.dormir(0.5)
+
+    # Calibración reciente de la misma familia de mercados y franja horaria: permite acortar
+    # la Fase 1 y cotizar con ella desde el principio (se refresca en segundo plano en la Fase 3).
+    # En reproducción no se usa para que el resultado no dependa de lo que haya en disco.
+    almacen_calibraciones = None
+    calibracion_cacheada = None
+    familia_mercado = familia_de_mercado(SLUG_MERCADO)
+    if USAR_ALMACEN_CALIBRACIONES and not REPRODUCIR_CAPTURA:
+        almacen_calibraciones = AlmacenCalibraciones()
+        if Q_BASE_DIAG_PARAM is None or R_BASE_DIAG_PARAM is None or SIGMA_BASE_PARAM is None:
+            calibracion_cacheada = almacen_calibraciones.obtener(familia_mercado, reloj.ahora(), MAX_ANTIGUEDAD_CALIBRACION)
+    
+    ticks_calentamiento = WARMUP_TICKS
+    if calibracion_cacheada is not None:
+        # La sigma cacheada cubre los ticks en los que la ventana de volatilidad aún no está llena
+        ticks_calentamiento = min(WARMUP_TICKS, WARMUP_TICKS_CALIBRACION_CACHEADA)
+        if ticks_calentamiento < WARMUP_TICKS:
+            antiguedad_calibracion = (reloj.ahora() - calibracion_cacheada['instante']) / 60
+            print(f"[{run_id}] Calibración de '{familia_mercado}' de hace {antiguedad_calibracion:.0f} min. "
+                  f"Calentamiento reducido a {ticks_calentamiento} ticks.")
+    refresco_pendiente = calibracion_cacheada is not None
 
     # ==============================================================================
     # 4. PREPARACIÓN DE VISUALIZACIÓN
     # ==============================================================================
     plotter = None
     if enable_live_plotting:
-        plotter = LivePlotter(WARMUP_TICKS)
+        plotter = LivePlotter(ticks_calentamiento)
     
-    start_time_total_sesion = time.time() 
+    start_time_total_sesion = reloj.ahora() 
     tiempo_transcurrido_ejecucion = 0 
     
     try:
         # ==============================================================================
         # FASE 1: CALENTAMIENTO
         # ==============================================================================
-        print(f"[{run_id}] Fase 1: Calentamiento ({WARMUP_TICKS} ticks)...")
+        def registrar_tick_calentamiento(wmp_obs, vol_diff_obs, kappa_estimada_real):
+            """Guarda un tick de calentamiento y propaga el estado del filtro."""
+            nonlocal ultimo_wmp_visto
+            hist_wmp.append(wmp_obs)
+            hist_vol_diff.append(vol_diff_obs)
+            
+            hist_kalman_p.append(wmp_obs); hist_reserva_p.append(np.nan)
+            hist_nuestro_bid.append(np.nan); hist_nuestro_ask.append(np.nan)
+            hist_inventario.append(0); hist_pnl.append(0)
+            hist_gamma.append(GAMMA_BASE); hist_sigma.append(0.01)
+            hist_Q.append(0); hist_R.append(0)
+            hist_kappa.append(kappa_estimada_real)
+            for capa in range(N_CAPAS):
+                hist_bid_capas[capa].append(np.nan); hist_ask_capas[capa].append(np.nan)
+            
+            filtro_kalman.propagar_calentamiento(wmp_obs, vol_diff_obs)
+            ultimo_wmp_visto = wmp_obs
+        
+        # Calentamiento recogido antes de empezar la sesión (p.ej. durante la ventana anterior)
+        if precalentamiento:
+            for wmp_obs, vol_diff_obs, kappa_obs in list(zip(precalentamiento['wmp'], precalentamiento['vol_diff'],
+                                                             precalentamiento['kappa']))[-WARMUP_TICKS:]:
+                registrar_tick_calentamiento(wmp_obs, vol_diff_obs, kappa_obs)
         
-        while len(hist_wmp) < WARMUP_TICKS:
+        print(f"[{run_id}] Fase 1: Calentamiento ({ticks_calentamiento} ticks, {len(hist_wmp)} precargados)...")
+        
+        while len(hist_wmp) < ticks_calentamiento:
             wmp_obs = tracker.obtener_wmp_l2(TOKEN_A_SEGUIR)
             vol_diff_obs = tracker.obtener_volume_diff(TOKEN_A_SEGUIR)
-            kappa_estimada_real = tracker.obtener_kappa(TOKEN_A_SEGUIR) 
+            kappa_estimada_real = tracker.obtener_kappa(TOKEN_A_SEGUIR, fuente=FUENTE_KAPPA) 
 
             if wmp_obs > 0 and wmp_obs != ultimo_wmp_visto:
                 if enable_live_plotting:
-                    print(f"[{run_id}] CALENTANDO... Tick {len(hist_wmp)+1}/{WARMUP_TICKS} | WMP={wmp_obs:.5f}", end="\r")
-                
-                hist_wmp.append(wmp_obs)
-                hist_vol_diff.append(vol_diff_obs)
-                
-                hist_kalman_p.append(wmp_obs); hist_reserva_p.append(np.nan)
-                hist_nuestro_bid.append(np.nan); hist_nuestro_ask.append(np.nan)
-                hist_inventario.append(0); hist_pnl.append(0)
-                hist_gamma.append(GAMMA_BASE); hist_sigma.append(0.01)
-                hist_Q.append(0); hist_R.append(0)
-                hist_kappa.append(kappa_estimada_real)
+                    print(f"[{run_id}] CALENTANDO... Tick {len(hist_wmp)+1}/{ticks_calentamiento} | WMP={wmp_obs:.5f}", end="\r")
                 
-                current_state_mean = F @ current_state_mean 
-                current_state_mean[0] = wmp_obs
-                current_state_mean[2] = vol_diff_obs
-                ultimo_wmp_visto = wmp_obs
+                registrar_tick_calentamiento(wmp_obs, vol_diff_obs, kappa_estimada_real)
             
-            await asyncio.sleep(INTERVALO_TICK)
+            await esperar_siguiente_tick()
 
         # ==============================================================================
         # FASE 2: CALIBRACIÓN
         # ==============================================================================
         print(f"\n[{run_id}] Calibrando parámetros...")
         
-        if Q_BASE_DIAG_PARAM is None or R_BASE_DIAG_PARAM is None:
-            calibrator = KalmanMLECalibrator(hist_wmp, hist_vol_diff)
-            Q_BASE_DIAG, R_BASE_DIAG = calibrator.fit()
-        else:
-            Q_BASE_DIAG, R_BASE_DIAG = Q_BASE_DIAG_PARAM, R_BASE_DIAG_PARAM
-
-        if SIGMA_BASE_PARAM is None:
-            if 'calibrator' not in locals():
-                calibrator = KalmanMLECalibrator(hist_wmp, hist_vol_diff)
-            kalman_prices_warmup = calibrator.filter_data(Q_BASE_DIAG, R_BASE_DIAG)
-            SIGMA_BASE = np.std(np.diff(kalman_prices_warmup))
+        # La MLE se ejecuta fuera del bucle de eventos: el WebSocket sigue leyendo mientras se calibra.
+        # Hasta que termina se usan los parámetros de respaldo (o se espera, según la configuración).
+        Q_BASE_DIAG = Q_BASE_DIAG_PARAM if Q_BASE_DIAG_PARAM is not None else Q_BASE_FALLBACK
+        R_BASE_DIAG = R_BASE_DIAG_PARAM if R_BASE_DIAG_PARAM is not None else R_BASE_FALLBACK
+        SIGMA_BASE = SIGMA_BASE_PARAM
+        if calibracion_cacheada is not None:
+            if Q_BASE_DIAG_PARAM is None or R_BASE_DIAG_PARAM is None:
+                Q_BASE_DIAG, R_BASE_DIAG = calibracion_cacheada['Q'], calibracion_cacheada['R']
+            if SIGMA_BASE is None:
+                SIGMA_BASE = calibracion_cacheada['sigma']
+        if SIGMA_BASE is None:
+            SIGMA_BASE = np.std(np.diff(hist_wmp)) if len(hist_wmp) > 1 else 0.0 # Respaldo: volatilidad sin filtrar
             if SIGMA_BASE == 0: SIGMA_BASE = 0.01
-        else:
-            SIGMA_BASE = SIGMA_BASE_PARAM
+
+        # Punto de partida de la MLE: última calibración buena de la familia (cualquier franja)
+        punto_inicial = None
+        if almacen_calibraciones is not None:
+            ultima_calibracion = almacen_calibraciones.ultima(familia_mercado)
+            if ultima_calibracion is not None:
+                punto_inicial = (ultima_calibracion['Q'], ultima_calibracion['R'])
+
+        def lanzar_calibracion(wmp, vol_diff, punto_inicial):
+            """Lanza la MLE en segundo plano sobre una copia de los datos."""
+            return asyncio.create_task(calibrar_en_segundo_plano(
+                list(wmp), list(vol_diff), Q_BASE_DIAG_PARAM, R_BASE_DIAG_PARAM,
+                timeout=TIMEOUT_CALIBRACION, usar_proceso=CALIBRAR_EN_PROCESO,
+                multiarranque=CALIBRACION_MULTIARRANQUE, presupuesto=PRESUPUESTO_CALIBRACION,
+                punto_inicial=punto_inicial))
+
+        def guardar_calibracion():
+            """Guarda en el almacén la calibración vigente de la familia."""
+            if almacen_calibraciones is not None:
+                kappa = KAPPA_BASE if not kappa_fallback_usado else None
+                almacen_calibraciones.guardar(familia_mercado, Q_BASE_DIAG, R_BASE_DIAG, SIGMA_BASE, kappa, reloj.ahora())
+
+        if calibracion_cacheada is None and (Q_BASE_DIAG_PARAM is None or R_BASE_DIAG_PARAM is None or SIGMA_BASE_PARAM is None):
+            if REPRODUCIR_CAPTURA:
+                # En reproducción el reloj virtual no avanza mientras se calibra: en línea es determinista
+                # (sin límite de tiempo, que dependería de la velocidad de la máquina)
+                Q_BASE_DIAG, R_BASE_DIAG, SIGMA_BASE = calibrar_kalman(hist_wmp, hist_vol_diff, Q_BASE_DIAG_PARAM, R_BASE_DIAG_PARAM,
+                                                                       CALIBRACION_MULTIARRANQUE, float("inf"))
+            else:
+                tarea_calibracion = lanzar_calibracion(hist_wmp, hist_vol_diff, punto_inicial)
+
+                if not COTIZAR_DURANTE_CALIBRACION:
+                    await asyncio.wait([tarea_calibracion])
+                else:
+                    print(f"[{run_id}] Cotizando con parámetros de respaldo mientras se calibra...")
+
+        def aplicar_calibracion():
+            """Pasa a los parámetros calibrados en cuanto la tarea termina (entre dos ticks)."""
+            nonlocal tarea_calibracion, Q_BASE_DIAG, R_BASE_DIAG, SIGMA_BASE
+            if tarea_calibracion is None or not tarea_calibracion.done(): return
+            try:
+                Q_BASE_DIAG, R_BASE_DIAG, SIGMA_BASE = tarea_calibracion.result()
+                filtro_kalman.configurar(Q_BASE_DIAG, R_BASE_DIAG)
+                print(f"[{run_id}] Calibración Kalman aplicada (SIGMA_BASE={SIGMA_BASE:.5f}).")
+                guardar_calibracion()
+            except asyncio.TimeoutError:
+                print(f"[{run_id}] ⚠️ La calibración superó {TIMEOUT_CALIBRACION}s. Se mantienen los parámetros de respaldo.")
+            except Exception as e:
+                print(f"[{run_id}] ⚠️ Calibración fallida ({e}). Se mantienen los parámetros de respaldo.")
+            tarea_calibracion = None
         
-        KAPPA_BASE = np.nanmean(hist_kappa) 
+        KAPPA_BASE = np.nanmean(hist_kappa) if np.any(~np.isnan(hist_kappa)) else np.nan
+        if np.isnan(KAPPA_BASE) and calibracion_cacheada is not None and calibracion_cacheada.get('kappa') is not None:
+            KAPPA_BASE = calibracion_cacheada['kappa'] # Sin calentamiento: Kappa de la calibración guardada
         if np.isnan(KAPPA_BASE) or KAPPA_BASE < 1e-4:
             print(f"[{run_id}] Calibración KAPPA fallida. Usando Fallback: {KAPPA_FALLBACK}")
             KAPPA_BASE = KAPPA_FALLBACK
@@ -231,98 +422,139 @@ async def ejecutar_sesion_market_maker(params, run_id="RUN", enable_live_plottin
         else:
             print(f"[{run_id}] KAPPA_BASE CALIBRADO: {KAPPA_BASE:.4f}")
 
-        hist_sigma = [SIGMA_BASE] * WARMUP_TICKS
-        hist_kappa = [KAPPA_BASE] * WARMUP_TICKS
+        filtro_kalman.configurar(Q_BASE_DIAG, R_BASE_DIAG)
+        aplicar_calibracion()
+
+        hist_sigma = [SIGMA_BASE] * len(hist_wmp)
+
+        # Volatilidad móvil incremental, sembrada con la cola del calentamiento
+        volatilidad = crear_volatilidad(METODO_VOLATILIDAD, ROLLING_VOL_WINDOW)
+        for precio in hist_kalman_p[-ROLLING_VOL_WINDOW:]:
+            volatilidad.actualizar(precio)
+        hist_kappa = [KAPPA_BASE] * len(hist_wmp)
         is_calibrated = True
+        
+        # Con un cierre fijo (rollover) la Fase 3 dura lo que quede hasta ese instante
+        if FIN_SESION is not None:
+            TIEMPO_TOTAL_EJECUCION = max(FIN_SESION - reloj.ahora(), 0)
 
         avellaneda_strategy = AvellanedaStrategy(
             gamma_base=GAMMA_BASE,
             tiempo_total=TIEMPO_TOTAL_EJECUCION,
-            max_inventario=MAX_INVENTARIO
+            max_inventario=MAX_INVENTARIO,
+            n_capas=N_CAPAS,
+            ticks_entre_capas=TICKS_ENTRE_CAPAS,
+            perfil_tamano=PERFIL_TAMANO_CAPAS,
+            tick=TICK_PRECIO
         )
+        if USAR_TABLAS_ESTRATEGIA:
+            avellaneda_strategy.precalcular_tablas(KAPPA_BASE, medir_desviacion=MEDIR_DESVIACION_TABLAS)
 
         # ==============================================================================
         # FASE 3: EJECUCIÓN ADAPTATIVA (TRADING LOOP)
         # ==============================================================================
         print(f"[{run_id}] Iniciando Trading por {TIEMPO_TOTAL_EJECUCION}s...")
-        start_time_ejecucion = time.time()
+        start_time_ejecucion = reloj.ahora()
         
-        while tiempo_transcurrido_ejecucion <= TIEMPO_TOTAL_EJECUCION: 
-            tiempo_actual = time.time()
+        while tiempo_transcurrido_ejecucion < TIEMPO_TOTAL_EJECUCION: 
+            tiempo_actual = reloj.ahora()
             tiempo_transcurrido_ejecucion = tiempo_actual - start_time_ejecucion
             tiempo_restante = TIEMPO_TOTAL_EJECUCION - tiempo_transcurrido_ejecucion
+            aplicar_calibracion()
             
             wmp_obs = tracker.obtener_wmp_l2(TOKEN_A_SEGUIR)
             vol_diff_obs = tracker.obtener_volume_diff(TOKEN_A_SEGUIR)
             best_bid_real = tracker.obtener_mejor_bid(TOKEN_A_SEGUIR)
             best_ask_real = tracker.obtener_mejor_ask(TOKEN_A_SEGUIR)
-            z_t = np.array([wmp_obs, vol_diff_obs])
             
-            if wmp_obs > 0 and wmp_obs != ultimo_wmp_visto:
+            # --- Guarda: no cotizar contra un libro que puede no estar al día ---
+            antiguedad_datos = tracker.obtener_antiguedad(TOKEN_A_SEGUIR)
+            if antiguedad_datos > MAX_ANTIGUEDAD_DATOS:
+                if not cotizacion_pausada:
+                    print(f"\n[{run_id}] ⚠️ Datos obsoletos ({antiguedad_datos:.1f}s sin confirmar). Pausando cotización...")
+                    cotizacion_pausada = True
+                    pausas_datos_obsoletos += 1
+                    if MODO_REAL and gestor_ordenes:
+                        gestor_ordenes.cancelar_todo()
+            elif cotizacion_pausada:
+                print(f"[{run_id}] ✅ Libro resincronizado. Reanudando cotización.")
+                cotizacion_pausada = False
+                ultimo_wmp_visto = None # Recotizar aunque el precio no haya cambiado
+            
+            if not cotizacion_pausada and wmp_obs > 0 and wmp_obs != ultimo_wmp_visto:
                 
                 # --- A. Kalman Adaptativo ---
-                window = min(len(hist_kalman_p), ROLLING_VOL_WINDOW)
-                rolling_sigma = np.std(np.diff(hist_kalman_p[-window:]))
-                if rolling_sigma == 0: rolling_sigma = SIGMA_BASE
+                rolling_sigma = volatilidad.sigma # O(1): mantenida al añadir cada precio justo
+                # Con la ventana aún corta (calentamiento reducido) se usa la sigma calibrada
+                if rolling_sigma == 0 or not volatilidad.completa: rolling_sigma = SIGMA_BASE
                 
-                Q_dynamic = np.diag(Q_BASE_DIAG) * (1 + rolling_sigma * Q_FACTOR_VOL)
+                # Q y R dinámicos: Q_BASE * factor_q y R_BASE * factor_r
+                factor_q = 1 + rolling_sigma * Q_FACTOR_VOL
                 spread_mercado = abs(best_ask_real - best_bid_real)
-                R_dynamic = np.diag(R_BASE_DIAG) * (1 + spread_mercado * R_FACTOR_SPREAD)
-
-                predicted_state_mean = F @ current_state_mean
-                predicted_state_cov = F @ current_state_cov @ F.T + Q_dynamic
-                innovation = z_t - H @ predicted_state_mean
-                innovation_cov = H @ predicted_state_cov @ H.T + R_dynamic
-                kalman_gain = predicted_state_cov @ H.T @ np.linalg.inv(innovation_cov)
-                current_state_mean = predicted_state_mean + kalman_gain @ innovation
-                current_state_cov = (I - kalman_gain @ H) @ predicted_state_cov
-                precio_justo_kalman = current_state_mean[0]
+                factor_r = 1 + spread_mercado * R_FACTOR_SPREAD
+                precio_justo_kalman = filtro_kalman.actualizar(wmp_obs, vol_diff_obs, factor_q, factor_r)
                 
                 # --- B. Simulación de Ejecución (Solo visual para gráficos) ---
-                if not np.isnan(hist_nuestro_bid[-1]):
-                    if best_ask_real > 0 and best_ask_real <= hist_nuestro_bid[-1] and inventario < MAX_INVENTARIO:
+                # Cada nivel de la escalera anterior que el mercado cruza se ejecuta (1 unidad por nivel).
+                # Tras una pausa las cotizaciones anteriores ya no están en el libro
+                ordenes_vivas = ultimo_wmp_visto is not None
+                for capa in range(N_CAPAS if ordenes_vivas else 0):
+                    bid_capa = hist_bid_capas[capa][-1]
+                    if not np.isnan(bid_capa) and best_ask_real > 0 and best_ask_real <= bid_capa and inventario < MAX_INVENTARIO:
                         inventario += 1
-                        cash -= hist_nuestro_bid[-1]
-                        trades_bid_ejecutados += 1
+                        cash -= bid_capa
+                        bid_ejecutados_capa[capa] += 1
                         
-                if not np.isnan(hist_nuestro_ask[-1]):
-                    if best_bid_real > 0 and best_bid_real >= hist_nuestro_ask[-1] and inventario > -MAX_INVENTARIO:
+                    ask_capa = hist_ask_capas[capa][-1]
+                    if not np.isnan(ask_capa) and best_bid_real > 0 and best_bid_real >= ask_capa and inventario > -MAX_INVENTARIO:
                         inventario -= 1
-                        cash += hist_nuestro_ask[-1]
-                        trades_ask_ejecutados += 1
+                        cash += ask_capa
+                        ask_ejecutados_capa[capa] += 1
                 
                 # --- C. Estrategia Avellaneda ---
-                bid_optimo, ask_optimo, precio_reserva, gamma_actual = avellaneda_strategy.calcular_spread_optimo(
+                # Con la fuente "trades" Kappa se actualiza en vivo; si aún no hay estimación se usa la calibrada
+                kappa_actual = KAPPA_BASE
+                if FUENTE_KAPPA == "trades":
+                    kappa_trades = tracker.obtener_kappa(TOKEN_A_SEGUIR, fuente="trades")
+                    if not np.isnan(kappa_trades): kappa_actual = kappa_trades
+                
+                bid_optimo, ask_optimo, precio_reserva, gamma_actual = avellaneda_strategy.cotizar(
                     inventario=inventario,
                     precio_justo_kalman=precio_justo_kalman,
-                    kappa=KAPPA_BASE,
+                    kappa=kappa_actual,
                     sigma=rolling_sigma,
                     tiempo_transcurrido=tiempo_transcurrido_ejecucion
                 )
+                bids_capas, asks_capas, perfil_tamano = avellaneda_strategy.calcular_escalera(bid_optimo, ask_optimo)
+                bids_capas, asks_capas = bids_capas.tolist(), asks_capas.tolist()
 
                 # --- D. ENVÍO DE ÓRDENES REALES ---
-                if MODO_REAL and wallet:
-                    wallet.cancelar_todas_las_ordenes()
-                    
-                    if not np.isnan(bid_optimo):
-                        size_shares_bid = SIZE_USDC / bid_optimo
-                        resp_bid = wallet.colocar_orden(TOKEN_ID_LARGO, bid_optimo, size_shares_bid, "BUY")
-                        if resp_bid: trades_bid_colocados += 1
-                        
-                    if not np.isnan(ask_optimo):
-                        size_shares_ask = SIZE_USDC / ask_optimo
-                        resp_ask = wallet.colocar_orden(TOKEN_ID_LARGO, ask_optimo, size_shares_ask, "SELL")
-                        if resp_ask: trades_ask_colocados += 1
+                # Se cancela solo lo que ya no está en la escalera y se coloca lo que falta (en un único lote)
+                ordenes = [(capa, "BUY", precio) for capa, precio in enumerate(bids_capas) if not np.isnan(precio)]
+                ordenes += [(capa, "SELL", precio) for capa, precio in enumerate(asks_capas) if not np.isnan(precio)]
+                # Trades del mercado desde la recotización anterior: se consumen en todos los modos
+                precios_trade = tracker.consumir_precios_trade(TOKEN_A_SEGUIR)
+                if MODO_REAL and gestor_ordenes:
+                    # Un trade a un precio nuestro puede haber ejecutado una orden conservada: se reconcilia antes
+                    gestor_ordenes.registrar_trades(TOKEN_ID_LARGO, precios_trade)
+                    ids_ordenes = gestor_ordenes.sincronizar(TOKEN_ID_LARGO, [(lado, precio, SIZE_USDC * perfil_tamano[capa] / precio)
+                                                                              for capa, lado, precio in ordenes])
                 else:
-                    if not np.isnan(bid_optimo): trades_bid_colocados += 1
-                    if not np.isnan(ask_optimo): trades_ask_colocados += 1
+                    ids_ordenes = [True] * len(ordenes)
+                # Solo cuentan las órdenes colocadas en este tick (no las que se conservan en cola)
+                for (capa, lado, _), id_orden in zip(ordenes, ids_ordenes):
+                    if not id_orden: continue
+                    if lado == "BUY": bid_colocados_capa[capa] += 1
+                    else: ask_colocados_capa[capa] += 1
                 
                 # --- E. Guardar y Plotear ---
                 valor_inventario = inventario * precio_justo_kalman
                 total_pnl = cash + valor_inventario
                 
                 hist_wmp.append(wmp_obs)
+                hist_vol_diff.append(vol_diff_obs)
                 hist_kalman_p.append(precio_justo_kalman)
+                volatilidad.actualizar(precio_justo_kalman)
                 hist_reserva_p.append(precio_reserva)
                 hist_nuestro_bid.append(bid_optimo)
                 hist_nuestro_ask.append(ask_optimo)
@@ -330,48 +562,93 @@ async def ejecutar_sesion_market_maker(params, run_id="RUN", enable_live_plottin
                 hist_pnl.append(total_pnl)
                 hist_gamma.append(gamma_actual)
                 hist_sigma.append(rolling_sigma)
-                hist_Q.append(Q_dynamic[0,0])
-                hist_R.append(R_dynamic[0,0])
-                hist_kappa.append(KAPPA_BASE)
+                hist_Q.append(Q_BASE_DIAG[0] * factor_q)
+                hist_R.append(R_BASE_DIAG[0] * factor_r)
+                hist_kappa.append(kappa_actual)
+                for capa in range(N_CAPAS):
+                    hist_bid_capas[capa].append(bids_capas[capa]); hist_ask_capas[capa].append(asks_capas[capa])
 
                 if enable_live_plotting and plotter:
                     hist_data['nuestro_bid'] = hist_nuestro_bid
                     hist_data['nuestro_ask'] = hist_nuestro_ask
                     
-                    print(f"[{run_id}] T-{int(tiempo_restante)}s | Inv={inventario} | P&L={total_pnl:+.4f} | K={KAPPA_BASE:.1f}", end="\r")
+                    print(f"[{run_id}] T-{int(tiempo_restante)}s | Inv={inventario} | P&L={total_pnl:+.4f} | K={kappa_actual:.1f}", end="\r")
                     plotter.update(hist_data, inventario, total_pnl, tiempo_restante)
                 
                 ultimo_wmp_visto = wmp_obs
 
-            await asyncio.sleep(INTERVALO_TICK)
+                # Se cotiza con la calibración guardada: en cuanto hay un calentamiento completo
+                # de datos en vivo se recalibra en segundo plano (partiendo de ella) y se cambia al terminar
+                if refresco_pendiente and tarea_calibracion is None and len(hist_wmp) - ticks_calentamiento >= WARMUP_TICKS:
+                    refresco_pendiente = False
+                    tarea_calibracion = lanzar_calibracion(hist_wmp[-WARMUP_TICKS:], hist_vol_diff[-WARMUP_TICKS:],
+                                                           (Q_BASE_DIAG, R_BASE_DIAG))
+
+            # Esperar al siguiente cambio, como mucho hasta el final de la sesión. Sin cambios
+            # (feed caído) se despierta igualmente para revisar la antigüedad de los datos.
+            await esperar_siguiente_tick(timeout=max(min(TIEMPO_TOTAL_EJECUCION - (reloj.ahora() - start_time_ejecucion),
+                                                         MAX_ANTIGUEDAD_DATOS / 2), 0))
 
     except KeyboardInterrupt:
         print(f"\n[{run_id}] Detenido por usuario.")
-        if MODO_REAL and wallet:
+        if MODO_REAL and gestor_ordenes:
             print(f"[{run_id}] Cancelando órdenes abiertas...")
-            wallet.cancelar_todas_las_ordenes()
+            gestor_ordenes.cancelar_todo()
     
     finally:
         # ==============================================================================
         # 5. CIERRE SEGURO
         # ==============================================================================
-        await tracker.detener_escucha()
-        await listener_task 
-        
-        if MODO_REAL and wallet:
+        if tarea_calibracion is not None:
+            tarea_calibracion.cancel()
+
+        # Primero las órdenes: que nada de lo que sigue pueda dejarlas vivas en el exchange
+        if MODO_REAL and gestor_ordenes:
             print(f"[{run_id}] 🧹 Limpiando órdenes pendientes en el mercado...")
-            wallet.cancelar_todas_las_ordenes()
+            gestor_ordenes.cancelar_todo()
+
+        if tracker_propio:
+            try:
+                await tracker.detener_escucha()
+                await listener_task
+            except Exception as e:
+                print(f"[{run_id}] ⚠️ El rastreador terminó con error: {e!r}")
         
-        tiempo_sesion_total = time.time() - start_time_total_sesion
+        tiempo_sesion_total = reloj.ahora() - start_time_total_sesion
         
         if enable_live_plotting and plotter:
             try: clear_output(wait=True)
             except: pass
-            if len(hist_wmp) >= WARMUP_TICKS:
+            if len(hist_wmp) >= ticks_calentamiento:
                 plotter.update(hist_data, inventario, total_pnl, 0)
         
         print(f"[{run_id}] Sesión Finalizada.")
         print(f"[{run_id}] P&L Estimado: {total_pnl:+.5f} | Inventario Final: {inventario}")
+        if pausas_datos_obsoletos:
+            print(f"[{run_id}] Pausas por datos obsoletos: {pausas_datos_obsoletos}")
+        if filtro_kalman is not None and filtro_kalman.cache_ganancias is not None:
+            cache_ganancias = filtro_kalman.cache_ganancias
+            print(f"[{run_id}] Caché de ganancias Kalman: {cache_ganancias.tasa_aciertos:.1%} aciertos "
+                  f"({cache_ganancias.estadisticas['fallos']} regímenes calculados)", end="")
+            if MEDIR_ERROR_CACHE_KALMAN:
+                print(f" | Error precio vs exacto: medio {filtro_kalman.error_medio:.2e}, máx {filtro_kalman.error_max:.2e}", end="")
+            print()
+        if gestor_ordenes is not None:
+            estadisticas_ordenes = gestor_ordenes.estadisticas
+            print(f"[{run_id}] Órdenes: {estadisticas_ordenes['llamadas_api']} llamadas a la API "
+                  f"({gestor_ordenes.llamadas_ahorradas} ahorradas frente a cancelar todo y reenviar en lote) | "
+                  f"{estadisticas_ordenes['sin_cambios']}/{estadisticas_ordenes['recotizaciones']} recotizaciones sin cambios | "
+                  f"{estadisticas_ordenes['ordenes_conservadas']} órdenes mantenidas en cola "
+                  f"({estadisticas_ordenes['parciales_conservadas']} ejecutadas en parte) | "
+                  f"{estadisticas_ordenes['invalidaciones_por_trade']} reconciliaciones por trades")
+        if avellaneda_strategy is not None and avellaneda_strategy.kappa_tablas is not None:
+            consultas = avellaneda_strategy.estadisticas
+            print(f"[{run_id}] Tablas de la estrategia: {consultas['consultas_tabla']} cotizaciones tabuladas, "
+                  f"{consultas['consultas_directas']} directas", end="")
+            if MEDIR_DESVIACION_TABLAS:
+                print(f" | Desviación vs fórmula: media {avellaneda_strategy.desviacion_media:.2e}, "
+                      f"máx {avellaneda_strategy.desviacion_max:.2e}", end="")
+            print()
 
         # Guardado de CSV/PNG
         resultados_finales = {
@@ -383,7 +660,14 @@ async def ejecutar_sesion_market_maker(params, run_id="RUN", enable_live_plottin
             'inventario_final': inventario,
             'cash_final': round(cash, 5), # AÑADIDO: Cash Final
             'kappa_calibrada': round(KAPPA_BASE, 4) if is_calibrated else np.nan,
+            'n_capas': N_CAPAS,
+            'ticks_entre_capas': TICKS_ENTRE_CAPAS,
         }
+        for capa in range(N_CAPAS):
+            resultados_finales[f'bid_colocados_capa_{capa}'] = bid_colocados_capa[capa]
+            resultados_finales[f'ask_colocados_capa_{capa}'] = ask_colocados_capa[capa]
+            resultados_finales[f'bid_ejecutados_capa_{capa}'] = bid_ejecutados_capa[capa]
+            resultados_finales[f'ask_ejecutados_capa_{capa}'] = ask_ejecutados_capa[capa]
         
         if save_individual_files:
             print(f"[{run_id}] Guardando datos...")
@@ -404,4 +688,77 @@ async def ejecutar_sesion_market_maker(params, run_id="RUN", enable_live_plottin
                 print(f"Error guardando: {e}")
 
         if plotter: plotter.close()
-        return resultados_finales
\ No newline at end of file
+        return resultados_finales
+
+async def ejecutar_sesiones_continuas(params, n_ventanas=None, run_id="ROLL", enable_live_plotting=False, save_individual_files=True):
+    """
+    Encadena sesiones sobre ventanas consecutivas (BTC Up/Down 15m) sin tiempo muerto entre ellas.
+    Una sola conexión WebSocket sirve a ambos mercados: el 'PlanificadorRollover' suscribe el
+    siguiente mercado antes del cierre, recoge su calentamiento y calibra el filtro en segundo
+    plano, de modo que la nueva sesión empieza a cotizar en cuanto termina la anterior.
+    
+    :param n_ventanas: Número de ventanas a operar (None = indefinidamente).
+    :return: Lista con los resultados de cada sesión.
+    """
+    SLUG_MERCADO = params.get('SLUG_MERCADO')
+    DURACION_VENTANA = params.get('DURACION_VENTANA', 900)
+    ANTELACION_ROLLOVER = params.get('ANTELACION_ROLLOVER', 60.0)
+    MARGEN_CIERRE_VENTANA = params.get('MARGEN_CIERRE_VENTANA', 5.0)
+    FUENTE_KAPPA = params.get('FUENTE_KAPPA', "libro")
+    
+    grabador = GrabadorMercado(params.get('DIRECTORIO_CAPTURAS', "Data/capturas")) if params.get('GRABAR_MERCADO', False) else None
+    tracker = RastreadorPolymarket(SLUG_MERCADO, metodo_kappa=params.get('METODO_KAPPA', "curve_fit"),
+                                   intervalo_kappa=params.get('INTERVALO_KAPPA', 0.0), grabador=grabador)
+    if not tracker.obtener_datos_evento():
+        raise ValueError(f"No se encontró el evento: {SLUG_MERCADO}")
+    if not tracker.seleccionar_sub_mercado(0):
+        raise ValueError("No se pudo seleccionar el mercado.")
+    
+    primer_outcome = json.loads(tracker.datos_mercado_seleccionado.get("outcomes", "[]"))[0]
+    traspaso = {'nombre_mercado': SLUG_MERCADO, 'token': tracker.mapa_tokens.get(primer_outcome),
+                'precalentamiento': None, 'calibracion': None}
+    
+    # Las calibraciones del planificador también alimentan el almacén (y arrancan desde él)
+    almacen_calibraciones = AlmacenCalibraciones() if params.get('USAR_ALMACEN_CALIBRACIONES', False) else None
+    opciones_calibracion = {'multiarranque': params.get('CALIBRACION_MULTIARRANQUE', False),
+                            'presupuesto': params.get('PRESUPUESTO_CALIBRACION', 1.0)}
+    if almacen_calibraciones is not None:
+        ultima_calibracion = almacen_calibraciones.ultima(familia_de_mercado(SLUG_MERCADO))
+        if ultima_calibracion is not None:
+            opciones_calibracion['punto_inicial'] = (ultima_calibracion['Q'], ultima_calibracion['R'])
+    
+    listener_task = asyncio.create_task(tracker.conectar_y_escuchar())
+    planificador = PlanificadorRollover(tracker, SLUG_MERCADO, params.get('WARMUP_TICKS'),
+                                        duracion_ventana=DURACION_VENTANA, antelacion=ANTELACION_ROLLOVER,
+                                        timeout_calibracion=params.get('TIMEOUT_CALIBRACION', 60.0),
+                                        opciones_calibracion=opciones_calibracion)
+    planificador.iniciar(FUENTE_KAPPA)
+    
+    resultados = []
+    try:
+        while n_ventanas is None or len(resultados) < n_ventanas:
+            params_sesion = dict(params)
+            params_sesion['SLUG_MERCADO'] = traspaso['nombre_mercado']
+            params_sesion['FIN_SESION'] = planificador.fin_ventana - MARGEN_CIERRE_VENTANA
+            if traspaso['calibracion'] is not None:
+                params_sesion['Q_BASE_DIAG'], params_sesion['R_BASE_DIAG'], params_sesion['SIGMA_BASE'] = traspaso['calibracion']
+                if almacen_calibraciones is not None:
+                    # Franja y antigüedad con el reloj del rastreador, como en la propia sesión (virtual al reproducir)
+                    almacen_calibraciones.guardar(familia_de_mercado(traspaso['nombre_mercado']), *traspaso['calibracion'],
+                                                  instante=tracker.reloj.ahora())
+            
+            id_ventana = f"{run_id}_{epoch_de_mercado(traspaso['nombre_mercado'])}"
+            resultados.append(await ejecutar_sesion_market_maker(
+                params_sesion, run_id=id_ventana, enable_live_plotting=enable_live_plotting,
+                save_individual_files=save_individual_files, tracker=tracker,
+                token=traspaso['token'], precalentamiento=traspaso['precalentamiento']))
+            
+            if n_ventanas is not None and len(resultados) >= n_ventanas:
+                break
+            traspaso = await planificador.traspasar(FUENTE_KAPPA)
+    finally:
+        await planificador.detener()
+        await tracker.detener_escucha()
+        await listener_task
+    
+    return resultados
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+#################################################################
+# Catálogo de metadatos de mercados (gamma API de Polymarket)
+#################################################################
+# Resuelve slug -> evento (sub-mercados, IDs de tokens, resultados) con:
+#  - Una sesión HTTP persistente (reutiliza la conexión TLS entre consultas).
+#  - Caché en memoria y en disco con caducidad: los IDs de los tokens de un
+#    mercado no cambian, así que al relanzar el bot no hace falta volver a pedirlos.
+#  - Precarga en segundo plano de los mercados que se van a necesitar.
+
+API_EVENTOS_URL = "https://gamma-api.polymarket.com/events"
+RUTA_CACHE = os.path.join("Data", "cache", "eventos_gamma.json")
+
+class CatalogoMercados:
+    """
+    Consulta y cachea los eventos de la gamma API.
+    Es seguro usarlo desde varios hilos (las consultas se lanzan con 'asyncio.to_thread').
+    """
+
+    def __init__(self, ruta_cache=RUTA_CACHE, ttl=3600.0, timeout=5.0):
+        """
+        :param ruta_cache: Fichero JSON de la caché en disco (None = solo memoria).
+        :param ttl: Segundos que una entrada de la caché se considera válida.
+        :param timeout: Segundos máximos de cada petición HTTP (conexión y lectura).
+        """
+        self.ruta_cache = ruta_cache
+        self.ttl = ttl
+        self.timeout = timeout
+
+        # Sesión HTTP con pool de conexiones y reintentos ante errores transitorios
+        self.sesion = requests.Session()
+        reintentos = Retry(total=2, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504))
+        self.sesion.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=reintentos))
+
+        self._cache = None # Mapeo slug -> {'instante': epoch de la consulta, 'evento': dict}
+        self._lock = threading.Lock()
+        self.estadisticas = {"aciertos": 0, "fallos": 0, "peticiones": 0}
+
+    # ==============================================================================
+    # SECCIÓN: CACHÉ EN DISCO
+    # ==============================================================================
+
+    def _cargar_cache(self):
+        """Lee la caché de disco la primera vez que se necesita (llamar con el lock tomado)."""
+        if self._cache is not None: return
+        self._cache = {}
+        if not self.ruta_cache or not os.path.exists(self.ruta_cache): return
+        try:
+            with open(self.ruta_cache, encoding="utf-8") as f:
+                self._cache = json.load(f)
+        except (OSError, ValueError):
+            # Caché corrupta o ilegible: se reconstruye con las próximas consultas
+            self._cache = {}
+
+    def _guardar_cache(self):
+        """Escribe la caché en disco de forma atómica (llamar con el lock tomado)."""
+        if not self.ruta_cache: return
+        try:
+            os.makedirs(os.path.dirname(self.ruta_cache) or ".", exist_ok=True)
+            temporal = f"{self.ruta_cache}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(self._cache, f)
+            os.replace(temporal, self.ruta_cache)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar la caché de mercados: {e}")
+
+    # ==============================================================================
+    # SECCIÓN: CONSULTAS
+    # ==============================================================================
+
+    def obtener_evento(self, slug, forzar=False):
+        """
+        Devuelve el evento con ese slug (o None si no existe o la API falla).
+        Solo se cachean los eventos encontrados: un mercado futuro que aún no
+        existe se vuelve a consultar en la siguiente llamada.
+
+        :param forzar: Ignorar la caché y consultar la API.
+        """
+        with self._lock:
+            self._cargar_cache()
+            entrada = self._cache.get(slug)
+            if not forzar and entrada and time.time() - entrada["instante"] < self.ttl:
+                self.estadisticas["aciertos"] += 1
+                return entrada["evento"]
+            self.estadisticas["fallos"] += 1
+
+        evento = self._consultar_api(slug)
+        if evento is None: return None
+
+        with self._lock:
+            self._cache[slug] = {"instante": time.time(), "evento": evento}
+            self._guardar_cache()
+        return evento
+
+    def _consultar_api(self, slug):
+        """Petición HTTP a la gamma API con la sesión persistente."""
+        self.estadisticas["peticiones"] += 1
+        try:
+            r = self.sesion.get(API_EVENTOS_URL, params={"slug": slug}, timeout=self.timeout)
+            r.raise_for_status()
+            respuesta = r.json()
+            return respuesta[0] if respuesta else None
+        except (requests.RequestException, ValueError):
+            return None
+
+    async def precargar(self, slugs):
+        """
+        Consulta en segundo plano (hilos) varios slugs a la vez para que estén en caché
+        cuando se necesiten.
+
+        :return: Número de eventos disponibles tras la precarga.
+        """
+        eventos = await asyncio.gather(*(asyncio.to_thread(self.obtener_evento, s) for s in slugs))
+        return sum(e is not None for e in eventos)
+
+    def cerrar(self):
+        """Libera las conexiones del pool HTTP."""
+        self.sesion.close()
+
+_catalogo_compartido = None
+
+def catalogo_compartido():
+    """Catálogo único del proceso: varias sesiones y rastreadores comparten pool HTTP y caché."""
+    global _catalogo_compartido
+    if _catalogo_compartido is None:
+        _catalogo_compartido = CatalogoMercados()
+    return _catalogo_compartido
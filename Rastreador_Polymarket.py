@@ -1,26 +1,72 @@
 import re
 import json
-import requests
+import time
+import random
+from collections import deque
 import asyncio
 import websockets
 from datetime import datetime, timedelta
 import numpy as np
 from scipy.optimize import curve_fit
 
+from Libro_Ordenes import LibroOrdenes
+from Estimador_Kappa import ajustar_kappa_log_lineal, EstimadorKappaTrades
+from Decodificador_WS import decodificar_frame, normalizar_eventos
+from Metadatos_Mercado import API_EVENTOS_URL, catalogo_compartido
+
+# Errores de un frame/evento mal formado (JSON inválido, campos que faltan o nulos).
+# Se descarta ese frame o evento y la ingesta sigue: un mensaje raro no debe parar el procesador.
+ERRORES_MENSAJE = (ValueError, KeyError, TypeError, AttributeError)
+
+class RelojSistema:
+    """
+    Reloj de tiempo real del rastreador (segundos epoch).
+    En reproducción se sustituye por un reloj virtual con la misma interfaz
+    (ver 'Reproductor_Mercado.RelojReproduccion').
+    """
+
+    def ahora(self):
+        return time.time()
+
+    async def dormir(self, segundos):
+        await asyncio.sleep(max(segundos, 0))
+
+    async def esperar(self, evento, timeout=None):
+        """Espera a un asyncio.Event como mucho 'timeout' segundos. Devuelve False si se agota."""
+        try:
+            await asyncio.wait_for(evento.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
 class RastreadorPolymarket:
-    def __init__(self, nombre_mercado):
+    def __init__(self, nombre_mercado, metodo_kappa="curve_fit", intervalo_kappa=0.0, catalogo=None, grabador=None):
         """
         Inicializa el rastreador con el nombre del mercado que queremos seguir.
         Configura las URLs de la API y el WebSocket de Polymarket.
+        
+        :param nombre_mercado: Nombre o slug del evento en Polymarket.
+        :param metodo_kappa: "curve_fit" (ajuste no lineal) o "log_lineal" (forma cerrada, rápido).
+        :param intervalo_kappa: Segundos mínimos entre dos estimaciones de Kappa por activo.
+                                0 = recalcular en cada mensaje.
+        :param catalogo: CatalogoMercados para resolver los eventos (por defecto el compartido del proceso).
+        :param grabador: GrabadorMercado opcional que guarda cada frame crudo recibido.
         """
+        if metodo_kappa not in ("curve_fit", "log_lineal"):
+            raise ValueError(f"Método de Kappa desconocido: {metodo_kappa}")
+        
         self.nombre_mercado = nombre_mercado
         # Convierte el nombre legible en un 'slug' para la URL (ej: "Will Trump win?" -> "will-trump-win")
         self.slug_mercado = self._generar_slug(nombre_mercado)
         
         # Endpoints de Polymarket
-        self.api_url = f"https://gamma-api.polymarket.com/events?slug={self.slug_mercado}"
+        self.api_eventos_url = API_EVENTOS_URL
+        self.api_url = f"{self.api_eventos_url}?slug={self.slug_mercado}"
         self.ws_url = "wss://ws-subscriptions-clob.polymarket.com/ws/market"
         
+        # Metadatos de los mercados (sesión HTTP persistente + caché en disco)
+        self.catalogo = catalogo if catalogo is not None else catalogo_compartido()
+        
         # Almacenamiento de datos
         self.datos_evento = None
         self.sub_mercados = []
@@ -29,14 +75,71 @@ class RastreadorPolymarket:
         self.mapa_tokens = {} # Mapeo ID -> Nombre
         self.mapa_tokens_inverso = {} # Mapeo Nombre -> ID
         
+        # Multiplexación: varios mercados sobre UNA sola conexión WebSocket
+        self.ids_suscritos = {} # IDs suscritos en la conexión (dict como conjunto ordenado)
+        self.mercados = {} # Mapeo slug -> {'evento', 'mercado', 'ids_tokens', 'mapa_tokens'} de cada mercado añadido
+        
         # Estado del mercado en tiempo real
-        self.libro_ordenes = {} # Almacena bids y asks crudos
-        self.precios_actuales = {} # Almacena métricas calculadas (WMP, Kappa, etc.)
+        self.libro_ordenes = {} # Mapeo ID -> LibroOrdenes (niveles L2 ordenados)
+        self.precios_actuales = {} # Almacena métricas calculadas (WMP, Kappa, etc.), se rellena bajo demanda
+        self._cache_metricas = {} # Mapeo ID -> (versión del libro, métricas) para no recalcular
+        self.activos_interes = set() # IDs cuyos cambios se publican a la estrategia (vacío = todos)
+        
+        # Configuración de la estimación de Kappa
+        self.metodo_kappa = metodo_kappa
+        self.intervalo_kappa = intervalo_kappa
+        self._ultimo_calculo_kappa = {} # Mapeo ID -> (instante, kappa) del último ajuste
+        self.estimadores_kappa_trades = {} # Mapeo ID -> EstimadorKappaTrades (Kappa desde ejecuciones)
+        self._precios_trade = {} # Mapeo ID -> precios negociados desde la última consulta ('consumir_precios_trade')
+        
+        # Notificación de cambios a la estrategia (modo por eventos)
+        self.versiones = {} # Mapeo ID -> Nº de actualizaciones de métricas publicadas
+        self._eventos_cambio = {} # Mapeo ID -> asyncio.Event que se activa en cada actualización
+        
+        # Grabación de los frames crudos (None = no se graba)
+        self.grabador = grabador
+        
+        # Transporte y reloj intercambiables (reproducción de capturas, ver 'Reproductor_Mercado')
+        self.conectar_ws = websockets.connect # Callable(url) -> conexión usable con 'async with'
+        self.reloj = RelojSistema()
         
         # Control del WebSocket
         self.websocket = None
         self.esta_corriendo = False
         self.ultimo_pong = None
+        self._ping_pendiente = None # Instante del primer PING aún sin PONG
+        self._leyendo = False # True mientras la conexión actual está leyendo frames
+        self._parada = asyncio.Event() # Interrumpe la espera entre reconexiones al detener
+        
+        # Reconexión automática con espera exponencial y jitter
+        self.reconectar = True
+        self.espera_reconexion_base = 0.5 # Segundos tras el primer fallo
+        self.espera_reconexion_max = 30.0 # Tope de la espera entre intentos
+        self.limite_sin_pong = 10.0 # Segundos sin respuesta a un PING tras los que la conexión se da por muerta
+        self.timeout_lectura = 5.0 # Segundos sin mensajes tras los que se envía un PING (None = sin límite)
+        
+        # Frescura de los datos
+        self.ultima_actualizacion = {} # Mapeo ID -> instante del último cambio aplicado a su libro
+        self._ultima_confirmacion = 0.0 # Instante hasta el que todo lo recibido está ya aplicado a los libros
+        self.limite_cola_frames = 500 # Frames pendientes a partir de los que los libros se dan por atrasados
+        
+        # Ingesta con conflación: el lector encola frames crudos y el procesador
+        # los consume por lotes, recalculando cada activo una sola vez por lote.
+        self._cola_frames = deque()
+        self._hay_frames = asyncio.Event()
+        self._procesador = None # Tarea que consume la cola en la conexión activa
+        self.estadisticas = {
+            "frames_recibidos": 0,       # Frames de datos leídos del socket
+            "lotes_procesados": 0,       # Veces que el procesador ha vaciado la cola
+            "eventos_descartados": 0,    # Eventos de libro superados por un snapshot posterior del mismo lote
+            "recalculos_coalescidos": 0, # Publicaciones (y recálculos) ahorrados al agrupar por activo
+            "profundidad_cola": 0,       # Frames pendientes al empezar el último lote
+            "profundidad_cola_max": 0,   # Máximo de frames pendientes observado
+            "reconexiones": 0,           # Conexiones perdidas y reabiertas automáticamente
+            "frames_invalidos": 0,       # Frames descartados por no poder decodificarse
+            "eventos_invalidos": 0,      # Eventos descartados al aplicarlos (campos que faltan o inválidos)
+            "fallos_procesador": 0,      # Veces que el procesador de la cola murió y se forzó la reconexión
+        }
 
     def _generar_slug(self, texto):
         """Convierte texto normal en formato URL-slug."""
@@ -53,29 +156,26 @@ class RastreadorPolymarket:
         """
         return A * np.exp(-k * p)
 
-    def _estimar_kappa(self, bids, asks, mejor_bid, mejor_ask):
+    def _estimar_kappa(self, bid_precios, bid_sizes, ask_precios, ask_sizes, mejor_bid, mejor_ask):
         """
         Intenta calcular KAPPA (k), que representa la 'densidad' o 'resistencia' del libro de órdenes.
         Un Kappa alto significa que la liquidez cae rápido (mercado delgado).
         Un Kappa bajo significa que hay mucha liquidez distribuida (mercado profundo).
         
-        Utiliza 'curve_fit' para ajustar los datos reales a la función exponencial.
+        Según 'metodo_kappa' usa 'curve_fit' (ajuste no lineal) o el ajuste
+        log-lineal ponderado en forma cerrada de 'Estimador_Kappa'.
         Devuelve np.nan si no hay suficientes datos o el ajuste falla.
         """
-        if not bids or not asks:
+        if len(bid_precios) == 0 or len(ask_precios) == 0:
             return np.nan
 
         try:
             # 1. Preparar datos de Venta (Asks)
             # Calculamos la distancia (delta) desde el mejor precio
-            ask_prices = np.array([float(a['price']) for a in asks])
-            ask_sizes = np.array([float(a['size']) for a in asks])
-            ask_deltas = ask_prices - mejor_ask 
+            ask_deltas = ask_precios - mejor_ask 
 
             # 2. Preparar datos de Compra (Bids)
-            bid_prices = np.array([float(b['price']) for b in bids])
-            bid_sizes = np.array([float(b['size']) for b in bids])
-            bid_deltas = mejor_bid - bid_prices 
+            bid_deltas = mejor_bid - bid_precios 
 
             # 3. Juntar todos los datos
             x_data = np.concatenate((bid_deltas, ask_deltas)) # Distancias
@@ -90,16 +190,20 @@ class RastreadorPolymarket:
             x_fit = x_data[valid_indices]
             y_fit = y_data[valid_indices]
 
-            # 5. Ajuste de Curva (Curve Fitting)
-            # Intentamos encontrar los valores A y k que mejor se ajustan a los datos
-            p0 = [y_fit[0], 1.0] # Valores iniciales estimados
-            bounds = ([0, 0], [np.inf, np.inf]) # Límites (no pueden ser negativos)
-            
-            popt, _ = curve_fit(self._exp_decay, x_fit, y_fit, p0=p0, maxfev=2000, bounds=bounds)
-            
-            kappa_estimada = popt[1] # El segundo parámetro es k (Kappa)
+            # 5. Ajuste de Curva
+            if self.metodo_kappa == "log_lineal":
+                # Mínimos cuadrados ponderados sobre ln(V): sin iteraciones
+                _, kappa_estimada = ajustar_kappa_log_lineal(x_fit, y_fit)
+            else:
+                # Intentamos encontrar los valores A y k que mejor se ajustan a los datos
+                p0 = [y_fit[0], 1.0] # Valores iniciales estimados
+                bounds = ([0, 0], [np.inf, np.inf]) # Límites (no pueden ser negativos)
+                
+                popt, _ = curve_fit(self._exp_decay, x_fit, y_fit, p0=p0, maxfev=2000, bounds=bounds)
+                
+                kappa_estimada = popt[1] # El segundo parámetro es k (Kappa)
             
-            if kappa_estimada < 1e-4: # Si es demasiado pequeño, es un error de cálculo
+            if not kappa_estimada >= 1e-4: # Si es demasiado pequeño (o NaN), es un error de cálculo
                 return np.nan
                 
             return kappa_estimada
@@ -107,32 +211,65 @@ class RastreadorPolymarket:
         except (RuntimeError, ValueError):
             return np.nan
 
+    def _kappa_con_limite(self, asset_id, libro):
+        """
+        Devuelve Kappa para el libro respetando 'intervalo_kappa'.
+        Si el último ajuste del activo es más reciente que el intervalo, se reutiliza
+        ese valor y no se vuelve a ajustar (una ráfaga de mensajes no encola ajustes).
+        """
+        ahora = self.reloj.ahora()
+        ultimo = self._ultimo_calculo_kappa.get(asset_id)
+        if ultimo is not None and ahora - ultimo[0] < self.intervalo_kappa:
+            return ultimo[1]
+
+        bid_precios, bid_sizes = libro.arrays_bid()
+        ask_precios, ask_sizes = libro.arrays_ask()
+        kappa_estimada = self._estimar_kappa(bid_precios, bid_sizes, ask_precios, ask_sizes,
+                                             libro.mejor_bid, libro.mejor_ask)
+        self._ultimo_calculo_kappa[asset_id] = (ahora, kappa_estimada)
+        return kappa_estimada
+
     # ==============================================================================
     # SECCIÓN: PROCESAMIENTO DE DATOS EN TIEMPO REAL
     # ==============================================================================
 
     def _actualizar_precios_rt(self, asset_id):
         """
-        Se llama cada vez que llega un mensaje del WebSocket.
-        Recalcula WMP, Volume Diff y Kappa con los nuevos datos del libro.
+        Se llama cada vez que cambia el libro de un activo.
+        Las métricas NO se recalculan aquí: se calculan de forma perezosa al
+        consultarlas (ver '_metricas'). Solo se avisa a los consumidores si
+        el activo está entre los de interés.
         """
         if asset_id not in self.libro_ordenes: return
+        self.ultima_actualizacion[asset_id] = self.reloj.ahora()
         
-        # Obtener listas de órdenes
-        bids = self.libro_ordenes[asset_id].get("bids", [])
-        asks = self.libro_ordenes[asset_id].get("asks", [])
+        if not self.activos_interes or asset_id in self.activos_interes:
+            # Despertar a quien esté esperando un cambio de este activo
+            self._notificar_cambio(asset_id)
+
+    def _metricas(self, n):
+        """
+        Devuelve las métricas (WMP, Volume Diff, Top of Book) del activo 'n'.
+        Se calculan solo cuando alguien las pide y se cachean hasta que cambia
+        la versión del libro. Kappa se calcula aparte (ver '_kappa_libro').
+        """
+        asset_id = self.mapa_tokens.get(n, n)
+        libro = self.libro_ordenes.get(asset_id)
+        if libro is None: return {}
         
-        # Mejores precios disponibles (Top of Book)
-        mejor_bid = max([float(b["price"]) for b in bids]) if bids else 0
-        mejor_ask = min([float(a["price"]) for a in asks]) if asks else 0
+        cache = self._cache_metricas.get(asset_id)
+        if cache is not None and cache[0] == libro.version:
+            return cache[1]
         
-        # 1. Calcular KAPPA
-        kappa_estimada = self._estimar_kappa(bids, asks, mejor_bid, mejor_ask)
+        # Mejores precios disponibles (Top of Book) en O(1)
+        mejor_bid = libro.mejor_bid
+        mejor_ask = libro.mejor_ask
         
-        # 2. Calcular WMP (Weighted Mid-Price)
+        # Calcular WMP (Weighted Mid-Price)
         # Es un precio medio que se inclina hacia donde hay más volumen (presión)
-        vol_total_bid = sum([float(b.get("size", 0)) for b in bids])
-        vol_total_ask = sum([float(a.get("size", 0)) for a in asks])
+        # Los volúmenes totales los mantiene el libro de forma incremental (O(1))
+        vol_total_bid = libro.vol_total_bid
+        vol_total_ask = libro.vol_total_ask
         vol_diff = vol_total_bid - vol_total_ask # Diferencia de presión
         
         if (vol_total_bid + vol_total_ask) > 0:
@@ -143,48 +280,213 @@ class RastreadorPolymarket:
             # Fallback a precio medio simple si no hay volumen
             wmp = (mejor_bid + mejor_ask) / 2
 
-        nombre_resultado = self.mapa_tokens_inverso.get(asset_id, asset_id)
-        
-        # Guardar resultados
-        self.precios_actuales[nombre_resultado] = {
+        metricas = {
             "mejor_bid": mejor_bid,
             "mejor_ask": mejor_ask,
             "wmp_l2": wmp,
             "volume_diff": vol_diff,
             "total_bid_vol": vol_total_bid, 
             "total_ask_vol": vol_total_ask,
-            "kappa": kappa_estimada
         }
+        
+        # Guardar resultados
+        self._cache_metricas[asset_id] = (libro.version, metricas)
+        self.precios_actuales[self.mapa_tokens_inverso.get(asset_id, asset_id)] = metricas
+        return metricas
+
+    def _kappa_libro(self, n):
+        """
+        Kappa del libro del activo 'n', calculado bajo demanda y cacheado por versión
+        (y además limitado a un ajuste cada 'intervalo_kappa' segundos).
+        """
+        metricas = self._metricas(n)
+        if not metricas: return np.nan
+        
+        if "kappa" not in metricas:
+            asset_id = self.mapa_tokens.get(n, n)
+            metricas["kappa"] = self._kappa_con_limite(asset_id, self.libro_ordenes[asset_id])
+        return metricas["kappa"]
+
+    def registrar_interes(self, n):
+        """
+        Marca el activo 'n' (nombre o ID) como seguido por un consumidor.
+        Una vez hay algún interés registrado, solo se publican cambios de esos activos;
+        del resto se sigue manteniendo el libro crudo.
+        """
+        self.activos_interes.add(self.mapa_tokens.get(n, n))
+
+    def cancelar_interes(self, n):
+        """Deja de publicar los cambios del activo 'n' (y olvida sus trades sin consumir)."""
+        asset_id = self.mapa_tokens.get(n, n)
+        self.activos_interes.discard(asset_id)
+        self._precios_trade.pop(asset_id, None)
 
     def _procesar_mensaje_ws(self, data):
-        """Parsea los mensajes JSON crudos que llegan del WebSocket."""
-        eventos = data if isinstance(data, list) else [data]
-        for ev in eventos:
-            if ev.get("event_type") == "book": # Solo nos interesan actualizaciones del libro
-                asset_id = ev.get("asset_id")
-                # Actualizamos el libro local
-                self.libro_ordenes[asset_id] = {"bids": ev.get("bids", []), "asks": ev.get("asks", [])}
-                # Disparamos el recálculo de métricas
+        """
+        Procesa un mensaje JSON ya decodificado que llega del WebSocket.
+        - 'book': snapshot completo del libro (sustituye todos los niveles).
+        - 'price_change': cambios incrementales de niveles concretos.
+        - 'last_trade_price': ejecuciones (alimentan el Kappa por trades).
+        """
+        for ev in normalizar_eventos(data, self.estadisticas):
+            try:
+                cambiados = self._aplicar_evento(ev)
+            except ERRORES_MENSAJE:
+                self.estadisticas["eventos_invalidos"] += 1
+                continue
+            for asset_id in cambiados:
+                # Avisamos del cambio (las métricas se recalculan al consultarlas)
                 self._actualizar_precios_rt(asset_id)
 
+    def _aplicar_evento(self, ev):
+        """
+        Aplica un evento normalizado (ver 'Decodificador_WS') al estado local SIN recalcular métricas.
+        
+        :return: Lista de asset_ids cuyo libro ha cambiado.
+        """
+        tipo = ev.get("event_type")
+        if tipo == "book":
+            asset_id = ev.get("asset_id")
+            # Mensajes rezagados de activos ya desuscritos se ignoran
+            if self.ids_suscritos and asset_id not in self.ids_suscritos: return []
+            # Actualizamos el libro local con el snapshot
+            libro = self.libro_ordenes.setdefault(asset_id, LibroOrdenes())
+            libro.aplicar_snapshot(*ev["bids"], *ev["asks"])
+            return [asset_id]
+        elif tipo == "price_change":
+            return self._aplicar_price_change(ev)
+        elif tipo == "last_trade_price":
+            self._registrar_trade(ev)
+        return []
+
+    def _procesar_lote(self, frames):
+        """
+        Procesa de golpe todos los frames pendientes (conflación):
+        1. Decodifica todos los frames del lote (precios y tamaños a float una sola vez).
+        2. Descarta los eventos de libro de un activo anteriores a su último snapshot
+           dentro del lote (el snapshot los sustituye por completo).
+        3. Aplica el resto de eventos de libro en orden de llegada.
+        4. Atribuye los trades del lote con el libro ya actualizado (incluido su snapshot).
+        5. Publica cada activo modificado UNA sola vez.
+        Así, bajo carga, la estrategia siempre ve el libro más reciente y no un atraso.
+        """
+        eventos = []
+        for msg in frames:
+            try:
+                eventos.extend(decodificar_frame(msg, self.estadisticas))
+            except ERRORES_MENSAJE:
+                self.estadisticas["frames_invalidos"] += 1
+        
+        # Posición del último snapshot de cada activo en el lote
+        ultimo_snapshot = {}
+        for i, ev in enumerate(eventos):
+            if ev["event_type"] == "book":
+                ultimo_snapshot[ev["asset_id"]] = i
+        
+        modificados = {} # dict como conjunto ordenado
+        n_aplicados = 0
+        trades = []
+        for i, ev in enumerate(eventos):
+            tipo = ev["event_type"]
+            if tipo == "last_trade_price":
+                trades.append(ev)
+                continue
+            if tipo == "book" and ultimo_snapshot[ev["asset_id"]] != i:
+                self.estadisticas["eventos_descartados"] += 1
+                continue
+            if tipo == "price_change":
+                ev = self._filtrar_cambios_superados(ev, i, ultimo_snapshot)
+                if ev is None:
+                    self.estadisticas["eventos_descartados"] += 1
+                    continue
+            try:
+                cambiados = self._aplicar_evento(ev)
+            except ERRORES_MENSAJE:
+                self.estadisticas["eventos_invalidos"] += 1
+                continue
+            for asset_id in cambiados:
+                modificados[asset_id] = None
+                n_aplicados += 1
+        
+        for ev in trades:
+            try:
+                self._aplicar_evento(ev)
+            except ERRORES_MENSAJE:
+                self.estadisticas["eventos_invalidos"] += 1
+        
+        for asset_id in modificados:
+            self._actualizar_precios_rt(asset_id)
+        
+        self.estadisticas["recalculos_coalescidos"] += n_aplicados - len(modificados)
+        self.estadisticas["lotes_procesados"] += 1
+
+    def _filtrar_cambios_superados(self, ev, posicion, ultimo_snapshot):
+        """
+        Quita de un 'price_change' los cambios de activos que tienen un snapshot
+        posterior en el mismo lote. Devuelve None si no queda ningún cambio.
+        """
+        cambios = [c for c in ev["cambios"] if ultimo_snapshot.get(c[0], -1) < posicion]
+        if not cambios: return None
+        return ev if len(cambios) == len(ev["cambios"]) else dict(ev, cambios=cambios)
+
+    def _registrar_trade(self, ev):
+        """
+        Alimenta el estimador de Kappa por ejecuciones con un evento 'last_trade_price'.
+        La distancia se mide respecto al precio medio del libro local en ese instante.
+        """
+        asset_id = ev["asset_id"]
+        if not self.activos_interes or asset_id in self.activos_interes:
+            # Solo de los activos seguidos, que los consumen en cada recotización
+            self._precios_trade.setdefault(asset_id, set()).add(ev["precio"])
+        libro = self.libro_ordenes.get(asset_id)
+        if libro is None or not libro.precios_bid or not libro.precios_ask:
+            return
+        
+        mid = (libro.mejor_bid + libro.mejor_ask) / 2
+        # Usamos la marca de tiempo del exchange para que el decaimiento no dependa de la latencia local
+        instante = ev["timestamp"] if ev["timestamp"] is not None else self.reloj.ahora()
+        
+        estimador = self.estimadores_kappa_trades.setdefault(asset_id, EstimadorKappaTrades())
+        estimador.registrar_trade(ev["precio"], mid, instante)
+
+    def _aplicar_price_change(self, ev):
+        """
+        Aplica un evento 'price_change' normalizado sobre los libros locales.
+        Los cambios de activos sin snapshot previo se ignoran (libro incompleto).
+        
+        :return: Lista de asset_ids cuyo libro ha cambiado.
+        """
+        modificados = {} # dict como conjunto ordenado (orden de llegada determinista)
+        for asset_id, lado, precio, size in ev["cambios"]:
+            libro = self.libro_ordenes.get(asset_id)
+            if libro is None: continue
+            libro.aplicar_cambio(lado, precio, size)
+            modificados[asset_id] = None
+        return list(modificados)
+
     # ==============================================================================
     # SECCIÓN: CONEXIÓN Y GESTIÓN (API REST)
     # ==============================================================================
 
+    def _consultar_evento(self, slug):
+        """Devuelve el evento con ese slug (o None) a través del catálogo cacheado."""
+        return self.catalogo.obtener_evento(slug)
+
+    def _tokens_de_mercado(self, mercado):
+        """Extrae (IDs de los tokens, nombres de los resultados) de un sub-mercado."""
+        ids_tokens = json.loads(mercado.get("clobTokenIds", "[]"))
+        resultados = json.loads(mercado.get("outcomes", "[]"))
+        return ids_tokens, resultados
+
     def obtener_datos_evento(self):
         """Consulta la API de Polymarket para obtener detalles del mercado."""
-        try:
-            r = requests.get(self.api_url)
-            r.raise_for_status()
-            respuesta = r.json()
-            if not respuesta: return False
-            
-            self.datos_evento = respuesta[0]
-            self.sub_mercados = self.datos_evento.get("markets", [])
-            print(f"✅ Evento encontrado: {self.datos_evento.get('title', 'N/A')}")
-            return True
-        except requests.RequestException:
-            return False
+        evento = self._consultar_evento(self.slug_mercado)
+        if not evento: return False
+        
+        self.datos_evento = evento
+        self.sub_mercados = self.datos_evento.get("markets", [])
+        print(f"✅ Evento encontrado: {self.datos_evento.get('title', 'N/A')}")
+        return True
 
     def seleccionar_sub_mercado(self, indice_mercado):
         """Elige uno de los sub-mercados (ej: un partido específico dentro de una liga)."""
@@ -192,77 +494,362 @@ class RastreadorPolymarket:
         
         self.datos_mercado_seleccionado = self.sub_mercados[indice_mercado]
         # Extraer IDs de los tokens (activos) que se negocian
-        self.ids_tokens = json.loads(self.datos_mercado_seleccionado.get("clobTokenIds", "[]"))
-        resultados = json.loads(self.datos_mercado_seleccionado.get("outcomes", "[]"))
+        self.ids_tokens, resultados = self._tokens_de_mercado(self.datos_mercado_seleccionado)
         
         # Crear diccionarios para traducir IDs <-> Nombres
         self.mapa_tokens = dict(zip(resultados, self.ids_tokens))
         self.mapa_tokens_inverso = dict(zip(self.ids_tokens, resultados))
         
+        # El mercado principal forma parte de la suscripción de la conexión
+        self.ids_suscritos.update(dict.fromkeys(self.ids_tokens))
+        self.mercados[self.slug_mercado] = {
+            "evento": self.datos_evento, "mercado": self.datos_mercado_seleccionado,
+            "ids_tokens": self.ids_tokens, "mapa_tokens": self.mapa_tokens,
+        }
+        
+        if self.grabador is not None: self.grabador.registrar_mercado(self.slug_mercado, self.datos_evento)
+        
         print(f"\n✔️ Has elegido: {self.datos_mercado_seleccionado.get('question')}")
         print(f"Resultados posibles: {resultados}")
         return True
 
+    # ==============================================================================
+    # SECCIÓN: MULTIPLEXACIÓN (VARIOS MERCADOS, UNA CONEXIÓN)
+    # ==============================================================================
+    # Los nombres de resultado ("Up", "Down", "Yes"...) se repiten entre mercados,
+    # así que para los mercados añadidos los getters deben usarse con el ID del token.
+
+    async def agregar_mercado(self, nombre_mercado, indice_mercado=0):
+        """
+        Añade otro mercado a la conexión actual sin reconectar.
+        
+        :param nombre_mercado: Nombre o slug del evento.
+        :param indice_mercado: Sub-mercado del evento a seguir.
+        :return: Mapeo Nombre -> ID de los tokens del mercado, o None si no se encontró.
+        """
+        slug = self._generar_slug(nombre_mercado)
+        if slug in self.mercados:
+            return self.mercados[slug]["mapa_tokens"]
+        
+        # La consulta REST es bloqueante: se hace en un hilo para no parar la lectura del socket
+        evento = await asyncio.to_thread(self._consultar_evento, slug)
+        if not evento: return None
+        sub_mercados = evento.get("markets", [])
+        if not (0 <= indice_mercado < len(sub_mercados)): return None
+        
+        ids_tokens, resultados = self._tokens_de_mercado(sub_mercados[indice_mercado])
+        mapa_tokens = dict(zip(resultados, ids_tokens))
+        self.mercados[slug] = {
+            "evento": evento, "mercado": sub_mercados[indice_mercado],
+            "ids_tokens": ids_tokens, "mapa_tokens": mapa_tokens,
+        }
+        if self.grabador is not None: self.grabador.registrar_mercado(slug, evento)
+        await self.suscribir(ids_tokens)
+        return mapa_tokens
+
+    async def quitar_mercado(self, nombre_mercado):
+        """Deja de seguir un mercado añadido y libera su estado."""
+        slug = self._generar_slug(nombre_mercado)
+        datos = self.mercados.pop(slug, None)
+        if datos:
+            await self.desuscribir(datos["ids_tokens"])
+
+    async def suscribir(self, ids_tokens):
+        """
+        Suscribe IDs adicionales. Si la conexión está abierta se envía la suscripción
+        dinámica del canal 'market'; si no, se incluirán al conectar.
+        """
+        nuevos = [i for i in ids_tokens if i not in self.ids_suscritos]
+        if not nuevos: return
+        self.ids_suscritos.update(dict.fromkeys(nuevos))
+        if self.websocket is not None:
+            await self.websocket.send(json.dumps({"assets_ids": nuevos, "operation": "subscribe"}))
+
+    async def desuscribir(self, ids_tokens):
+        """Cancela la suscripción de unos IDs y descarta su libro y métricas."""
+        quitados = [i for i in ids_tokens if i in self.ids_suscritos]
+        if not quitados: return
+        for asset_id in quitados:
+            del self.ids_suscritos[asset_id]
+            self.libro_ordenes.pop(asset_id, None)
+            self._cache_metricas.pop(asset_id, None)
+            self._ultimo_calculo_kappa.pop(asset_id, None)
+            self.estimadores_kappa_trades.pop(asset_id, None)
+            self._precios_trade.pop(asset_id, None)
+            self.ultima_actualizacion.pop(asset_id, None)
+            self.activos_interes.discard(asset_id)
+        if self.websocket is not None:
+            await self.websocket.send(json.dumps({"assets_ids": quitados, "operation": "unsubscribe"}))
+
     # ==============================================================================
     # SECCIÓN: BUCLE ASÍNCRONO (WEBSOCKET)
     # ==============================================================================
 
     async def conectar_y_escuchar(self):
-        """Bucle principal asíncrono que mantiene la conexión viva."""
-        if not self.ids_tokens: return
+        """
+        Bucle principal asíncrono que mantiene la conexión viva.
+        Si la conexión se cae (o deja de responder a los PING) se reabre
+        automáticamente con espera exponencial y jitter, se vuelven a suscribir
+        todos los activos y los libros se resincronizan desde cero.
+        """
+        if not self.ids_suscritos: return
         self.esta_corriendo = True
-        self.ultimo_pong = datetime.now()
+        self._parada.clear()
+        intentos = 0
+        if self.grabador is not None: self.grabador.iniciar()
+        
+        while self.esta_corriendo:
+            conectado = await self._sesion_websocket()
+            if not self.esta_corriendo or not self.reconectar: break
+            
+            # Tras una conexión que llegó a recibir datos se reintenta rápido; si no, se espera cada vez más
+            intentos = 1 if conectado else intentos + 1
+            espera = random.uniform(0, min(self.espera_reconexion_max, self.espera_reconexion_base * 2 ** (intentos - 1)))
+            self.estadisticas["reconexiones"] += 1
+            print(f"🔄 Reconectando en {espera:.1f}s (intento {intentos})...")
+            try:
+                await asyncio.wait_for(self._parada.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
+        
+        self.esta_corriendo = False
+        if self.grabador is not None: await self.grabador.cerrar()
+        print("🛑 Rastreador detenido.")
+
+    async def _sesion_websocket(self):
+        """
+        Abre UNA conexión, suscribe todos los activos y lee hasta que se cierra.
+        Separa la lectura del socket (lo más rápido posible) del procesado de los
+        mensajes, que se hace por lotes en una tarea aparte ('_procesar_cola').
         
+        :return: True si la conexión llegó a recibir datos.
+        """
+        procesador = None
+        frames_previos = self.estadisticas["frames_recibidos"]
         try:
-            async with websockets.connect(self.ws_url) as websocket:
+            async with self.conectar_ws(self.ws_url) as websocket:
                 self.websocket = websocket
-                # Suscribirse a los activos seleccionados
-                await websocket.send(json.dumps({"assets_ids": self.ids_tokens, "type": "market"}))
+                self.ultimo_pong = datetime.now()
+                self._ping_pendiente = None
+                
+                # Resincronización: los libros previos pueden haber perdido cambios durante el corte.
+                # Sin libro, los 'price_change' se ignoran hasta que llegue el nuevo snapshot.
+                self._invalidar_libros()
+                # Suscribirse a todos los activos (mercado principal + mercados añadidos)
+                await websocket.send(json.dumps({"assets_ids": list(self.ids_suscritos), "type": "market"}))
                 print("\n🎧 Conectado al WebSocket. Escuchando precios...\n")
                 
-                while self.esta_corriendo:
-                    try:
-                        # Esperar mensaje con timeout para poder enviar PINGs
-                        msg = await asyncio.wait_for(websocket.recv(), timeout=5.0)
-                        
-                        if msg == "PONG": 
-                            self.ultimo_pong = datetime.now()
-                            continue
-                        
-                        try: 
-                            self._procesar_mensaje_ws(json.loads(msg))
-                        except json.JSONDecodeError: 
-                            continue
-                            
-                    except asyncio.TimeoutError:
-                        # Si no hay mensajes en 5s, enviar PING para mantener conexión
-                        if self.ultimo_pong + timedelta(seconds=10) < datetime.now(): 
-                            await websocket.send("PING")
-                    except websockets.exceptions.ConnectionClosed: 
-                        break
+                self._leyendo = True
+                procesador = self._procesador = asyncio.create_task(self._procesar_cola())
+                lector = asyncio.create_task(self._leer_frames(websocket))
+                try:
+                    # Si el procesador muere, la sesión se corta (y se reconecta) en lugar de seguir
+                    # leyendo frames que nadie aplica con los libros congelados
+                    await asyncio.wait((lector, procesador), return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    if not lector.done():
+                        lector.cancel()
+                        await asyncio.wait((lector,))
+                if not lector.cancelled():
+                    lector.result() # Propaga los errores del lector
         except Exception as e:
             print(f"💥 Error en el WebSocket: {e}")
         finally:
-            self.esta_corriendo = False
+            self._leyendo = False
+            # Despertar al procesador para que vacíe la cola y termine
+            self._hay_frames.set()
+            if procesador:
+                try:
+                    await procesador
+                except Exception as e:
+                    print(f"💥 Error en el procesador de mensajes: {e!r}. Reconectando...")
+                    self.estadisticas["fallos_procesador"] += 1
+                    self._cola_frames.clear() # Los libros se resincronizan con los snapshots de la nueva conexión
             self.websocket = None
-            print("🛑 Rastreador detenido.")
+        return self.estadisticas["frames_recibidos"] > frames_previos
+
+    def _invalidar_libros(self):
+        """Descarta los libros locales y sus métricas (se reconstruyen con los próximos snapshots)."""
+        self.libro_ordenes.clear()
+        self._cache_metricas.clear()
+        self.precios_actuales.clear()
+        self._ultimo_calculo_kappa.clear()
+
+    async def _leer_frames(self, websocket):
+        """
+        Lee frames crudos del socket y los encola sin decodificarlos.
+        Se usa 'asyncio.timeout' (y no 'wait_for', que crea una tarea por mensaje)
+        para que los frames ya recibidos se lean seguidos sin ceder el control:
+        el procesador solo se ejecuta cuando el buffer del socket está vacío.
+        """
+        while self.esta_corriendo:
+            try:
+                # Esperar mensaje con timeout para poder enviar PINGs
+                async with asyncio.timeout(self.timeout_lectura):
+                    msg = await websocket.recv()
+                
+                if msg == "PONG": 
+                    self.ultimo_pong = datetime.now()
+                    self._ping_pendiente = None
+                    # Sin frames pendientes y con el procesador vivo, el PONG confirma que no hay cambios sin aplicar
+                    if not self._cola_frames and not self._procesador.done():
+                        self._ultima_confirmacion = self.reloj.ahora()
+                    continue
+                
+                if self.grabador is not None: self.grabador.registrar(msg)
+                self._cola_frames.append(msg)
+                self.estadisticas["frames_recibidos"] += 1
+                self._hay_frames.set()
+                    
+            except asyncio.TimeoutError:
+                # Sin mensajes en 'timeout_lectura' segundos: PING para comprobar que la conexión sigue viva
+                ahora = datetime.now()
+                if self._ping_pendiente is None:
+                    self._ping_pendiente = ahora
+                elif self._ping_pendiente + timedelta(seconds=self.limite_sin_pong) < ahora:
+                    print("⚠️ El WebSocket no responde a los PING. Cerrando conexión...")
+                    break
+                await websocket.send("PING")
+            except websockets.exceptions.ConnectionClosed: 
+                break
+
+    async def _procesar_cola(self):
+        """Vacía la cola de frames por lotes cada vez que el lector avisa de que hay datos."""
+        while True:
+            await self._hay_frames.wait()
+            self._hay_frames.clear()
+            
+            if self._cola_frames:
+                profundidad = len(self._cola_frames)
+                self.estadisticas["profundidad_cola"] = profundidad
+                self.estadisticas["profundidad_cola_max"] = max(self.estadisticas["profundidad_cola_max"], profundidad)
+                
+                # Todo lo recibido antes de este instante queda aplicado cuando termina el lote
+                inicio = self.reloj.ahora()
+                lote = list(self._cola_frames)
+                self._cola_frames.clear()
+                self._procesar_lote(lote)
+                self._ultima_confirmacion = inicio
+            
+            if not self._leyendo and not self._cola_frames:
+                break
 
     async def detener_escucha(self):
-        """Cierra la conexión ordenadamente."""
+        """Cierra la conexión ordenadamente (sin reconectar)."""
         self.esta_corriendo = False
+        self._parada.set()
         if self.websocket: await self.websocket.close()
 
+    # ==============================================================================
+    # SECCIÓN: NOTIFICACIÓN DE CAMBIOS (EVENTOS)
+    # ==============================================================================
+    # Permiten que la estrategia se despierte justo cuando cambia el libro,
+    # en lugar de consultar los precios cada X segundos.
+
+    def _evento_cambio(self, asset_id):
+        """Devuelve (creándolo si no existe) el asyncio.Event de un activo."""
+        evento = self._eventos_cambio.get(asset_id)
+        if evento is None:
+            evento = self._eventos_cambio[asset_id] = asyncio.Event()
+        return evento
+
+    def _notificar_cambio(self, asset_id):
+        """Incrementa la versión del activo y despierta a los consumidores que esperan."""
+        self.versiones[asset_id] = self.versiones.get(asset_id, 0) + 1
+        evento = self._eventos_cambio.get(asset_id)
+        if evento is not None:
+            evento.set()
+
+    def obtener_version(self, n="Yes"):
+        """Número de actualizaciones publicadas para el activo 'n' (0 si aún no hay datos)."""
+        return self.versiones.get(self.mapa_tokens.get(n, n), 0)
+
+    async def esperar_actualizacion(self, n="Yes", version_vista=0, timeout=None):
+        """
+        Espera hasta que el activo 'n' tenga una versión distinta de 'version_vista'.
+        Si ya hay una versión nueva devuelve inmediatamente (no se pierden cambios
+        ocurridos mientras el consumidor estaba ocupado).
+        
+        :param version_vista: Última versión procesada por el consumidor.
+        :param timeout: Segundos máximos de espera (None = sin límite).
+        :return: Versión actual, o None si se agotó el tiempo sin cambios.
+        """
+        asset_id = self.mapa_tokens.get(n, n)
+        evento = self._evento_cambio(asset_id)
+        limite = None if timeout is None else self.reloj.ahora() + timeout
+        
+        while self.versiones.get(asset_id, 0) == version_vista:
+            evento.clear()
+            restante = None if limite is None else limite - self.reloj.ahora()
+            if restante is not None and restante <= 0:
+                return None
+            if not await self.reloj.esperar(evento, restante):
+                return None
+        return self.versiones[asset_id]
+
+    async def esperar_libro(self, n="Yes", timeout=None):
+        """
+        Espera a que llegue el primer snapshot del libro del activo 'n' (listo para operar).
+        
+        :param timeout: Segundos máximos de espera (None = sin límite).
+        :return: True si el libro está sincronizado, False si se agotó el tiempo.
+        """
+        asset_id = self.mapa_tokens.get(n, n)
+        limite = None if timeout is None else self.reloj.ahora() + timeout
+        version = self.versiones.get(asset_id, 0)
+        
+        while asset_id not in self.libro_ordenes:
+            restante = None if limite is None else limite - self.reloj.ahora()
+            if restante is not None and restante <= 0:
+                return False
+            version = await self.esperar_actualizacion(asset_id, version, timeout=restante)
+            if version is None:
+                return False
+        return True
+
     # ==============================================================================
     # SECCIÓN: GETTERS (ACCESO A DATOS)
     # ==============================================================================
     # Estos métodos permiten a otros scripts obtener los datos calculados de forma segura
 
-    def obtener_wmp_l2(self, n="Yes"): return self.precios_actuales.get(n, {}).get("wmp_l2", 0)
-    def obtener_volume_diff(self, n="Yes"): return self.precios_actuales.get(n, {}).get("volume_diff", 0)
-    def obtener_mejor_bid(self, n="Yes"): return self.precios_actuales.get(n, {}).get("mejor_bid", 0)
-    def obtener_mejor_ask(self, n="Yes"): return self.precios_actuales.get(n, {}).get("mejor_ask", 0)
-    def obtener_total_bid_vol(self, n="Yes"): return self.precios_actuales.get(n, {}).get("total_bid_vol", 0)
-    def obtener_total_ask_vol(self, n="Yes"): return self.precios_actuales.get(n, {}).get("total_ask_vol", 0)
+    def obtener_wmp_l2(self, n="Yes"): return self._metricas(n).get("wmp_l2", 0)
+    def obtener_volume_diff(self, n="Yes"): return self._metricas(n).get("volume_diff", 0)
+    def obtener_mejor_bid(self, n="Yes"): return self._metricas(n).get("mejor_bid", 0)
+    def obtener_mejor_ask(self, n="Yes"): return self._metricas(n).get("mejor_ask", 0)
+    def obtener_total_bid_vol(self, n="Yes"): return self._metricas(n).get("total_bid_vol", 0)
+    def obtener_total_ask_vol(self, n="Yes"): return self._metricas(n).get("total_ask_vol", 0)
     
-    def obtener_kappa(self, n="Yes"): 
-        return self.precios_actuales.get(n, {}).get("kappa", np.nan)
\ No newline at end of file
+    def obtener_antiguedad(self, n="Yes"):
+        """
+        Segundos desde la última vez que se pudo confirmar que el libro del activo 'n' está al día.
+        Solo cuenta lo ya procesado: el último cambio aplicado a su libro, el último lote que el
+        procesador terminó o un PONG recibido con la cola vacía. Un frame recibido pero aún en
+        la cola no confirma nada, así que si el procesador muere o se atrasa la antigüedad crece.
+        Devuelve np.inf si el libro aún no está sincronizado o si la cola supera 'limite_cola_frames'.
+        """
+        asset_id = self.mapa_tokens.get(n, n)
+        if asset_id not in self.libro_ordenes: return np.inf
+        if len(self._cola_frames) > self.limite_cola_frames: return np.inf # Atraso: el libro no refleja lo recibido
+        return self.reloj.ahora() - max(self.ultima_actualizacion.get(asset_id, 0.0), self._ultima_confirmacion)
+    
+    def consumir_precios_trade(self, n="Yes"):
+        """
+        Precios a los que se ha negociado el activo 'n' desde la llamada anterior (y los olvida).
+        Sirve al gestor de órdenes para detectar posibles ejecuciones de nuestras órdenes vivas.
+        """
+        return self._precios_trade.pop(self.mapa_tokens.get(n, n), set())
+    
+    def obtener_estadisticas(self):
+        """Contadores de la ingesta (frames, lotes, eventos descartados/coalescidos y cola)."""
+        return dict(self.estadisticas, profundidad_cola_actual=len(self._cola_frames))
+    
+    def obtener_kappa(self, n="Yes", fuente="libro"): 
+        """
+        Devuelve Kappa del activo 'n'.
+        
+        :param fuente: "libro" (forma del libro de órdenes) o "trades" (llegada de ejecuciones).
+        """
+        if fuente == "trades":
+            estimador = self.estimadores_kappa_trades.get(self.mapa_tokens.get(n, n))
+            return estimador.kappa() if estimador else np.nan
+        return self._kappa_libro(n)
\ No newline at end of file
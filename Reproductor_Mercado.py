@@ -0,0 +1,216 @@
+import os
+import time
+import heapq
+import asyncio
+import websockets
+
+from Grabador_Mercado import leer_captura, leer_indice, FICHERO_MERCADOS
+from Metadatos_Mercado import CatalogoMercados
+
+#################################################################
+# Reproducción determinista de capturas (ver 'Grabador_Mercado')
+#################################################################
+# Sustituye el WebSocket del rastreador por los frames grabados: el rastreador
+# procesa exactamente los mismos mensajes con su código de siempre. El tiempo
+# lo marca un reloj virtual que avanza con las marcas de recepción de la captura,
+# así que esperas, timeouts y cálculos dependientes del tiempo dan siempre
+# el mismo resultado, se reproduzca a la velocidad que se reproduzca.
+# Antes de cada frame y de cada despertar del reloj virtual el reproductor cede el
+# control unas cuantas veces (RelojReproduccion.CESIONES) para que las tareas ya
+# despertadas terminen de reaccionar, con o sin 'velocidad'. Con 'velocidad' se
+# espera además con 'asyncio.sleep' hasta el instante real escalado: como el resto
+# de tareas ya está esperando al reloj virtual o a los frames, la espera no les da
+# turnos extra y el orden de ejecución es el mismo que sin ritmo. Lo único que sigue
+# dependiendo del tiempo real es lo que corre fuera del bucle (p.ej. la calibración
+# en otro proceso o hilo), igual que con velocidad=None.
+#
+# Uso:
+#   reproductor = ReproductorMercado("Data/capturas", velocidad=None)
+#   tracker = RastreadorPolymarket(slug, catalogo=catalogo_de_captura("Data/capturas"))
+#   reproductor.instalar(tracker)
+
+def catalogo_de_captura(directorio):
+    """Catálogo que resuelve los mercados con los metadatos guardados en la captura."""
+    return CatalogoMercados(ruta_cache=os.path.join(directorio, FICHERO_MERCADOS), ttl=float("inf"))
+
+class RelojReproduccion:
+    """
+    Reloj virtual (segundos epoch) con la misma interfaz que 'RelojSistema'.
+    Solo avanza cuando el reproductor lo indica; quien duerme se despierta
+    en orden cuando el reloj alcanza su instante.
+    """
+
+    # Veces que se cede el control tras cada avance, para que las tareas
+    # despertadas reaccionen antes de entregar el siguiente frame
+    CESIONES = 5
+
+    def __init__(self, instante_inicial=0.0):
+        self.instante = instante_inicial
+        self._dormidos = [] # Heap de (instante límite, secuencia, futuro)
+        self._secuencia = 0
+
+    def ahora(self):
+        return self.instante
+
+    async def dormir(self, segundos):
+        if segundos <= 0:
+            await asyncio.sleep(0)
+            return
+        futuro = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._dormidos, (self.instante + segundos, self._secuencia, futuro))
+        self._secuencia += 1
+        await futuro
+
+    async def esperar(self, evento, timeout=None):
+        """Espera a un asyncio.Event como mucho 'timeout' segundos VIRTUALES."""
+        if evento.is_set(): return True
+        if timeout is None:
+            await evento.wait()
+            return True
+        espera = asyncio.ensure_future(evento.wait())
+        dormir = asyncio.ensure_future(self.dormir(timeout))
+        await asyncio.wait((espera, dormir), return_when=asyncio.FIRST_COMPLETED)
+        espera.cancel(); dormir.cancel()
+        return evento.is_set()
+
+    def siguiente_limite(self):
+        """Instante del próximo despertar pendiente (None si nadie duerme)."""
+        while self._dormidos and self._dormidos[0][2].done():
+            heapq.heappop(self._dormidos) # Esperas canceladas
+        return self._dormidos[0][0] if self._dormidos else None
+
+    async def avanzar_hasta(self, instante):
+        """Avanza el reloj hasta 'instante' despertando, por orden, a quien duerma antes."""
+        while True:
+            limite = self.siguiente_limite()
+            if limite is None or limite > instante: break
+            _, _, futuro = heapq.heappop(self._dormidos)
+            self.instante = max(self.instante, limite)
+            futuro.set_result(None)
+            await self._ceder()
+        self.instante = max(self.instante, instante)
+
+    async def _ceder(self):
+        for _ in range(self.CESIONES):
+            await asyncio.sleep(0)
+
+    async def asentar(self):
+        """Cede el control para que las tareas ya despertadas terminen de reaccionar."""
+        await self._ceder()
+
+class ReproductorMercado:
+    """
+    Transporte de reproducción: se usa en lugar de 'websockets.connect'
+    (atributo 'conectar_ws' del rastreador) y entrega los frames grabados.
+    """
+
+    def __init__(self, directorio, velocidad=None, desde_ns=None, hasta_ns=None, activos=None):
+        """
+        :param directorio: Carpeta de la captura.
+        :param velocidad: 1.0 = tiempo real, >1 = acelerado, None = lo más rápido posible.
+                          Cualquier velocidad da la misma reproducción (ver cabecera).
+        :param desde_ns: Inicio del tramo a reproducir (ns de recepción).
+        :param hasta_ns: Fin del tramo a reproducir (ns de recepción).
+        :param activos: IDs de activos a reproducir (None = todos los de la captura).
+        """
+        self.directorio = directorio
+        self.velocidad = velocidad
+        self.desde_ns = desde_ns
+        self.hasta_ns = hasta_ns
+        self.activos = activos
+
+        indice = leer_indice(directorio)
+        if not indice:
+            raise ValueError(f"No hay ninguna captura en '{directorio}'")
+        inicio_ns = desde_ns if desde_ns is not None else indice[0]["desde_ns"]
+        self.reloj = RelojReproduccion(inicio_ns / 1e9)
+        self.estadisticas = {"frames_entregados": 0}
+
+    def instalar(self, tracker):
+        """Conecta el rastreador a la captura: transporte, reloj y sin reconexión al terminar."""
+        tracker.conectar_ws = self
+        tracker.reloj = self.reloj
+        tracker.reconectar = False
+        # Los PING dependen del tiempo de pared: en reproducción no se contestan ni se exigen,
+        # y un hueco largo de la captura a velocidad real no debe cortar la lectura del frame
+        tracker.limite_sin_pong = float("inf")
+        tracker.timeout_lectura = None
+        if self.activos is None and tracker.ids_suscritos:
+            self.activos = list(tracker.ids_suscritos)
+
+    def __call__(self, url):
+        return _ConexionReproduccion(self)
+
+class _ConexionReproduccion:
+    """Imitación de la conexión de 'websockets' (send/recv/close) sobre los frames grabados."""
+
+    def __init__(self, reproductor):
+        self.reproductor = reproductor
+        self.reloj = reproductor.reloj
+        self._frames = leer_captura(reproductor.directorio, reproductor.desde_ns,
+                                    reproductor.hasta_ns, reproductor.activos)
+        self._siguiente = None
+        self._cerrada = False
+        self._origen = None # (instante virtual, instante real) del primer paso, para el ritmo
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *excepcion):
+        self._cerrada = True
+
+    async def send(self, msg):
+        # Las suscripciones y los PING no cambian nada: la captura ya está filtrada
+        pass
+
+    async def close(self):
+        self._cerrada = True
+
+    async def recv(self):
+        if self._cerrada:
+            raise websockets.exceptions.ConnectionClosedOK(None, None)
+
+        if self._siguiente is None:
+            self._siguiente = next(self._frames, None)
+        if self._siguiente is None:
+            # Fin de la captura: el tiempo virtual sigue corriendo para quien espera (p.ej. el final de la sesión)
+            await self._agotar_esperas()
+            raise websockets.exceptions.ConnectionClosedOK(None, None)
+
+        ns, frame = self._siguiente
+        instante = ns / 1e9
+        # Cada despertar del reloj virtual anterior al frame (y luego el frame) llega a su instante
+        # real escalado; sin 'velocidad' se cede el control igual, para que el orden no cambie
+        limite = self.reloj.siguiente_limite()
+        while limite is not None and limite <= instante:
+            await self._esperar_ritmo(limite)
+            await self.reloj.avanzar_hasta(limite)
+            limite = self.reloj.siguiente_limite()
+        await self._esperar_ritmo(instante)
+
+        await self.reloj.avanzar_hasta(instante)
+        self._siguiente = None
+        self.reproductor.estadisticas["frames_entregados"] += 1
+        return frame
+
+    async def _agotar_esperas(self):
+        """Avanza el reloj virtual de despertar en despertar hasta que nadie espera o se cierra la conexión."""
+        while not self._cerrada:
+            limite = self.reloj.siguiente_limite()
+            if limite is None: break
+            await self._esperar_ritmo(limite)
+            await self.reloj.avanzar_hasta(limite)
+
+    async def _esperar_ritmo(self, instante):
+        """
+        Deja que las tareas despertadas reaccionen y, con 'velocidad', espera sin bloquear el
+        bucle hasta el instante real que corresponde al instante virtual. Como se espera con
+        todo asentado, la espera no cambia el orden de ejecución (ver cabecera).
+        """
+        await self.reloj.asentar()
+        if not self.reproductor.velocidad: return
+        if self._origen is None:
+            self._origen = (instante, time.perf_counter())
+        espera = self._origen[1] + (instante - self._origen[0]) / self.reproductor.velocidad - time.perf_counter()
+        if espera > 0:
+            await asyncio.sleep(espera)
@@ -0,0 +1,217 @@
+import re
+import math
+import asyncio
+
+from Kalman_Filter import calibrar_en_segundo_plano
+
+#################################################################
+# Rollover automático entre ventanas consecutivas (BTC Up/Down 15m)
+#################################################################
+# Los mercados "btc updown 15m <epoch>" duran 'duracion_ventana' segundos y el
+# epoch del nombre es el inicio de la ventana. El siguiente mercado es
+# simplemente <epoch + duracion_ventana>, así que se puede preparar antes de que
+# termine el actual: suscribir su libro, recoger el calentamiento y calibrar el
+# filtro mientras todavía se opera en la ventana vigente.
+# Los instantes salen del reloj del rastreador (virtual al reproducir capturas)
+# y no del nombre del mercado, que puede estar desfasado (p.ej. el slug de Config).
+
+def epoch_de_mercado(nombre_mercado):
+    """Extrae el epoch (inicio de la ventana) del nombre/slug del mercado."""
+    coincidencia = re.search(r"(\d+)\D*$", nombre_mercado)
+    if not coincidencia:
+        raise ValueError(f"El mercado '{nombre_mercado}' no termina en un epoch")
+    return int(coincidencia.group(1))
+
+def familia_de_mercado(nombre_mercado):
+    """Nombre del mercado sin el epoch: identifica la serie de ventanas (p.ej. 'btc updown 15m')."""
+    return re.sub(r"\d+\D*$", "", nombre_mercado).strip(" -")
+
+def nombre_de_epoch(nombre_mercado, epoch):
+    """Devuelve el nombre del mercado de la misma familia para otro epoch."""
+    return re.sub(r"(\d+)(\D*)$", lambda m: f"{epoch}{m.group(2)}", nombre_mercado)
+
+class PlanificadorRollover:
+    """
+    Prepara en segundo plano el mercado de la siguiente ventana y entrega
+    todo lo necesario para que la nueva sesión empiece a cotizar sin tiempo muerto:
+    IDs del token, historial de calentamiento y parámetros del filtro ya calibrados.
+    """
+
+    def __init__(self, tracker, nombre_mercado, warmup_ticks, duracion_ventana=900, antelacion=60.0, timeout_calibracion=60.0,
+                 opciones_calibracion=None, max_reintentos=30, espera_reintento=2.0):
+        """
+        :param tracker: RastreadorPolymarket compartido (una sola conexión para ambos mercados).
+        :param nombre_mercado: Nombre del mercado de la ventana actual.
+        :param warmup_ticks: Ticks de calentamiento que necesita la sesión.
+        :param duracion_ventana: Duración de cada ventana en segundos.
+        :param antelacion: Segundos antes del fin de la ventana en los que se prepara la siguiente.
+        :param timeout_calibracion: Segundos máximos de la calibración del siguiente mercado.
+        :param opciones_calibracion: Argumentos extra de 'calibrar_kalman' (p.ej. {'multiarranque': True}).
+        :param max_reintentos: Intentos de suscribir el siguiente mercado antes de rendirse (el traspaso
+                               lo intenta entonces de nuevo en el momento).
+        :param espera_reintento: Segundos entre dos intentos.
+        """
+        self.tracker = tracker
+        self.reloj = tracker.reloj
+        self.nombre_actual = nombre_mercado
+        self.warmup_ticks = warmup_ticks
+        self.duracion_ventana = duracion_ventana
+        self.antelacion = antelacion
+        self.timeout_calibracion = timeout_calibracion
+        self.opciones_calibracion = dict(opciones_calibracion or {})
+        self.max_reintentos = max_reintentos
+        self.espera_reintento = espera_reintento
+
+        self._tarea = None
+        self._mercado_listo = asyncio.Event()
+        self._reiniciar_siguiente()
+
+    def _reiniciar_siguiente(self):
+        """Limpia el estado de preparación del siguiente mercado."""
+        self.nombre_preparado = None
+        self.token_siguiente = None
+        self.hist_siguiente = {'wmp': [], 'vol_diff': [], 'kappa': []}
+        # Calibración (Q_diag, R_diag, sigma) lanzada en otro proceso en cuanto hay calentamiento suficiente
+        self._tarea_calibracion = None
+        self._mercado_listo.clear()
+
+    @property
+    def inicio_ventana(self):
+        """
+        Instante (epoch) de inicio de la ventana vigente: floor(ahora / duración) * duración.
+        Si el nombre del mercado apunta a una ventana posterior (mercado aún por abrir), manda el nombre.
+        """
+        ventana_reloj = math.floor(self.reloj.ahora() / self.duracion_ventana) * self.duracion_ventana
+        return max(epoch_de_mercado(self.nombre_actual), ventana_reloj)
+
+    @property
+    def fin_ventana(self):
+        """Instante (epoch) en el que expira la ventana vigente."""
+        return self.inicio_ventana + self.duracion_ventana
+
+    @property
+    def nombre_siguiente(self):
+        return nombre_de_epoch(self.nombre_actual, self.fin_ventana)
+
+    # ==============================================================================
+    # SECCIÓN: PREPARACIÓN EN SEGUNDO PLANO
+    # ==============================================================================
+
+    def iniciar(self, fuente_kappa="libro"):
+        """Lanza la tarea que preparará el siguiente mercado 'antelacion' segundos antes del cierre."""
+        self._tarea = asyncio.create_task(self._preparar_siguiente(fuente_kappa))
+
+    async def _preparar_siguiente(self, fuente_kappa, inmediato=False):
+        """Espera al momento de preparación, suscribe el siguiente mercado y recoge su calentamiento."""
+        if not inmediato:
+            # Los metadatos del siguiente mercado se piden ya (si existen), así la suscripción es inmediata
+            await self.tracker.catalogo.precargar([self.tracker._generar_slug(self.nombre_siguiente)])
+            espera = self.fin_ventana - self.antelacion - self.reloj.ahora()
+            if espera > 0:
+                await self.reloj.dormir(espera)
+
+        # 1. Pre-cargar el evento (gamma API) y suscribir su libro en la conexión actual
+        nombre = self.nombre_siguiente
+        mapa_tokens = None
+        for intento in range(self.max_reintentos):
+            mapa_tokens = await self.tracker.agregar_mercado(nombre)
+            if mapa_tokens is not None: break
+            print(f"[ROLLOVER] Mercado {nombre} aún no disponible. Reintentando ({intento + 1}/{self.max_reintentos})...")
+            await self.reloj.dormir(self.espera_reintento)
+        if mapa_tokens is None:
+            # Sin mercado: 'traspasar' lo intentará de nuevo en el momento (o avisará del fallo)
+            print(f"[ROLLOVER] ⚠️ No se pudo preparar {nombre} tras {self.max_reintentos} intentos.")
+            return
+
+        self.nombre_preparado = nombre
+        self.token_siguiente = list(mapa_tokens.values())[0]
+        self.tracker.registrar_interes(self.token_siguiente)
+        self._mercado_listo.set()
+        print(f"[ROLLOVER] Siguiente mercado preparado: {nombre} (ID: {self.token_siguiente})")
+
+        # 2. Calentamiento: mismos ticks que la Fase 1 (solo cuando cambia el WMP)
+        version_vista = 0
+        ultimo_wmp = None
+        while True:
+            version_vista = await self.tracker.esperar_actualizacion(self.token_siguiente, version_vista)
+            wmp = self.tracker.obtener_wmp_l2(self.token_siguiente)
+            if wmp <= 0 or wmp == ultimo_wmp:
+                continue
+            ultimo_wmp = wmp
+            self.hist_siguiente['wmp'].append(wmp)
+            self.hist_siguiente['vol_diff'].append(self.tracker.obtener_volume_diff(self.token_siguiente))
+            self.hist_siguiente['kappa'].append(self.tracker.obtener_kappa(self.token_siguiente, fuente=fuente_kappa))
+
+            # Conservar solo la ventana de calentamiento más reciente
+            for serie in self.hist_siguiente.values():
+                del serie[:-self.warmup_ticks]
+
+            # 3. Calibrar el filtro una vez (en otro proceso, sin bloquear la lectura del socket).
+            #    El calentamiento se sigue actualizando para entregar los ticks más recientes.
+            if self._tarea_calibracion is None and len(self.hist_siguiente['wmp']) >= self.warmup_ticks:
+                self._tarea_calibracion = asyncio.create_task(calibrar_en_segundo_plano(
+                    list(self.hist_siguiente['wmp']), list(self.hist_siguiente['vol_diff']),
+                    timeout=self.timeout_calibracion, **self.opciones_calibracion))
+
+    # ==============================================================================
+    # SECCIÓN: TRASPASO
+    # ==============================================================================
+
+    async def traspasar(self, fuente_kappa="libro"):
+        """
+        Entrega el siguiente mercado y lo convierte en el actual.
+        Si por algún motivo aún no estaba preparado (o la preparación agotó sus reintentos),
+        lo prepara en ese momento. Después deja de seguir el mercado expirado y programa la
+        preparación del siguiente.
+
+        :return: Diccionario con 'nombre_mercado', 'token', 'precalentamiento' y 'calibracion'.
+        :raises RuntimeError: Si tampoco se consigue preparar en el momento.
+        """
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._preparar_siguiente(fuente_kappa, inmediato=True))
+        listo = asyncio.create_task(self._mercado_listo.wait())
+        await asyncio.wait((listo, self._tarea), return_when=asyncio.FIRST_COMPLETED)
+        listo.cancel()
+        if not self._mercado_listo.is_set():
+            raise RuntimeError(f"No se pudo preparar el mercado {self.nombre_siguiente}") from self._tarea.exception()
+        self._tarea.cancel()
+        try:
+            await self._tarea
+        except asyncio.CancelledError:
+            pass
+
+        # Una calibración ya en marcha termina antes que repetirla desde cero en la sesión
+        calibracion = None
+        if self._tarea_calibracion is not None:
+            try:
+                calibracion = await self._tarea_calibracion
+            except Exception as e:
+                print(f"[ROLLOVER] Calibración previa fallida ({e}). Se calibrará en la sesión.")
+
+        # La siguiente calibración arranca desde esta (ventanas consecutivas son muy parecidas)
+        if calibracion is not None:
+            self.opciones_calibracion['punto_inicial'] = (calibracion[0], calibracion[1])
+
+        traspaso = {
+            'nombre_mercado': self.nombre_preparado,
+            'token': self.token_siguiente,
+            'precalentamiento': self.hist_siguiente,
+            'calibracion': calibracion,
+        }
+
+        # El mercado expirado ya no se sigue (libro y métricas fuera)
+        await self.tracker.quitar_mercado(self.nombre_actual)
+        self.nombre_actual = traspaso['nombre_mercado']
+        self._reiniciar_siguiente()
+        self.iniciar(fuente_kappa)
+        return traspaso
+
+    async def detener(self):
+        """Cancela la preparación en curso."""
+        for tarea in (self._tarea, self._tarea_calibracion):
+            if tarea is None: continue
+            tarea.cancel()
+            try:
+                await tarea
+            except asyncio.CancelledError:
+                pass
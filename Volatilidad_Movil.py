@@ -0,0 +1,137 @@
+import math
+
+#################################################################
+# Volatilidad móvil incremental (sigma de la Fase 3)
+#################################################################
+# Sigma es la desviación típica de los incrementos del precio justo en una
+# ventana móvil. En lugar de recalcularla sobre la ventana entera en cada tick
+# (copiar, diferenciar y reducir), se actualiza en O(1) con cada precio nuevo.
+
+class VolatilidadMovil:
+    """
+    Desviación típica poblacional (como 'np.std') de los incrementos de los
+    últimos 'ventana' precios, con un buffer circular de incrementos y la
+    versión deslizante del algoritmo de Welford (media y M2 incrementales).
+
+    Para que el error de redondeo no se acumule en sesiones de horas, la media
+    y M2 se recalculan desde el buffer cada 'recalcular_cada' actualizaciones
+    (coste amortizado despreciable).
+    """
+
+    def __init__(self, ventana, recalcular_cada=100):
+        """
+        :param ventana: Número de precios de la ventana (como ROLLING_VOL_WINDOW).
+        :param recalcular_cada: Actualizaciones entre dos recálculos exactos.
+        """
+        self.capacidad = max(ventana - 1, 1) # Incrementos que caben en la ventana
+        self.recalcular_cada = recalcular_cada
+
+        self._incrementos = [0.0] * self.capacidad
+        self._posicion = 0 # Próxima casilla a escribir (la más antigua cuando está lleno)
+        self._n = 0
+        self._media = 0.0
+        self._m2 = 0.0
+        self._ultimo_precio = None
+        self._sin_recalcular = 0
+
+    def actualizar(self, precio):
+        """Añade un precio a la ventana y devuelve la sigma actualizada."""
+        if self._ultimo_precio is None:
+            self._ultimo_precio = precio
+            return 0.0
+        x = precio - self._ultimo_precio
+        self._ultimo_precio = precio
+
+        if self._n < self.capacidad:
+            # Ventana aún creciendo: Welford estándar
+            self._n += 1
+            delta = x - self._media
+            self._media += delta / self._n
+            self._m2 += delta * (x - self._media)
+        else:
+            # Ventana llena: entra 'x' y sale el incremento más antiguo
+            y = self._incrementos[self._posicion]
+            media_anterior = self._media
+            self._media += (x - y) / self._n
+            self._m2 += (x - y) * (x - self._media + y - media_anterior)
+
+        self._incrementos[self._posicion] = x
+        self._posicion = (self._posicion + 1) % self.capacidad
+
+        self._sin_recalcular += 1
+        if self._sin_recalcular >= self.recalcular_cada:
+            self._recalcular()
+        return self.sigma
+
+    def _recalcular(self):
+        """Media y M2 exactos (dos pasadas) sobre los incrementos de la ventana."""
+        valores = self._incrementos if self._n == self.capacidad else self._incrementos[:self._n]
+        self._media = math.fsum(valores) / self._n
+        self._m2 = math.fsum((v - self._media) ** 2 for v in valores)
+        self._sin_recalcular = 0
+
+    @property
+    def sigma(self):
+        """Desviación típica de los incrementos (0 si aún no hay ninguno)."""
+        if self._n == 0: return 0.0
+        return math.sqrt(max(self._m2, 0.0) / self._n)
+
+    @property
+    def completa(self):
+        """True cuando la ventana ya tiene todos sus incrementos (antes, sigma sale de muy pocos precios)."""
+        return self._n >= self.capacidad
+
+class VolatilidadEWMA:
+    """
+    Variante exponencial (tipo RiskMetrics): la varianza de los incrementos se
+    actualiza como var = (1 - alfa) * var + alfa * (x - media)^2, con la media
+    también exponencial. Reacciona antes a los cambios de régimen y no necesita buffer.
+    """
+
+    def __init__(self, ventana):
+        """
+        :param ventana: Ventana equivalente; alfa = 2 / (ventana + 1), como un span de pandas.
+        """
+        self.alfa = 2.0 / (ventana + 1)
+        self.capacidad = max(ventana - 1, 1) # Incrementos equivalentes a la ventana
+        self._media = 0.0
+        self._varianza = 0.0
+        self._n = 0
+        self._ultimo_precio = None
+
+    def actualizar(self, precio):
+        """Añade un precio y devuelve la sigma actualizada."""
+        if self._ultimo_precio is None:
+            self._ultimo_precio = precio
+            return 0.0
+        x = precio - self._ultimo_precio
+        self._ultimo_precio = precio
+
+        self._n += 1
+        if self._n == 1:
+            self._media = x
+        else:
+            # Forma incremental estable (West): sin restar cuadrados grandes
+            delta = x - self._media
+            self._media += self.alfa * delta
+            self._varianza = (1 - self.alfa) * (self._varianza + self.alfa * delta * delta)
+        return self.sigma
+
+    @property
+    def sigma(self):
+        return math.sqrt(self._varianza)
+
+    @property
+    def completa(self):
+        """True cuando ya se han visto tantos incrementos como la ventana equivalente."""
+        return self._n >= self.capacidad
+
+def crear_volatilidad(metodo, ventana):
+    """
+    :param metodo: "ventana" (Welford sobre ventana móvil, igual que np.std) o "ewma".
+    """
+    if metodo == "ewma":
+        return VolatilidadEWMA(ventana)
+    if metodo == "ventana":
+        return VolatilidadMovil(ventana)
+    raise ValueError(f"Método de volatilidad desconocido: '{metodo}'")
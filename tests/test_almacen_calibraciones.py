@@ -0,0 +1,69 @@
+import math
+
+from Almacen_Calibraciones import AlmacenCalibraciones
+
+DIA = 86400.0
+T0 = 1_700_000_000.0 - (1_700_000_000.0 % DIA) + 10 * 3600 + 5 * 60 # 10:05 UTC
+
+def guardar(almacen, familia="btc-15m", instante=T0, sigma=0.02, kappa=1.5):
+    almacen.guardar(familia, [1e-5, 1e-3], [1e-4, 1e-2], sigma, kappa=kappa, instante=instante)
+
+def test_caducidad_por_antiguedad():
+    almacen = AlmacenCalibraciones(ruta=None)
+    guardar(almacen)
+
+    assert almacen.obtener("btc-15m", instante=T0 + 1800, max_antiguedad=3600)["sigma"] == 0.02
+    assert almacen.obtener("btc-15m", instante=T0 + 1800, max_antiguedad=600) is None
+    assert almacen.obtener("btc-15m", instante=T0 + 1800, max_antiguedad=None) is not None
+    assert almacen.obtener("eth-15m", instante=T0) is None
+
+def test_franjas_horarias():
+    almacen = AlmacenCalibraciones(ruta=None)
+    guardar(almacen)
+
+    # Otra hora del mismo día: otra franja, aunque esté dentro de la antigüedad
+    assert almacen.franja(T0) == "10"
+    assert almacen.obtener("btc-15m", instante=T0 + 3600, max_antiguedad=None) is None
+    # Misma hora de otro día: misma franja, sujeta solo a la antigüedad
+    assert almacen.obtener("btc-15m", instante=T0 + DIA, max_antiguedad=None)["instante"] == T0
+    assert almacen.obtener("btc-15m", instante=T0 + DIA, max_antiguedad=3600) is None
+
+    # Franjas de 30 minutos: 10:05 y 10:35 ya no comparten franja
+    media_hora = AlmacenCalibraciones(ruta=None, minutos_por_franja=30)
+    guardar(media_hora)
+    assert media_hora.obtener("btc-15m", instante=T0 + 1800) is None
+
+def test_ultima_devuelve_la_mas_reciente_de_cualquier_franja():
+    almacen = AlmacenCalibraciones(ruta=None)
+    guardar(almacen, instante=T0, sigma=0.01)
+    guardar(almacen, instante=T0 + 2 * 3600, sigma=0.03)
+    guardar(almacen, instante=T0 + 3600, sigma=0.02)
+
+    assert almacen.ultima("btc-15m")["sigma"] == 0.03
+    assert almacen.ultima("eth-15m") is None
+
+def test_guardar_sin_kappa_conserva_el_anterior():
+    almacen = AlmacenCalibraciones(ruta=None)
+    guardar(almacen, kappa=1.5)
+    guardar(almacen, instante=T0 + 60, kappa=None, sigma=0.04)
+    guardar(almacen, instante=T0 + 120, kappa=math.nan, sigma=0.05)
+
+    entrada = almacen.obtener("btc-15m", instante=T0 + 120)
+    assert (entrada["sigma"], entrada["kappa"]) == (0.05, 1.5)
+
+def test_persistencia_en_disco(tmp_path):
+    ruta = str(tmp_path / "cache" / "calibraciones.json")
+    guardar(AlmacenCalibraciones(ruta=ruta))
+
+    recargado = AlmacenCalibraciones(ruta=ruta)
+    entrada = recargado.obtener("btc-15m", instante=T0 + 10)
+    assert entrada["Q"] == [1e-5, 1e-3] and entrada["kappa"] == 1.5
+
+def test_fichero_corrupto_empieza_vacio(tmp_path):
+    ruta = tmp_path / "calibraciones.json"
+    ruta.write_text("{no es json", encoding="utf-8")
+    almacen = AlmacenCalibraciones(ruta=str(ruta))
+
+    assert almacen.ultima("btc-15m") is None
+    guardar(almacen)
+    assert AlmacenCalibraciones(ruta=str(ruta)).ultima("btc-15m")["instante"] == T0
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from Avellaneda import AvellanedaStrategy
+
+def estrategia(n_capas=1, ticks_entre_capas=1, perfil_tamano=None):
+    return AvellanedaStrategy(0.1, 900, 100, n_capas=n_capas, ticks_entre_capas=ticks_entre_capas,
+                              perfil_tamano=perfil_tamano)
+
+def test_redondeo_al_tick_sin_mejorar_la_cotizacion():
+    bids, asks, _ = estrategia().calcular_escalera(0.487, 0.5213)
+    assert (bids[0], asks[0]) == (0.48, 0.53)
+
+def test_precios_ya_en_el_tick_no_se_mueven():
+    # 0.29 * 100 = 28.999999999999996 y 0.57 * 100 = 56.99999999999999 en coma flotante
+    bids, asks, _ = estrategia().calcular_escalera(0.29, 0.57)
+    assert (bids[0], asks[0]) == (0.29, 0.57)
+
+def test_capas_separadas_por_ticks_entre_capas():
+    bids, asks, perfil = estrategia(n_capas=3, ticks_entre_capas=2, perfil_tamano=[1.0, 0.5, 0.25]) \
+        .calcular_escalera(0.455, 0.541)
+    np.testing.assert_array_equal(bids, [0.45, 0.43, 0.41])
+    np.testing.assert_array_equal(asks, [0.55, 0.57, 0.59])
+    np.testing.assert_array_equal(perfil, [1.0, 0.5, 0.25])
+
+def test_niveles_fuera_de_rango_y_lados_bloqueados_quedan_a_nan():
+    bids, asks, _ = estrategia(n_capas=3).calcular_escalera(0.025, 0.985)
+    np.testing.assert_array_equal(bids[:2], [0.02, 0.01])
+    np.testing.assert_array_equal(asks[:2], [0.99, np.nan])
+    assert np.isnan(bids[2]) and np.isnan(asks[2])
+
+    bids, asks, _ = estrategia(n_capas=2).calcular_escalera(np.nan, 0.52)
+    assert np.isnan(bids).all()
+    np.testing.assert_array_equal(asks, [0.52, 0.53])
+
+def test_arrays_de_cotizaciones_igual_que_escalares():
+    s = estrategia(n_capas=2, ticks_entre_capas=3)
+    bid_optimo = np.array([0.29, 0.4871, np.nan, 0.0149])
+    ask_optimo = np.array([0.31, 0.5129, 0.60, 0.9951])
+    bids, asks, _ = s.calcular_escalera(bid_optimo, ask_optimo)
+
+    assert bids.shape == asks.shape == (4, 2)
+    for i in range(len(bid_optimo)):
+        bid_i, ask_i, _ = s.calcular_escalera(bid_optimo[i], ask_optimo[i])
+        np.testing.assert_array_equal(bids[i], bid_i)
+        np.testing.assert_array_equal(asks[i], ask_i)
+
+def test_perfil_de_tamano_con_longitud_distinta_lanza_value_error():
+    with pytest.raises(ValueError):
+        estrategia(n_capas=3, perfil_tamano=[1.0, 0.5])
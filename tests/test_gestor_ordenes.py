@@ -0,0 +1,153 @@
+import itertools
+
+import pytest
+
+from Gestor_Ordenes import GestorOrdenes
+
+TOKEN = "token-yes"
+
+class RelojFijo:
+    def __init__(self, instante=0.0):
+        self.instante = instante
+
+    def ahora(self):
+        return self.instante
+
+class WalletFalsa:
+    """CLOB en memoria con la interfaz de 'GestorWallet' que usa 'GestorOrdenes'."""
+
+    def __init__(self):
+        self.abiertas = {} # order_id -> orden como la devuelve el CLOB
+        self.llamadas = [] # (metodo, argumentos)
+        self.lotes_enviados = 0
+        self.no_cancelables = set() # IDs que el servidor no confirma al cancelar
+        self._ids = itertools.count(1)
+
+    def colocar_ordenes(self, ordenes):
+        self.llamadas.append(("colocar", list(ordenes)))
+        self.lotes_enviados += 1
+        ids = []
+        for token_id, precio, cantidad, lado in ordenes:
+            order_id = f"o{next(self._ids)}"
+            # El constructor de órdenes del CLOB trunca el tamaño a 2 decimales
+            self.abiertas[order_id] = {"id": order_id, "asset_id": token_id, "side": lado, "price": str(precio),
+                                       "original_size": str(GestorOrdenes.tamano(cantidad)), "size_matched": "0"}
+            ids.append(order_id)
+        return ids
+
+    def cancelar_ordenes(self, ids):
+        self.llamadas.append(("cancelar", list(ids)))
+        canceladas = [i for i in ids if i in self.abiertas and i not in self.no_cancelables]
+        for order_id in canceladas:
+            del self.abiertas[order_id]
+        return {"canceled": canceladas, "not_canceled": {i: "error" for i in ids if i not in canceladas}}
+
+    def obtener_ordenes_abiertas(self, token_id):
+        self.llamadas.append(("abiertas", token_id))
+        return [dict(o) for o in self.abiertas.values() if o["asset_id"] == token_id]
+
+    def cancelar_todas_las_ordenes(self):
+        self.llamadas.append(("cancelar_todas", None))
+        self.abiertas.clear()
+        return True
+
+    def ejecutar(self, precio, lado, cantidad):
+        """Simula que el mercado ejecuta parte de nuestra orden a 'precio'."""
+        for orden in self.abiertas.values():
+            if orden["side"] == lado and float(orden["price"]) == precio:
+                orden["size_matched"] = str(float(orden["size_matched"]) + cantidad)
+
+def crear_gestor(**kwargs):
+    wallet, reloj = WalletFalsa(), RelojFijo()
+    gestor = GestorOrdenes(wallet, intervalo_reconciliacion=30.0, reloj=reloj, **kwargs)
+    return gestor, wallet, reloj
+
+ESCALERA = [("BUY", 0.48, 10.0), ("BUY", 0.47, 10.0), ("SELL", 0.52, 10.0), ("SELL", 0.53, 10.0)]
+
+def test_recotizacion_identica_no_hace_llamadas():
+    gestor, wallet, _ = crear_gestor()
+    ids = gestor.sincronizar(TOKEN, ESCALERA)
+    assert all(ids) and len(wallet.abiertas) == 4
+
+    wallet.llamadas.clear()
+    # Mismos niveles tras redondear al tick
+    assert gestor.sincronizar(TOKEN, [(lado, precio + 0.001, c) for lado, precio, c in ESCALERA]) == [None] * 4
+    assert wallet.llamadas == []
+    assert gestor.estadisticas["sin_cambios"] == 1
+
+def test_solo_se_cancela_y_coloca_lo_que_cambia():
+    gestor, wallet, _ = crear_gestor()
+    gestor.sincronizar(TOKEN, ESCALERA)
+    ids_previos = {o["price"]: o["id"] for o in wallet.abiertas.values()}
+    wallet.llamadas.clear()
+
+    nueva = [("BUY", 0.49, 10.0), ("BUY", 0.48, 10.0), ("SELL", 0.52, 10.0), ("SELL", 0.53, 10.0)]
+    ids = gestor.sincronizar(TOKEN, nueva)
+
+    assert wallet.llamadas[0] == ("cancelar", [ids_previos["0.47"]])
+    assert [o[:2] for o in wallet.llamadas[1][1]] == [(TOKEN, 0.49)]
+    assert len(wallet.llamadas) == 2
+    assert ids[0] is not None and ids[1:] == [None] * 3
+    assert sorted(float(o["price"]) for o in wallet.abiertas.values()) == [0.48, 0.49, 0.52, 0.53]
+
+def test_tamanos_truncados_como_el_clob_no_se_reponen():
+    gestor, wallet, reloj = crear_gestor()
+    objetivo = [("BUY", 0.48, 12.3456), ("SELL", 0.52, 7.999)]
+    gestor.sincronizar(TOKEN, objetivo)
+    assert sorted(o["original_size"] for o in wallet.abiertas.values()) == ["12.34", "7.99"]
+
+    # La reconciliación lee del CLOB los tamaños truncados: deben seguir coincidiendo
+    reloj.instante += 60
+    wallet.llamadas.clear()
+    gestor.sincronizar(TOKEN, objetivo)
+    assert [metodo for metodo, _ in wallet.llamadas] == ["abiertas"]
+    assert gestor.estadisticas["ordenes_conservadas"] == 2
+
+def test_orden_ejecutada_en_parte_se_conserva_por_defecto():
+    gestor, wallet, _ = crear_gestor()
+    gestor.sincronizar(TOKEN, ESCALERA)
+    id_parcial = next(o["id"] for o in wallet.abiertas.values() if o["price"] == "0.48")
+    wallet.ejecutar(0.48, "BUY", 4.0)
+    gestor.registrar_trades(TOKEN, [0.48])
+    wallet.llamadas.clear()
+
+    gestor.sincronizar(TOKEN, ESCALERA)
+    assert [metodo for metodo, _ in wallet.llamadas] == ["abiertas"] # Solo la reconciliación
+    assert id_parcial in wallet.abiertas
+    assert gestor.estadisticas["parciales_conservadas"] == 1
+    assert gestor.estadisticas["invalidaciones_por_trade"] == 1
+
+def test_orden_ejecutada_en_parte_se_repone_si_se_pide():
+    gestor, wallet, _ = crear_gestor(reponer_parciales=True)
+    gestor.sincronizar(TOKEN, ESCALERA)
+    id_parcial = next(o["id"] for o in wallet.abiertas.values() if o["price"] == "0.48")
+    wallet.ejecutar(0.48, "BUY", 4.0)
+    gestor.registrar_trades(TOKEN, [0.48])
+    wallet.llamadas.clear()
+
+    ids = gestor.sincronizar(TOKEN, ESCALERA)
+    assert [metodo for metodo, _ in wallet.llamadas] == ["abiertas", "cancelar", "colocar"]
+    assert wallet.llamadas[1][1] == [id_parcial]
+    assert wallet.llamadas[2][1] == [(TOKEN, 0.48, 10.0, "BUY")]
+    assert ids[0] is not None and ids[1:] == [None] * 3
+
+def test_cancelacion_no_confirmada_no_duplica_y_fuerza_reconciliacion():
+    gestor, wallet, _ = crear_gestor()
+    gestor.sincronizar(TOKEN, ESCALERA)
+    id_047 = next(o["id"] for o in wallet.abiertas.values() if o["price"] == "0.47")
+    wallet.no_cancelables.add(id_047)
+
+    sin_047 = [nivel for nivel in ESCALERA if nivel[1] != 0.47]
+    gestor.sincronizar(TOKEN, sin_047)
+    # Si ahora se vuelve a pedir 0.47, la orden que no se canceló se conserva en vez de duplicarse
+    wallet.llamadas.clear()
+    gestor.sincronizar(TOKEN, ESCALERA)
+    assert wallet.llamadas[0][0] == "abiertas"
+    assert all(metodo != "colocar" for metodo, _ in wallet.llamadas)
+    assert sum(1 for o in wallet.abiertas.values() if o["price"] == "0.47") == 1
+
+@pytest.mark.parametrize("tick, precio, esperado", [(0.01, 0.4849, 0.48), (0.001, 0.4849, 0.485)])
+def test_precios_se_comparan_redondeados_al_tick(tick, precio, esperado):
+    gestor, wallet, _ = crear_gestor(tick=tick)
+    gestor.sincronizar(TOKEN, [("buy", precio, 5.0)])
+    assert wallet.llamadas[-1] == ("colocar", [(TOKEN, esperado, 5.0, "BUY")])
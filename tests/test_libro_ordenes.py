@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from Libro_Ordenes import LibroOrdenes
+
+def arrays(niveles):
+    """[(precio, tamaño), ...] -> (precios, tamaños) como los deja 'Decodificador_WS'."""
+    precios, sizes = zip(*niveles) if niveles else ((), ())
+    return np.array(precios, dtype=float), np.array(sizes, dtype=float)
+
+def libro_con(bids, asks):
+    libro = LibroOrdenes()
+    libro.aplicar_snapshot(*arrays(bids), *arrays(asks))
+    return libro
+
+def test_cambios_insertan_modifican_y_borran_niveles_en_orden():
+    libro = libro_con([(0.48, 10.0), (0.49, 20.0)], [(0.51, 30.0), (0.53, 5.0)])
+
+    libro.aplicar_cambio("BUY", 0.47, 7.0)   # Nivel nuevo por debajo
+    libro.aplicar_cambio("SELL", 0.52, 8.0)  # Nivel nuevo entre dos existentes
+    libro.aplicar_cambio("buy", 0.49, 25.0)  # Cambio de tamaño (lado en minúsculas)
+    libro.aplicar_cambio("SELL", 0.51, 0.0)  # Tamaño 0: el nivel desaparece
+
+    assert libro.precios_bid == [0.47, 0.48, 0.49]
+    assert libro.precios_ask == [0.52, 0.53]
+    assert libro.niveles_bid == {0.47: 7.0, 0.48: 10.0, 0.49: 25.0}
+    assert (libro.mejor_bid, libro.mejor_ask) == (0.49, 0.52)
+    assert len(libro) == 5
+
+def test_borrar_un_nivel_inexistente_no_cambia_el_libro():
+    libro = libro_con([(0.49, 20.0)], [(0.51, 30.0)])
+    libro.aplicar_cambio("BUY", 0.40, 0.0)
+    assert libro.precios_bid == [0.49]
+    assert libro.vol_total_bid == 20.0
+
+def test_lado_desconocido_lanza_value_error():
+    libro = libro_con([(0.49, 20.0)], [(0.51, 30.0)])
+    with pytest.raises(ValueError):
+        libro.aplicar_cambio("HOLD", 0.50, 1.0)
+    assert libro.niveles_bid == {0.49: 20.0} and libro.niveles_ask == {0.51: 30.0}
+
+def test_snapshot_sustituye_el_libro_entero():
+    libro = libro_con([(0.48, 10.0), (0.49, 20.0)], [(0.51, 30.0)])
+    libro.aplicar_cambio("BUY", 0.45, 1.0)
+    libro.aplicar_snapshot(*arrays([(0.30, 1.0)]), *arrays([(0.70, 2.0), (0.60, 3.0)]))
+
+    assert libro.precios_bid == [0.30]
+    assert libro.precios_ask == [0.60, 0.70]
+    assert (libro.vol_total_bid, libro.vol_total_ask) == (1.0, 5.0)
+
+def test_lado_vacio_da_mejor_precio_cero():
+    libro = libro_con([(0.49, 20.0)], [])
+    assert libro.mejor_ask == 0
+    libro.aplicar_cambio("BUY", 0.49, 0.0)
+    assert libro.mejor_bid == 0 and len(libro) == 0
+
+def test_totales_incrementales_coinciden_con_la_suma_y_se_resincronizan():
+    rng = np.random.default_rng(7)
+    libro = libro_con([(0.40, 1.0)], [(0.60, 1.0)])
+    n_cambios = 2 * LibroOrdenes.RESYNC_CAMBIOS + 17
+
+    for i in range(1, n_cambios + 1):
+        lado = "BUY" if rng.random() < 0.5 else "SELL"
+        precio = round((rng.integers(1, 50) if lado == "BUY" else rng.integers(51, 100)) / 100, 2)
+        size = 0.0 if rng.random() < 0.3 else round(float(rng.uniform(0.1, 500.0)), 2)
+        libro.aplicar_cambio(lado, precio, size)
+
+        # Entre resincronizaciones solo puede haber deriva de redondeo
+        assert libro.vol_total_bid == pytest.approx(sum(libro.niveles_bid.values()), abs=1e-7)
+        assert libro.vol_total_ask == pytest.approx(sum(libro.niveles_ask.values()), abs=1e-7)
+        assert libro._cambios_desde_resync == i % LibroOrdenes.RESYNC_CAMBIOS
+        if i % LibroOrdenes.RESYNC_CAMBIOS == 0:
+            # Justo tras resincronizar, los totales son la suma exacta
+            assert libro.vol_total_bid == sum(libro.niveles_bid.values())
+            assert libro.vol_total_ask == sum(libro.niveles_ask.values())
+
+def test_snapshot_recalcula_totales_y_reinicia_el_contador():
+    libro = libro_con([(0.49, 20.0)], [(0.51, 30.0)])
+    for _ in range(10):
+        libro.aplicar_cambio("BUY", 0.48, 1.5)
+    libro.aplicar_snapshot(*arrays([(0.45, 2.0), (0.46, 0.0), (0.45, 3.0)]), *arrays([(0.55, 4.0)]))
+
+    # Nivel con tamaño 0 descartado y, ante precios repetidos, gana el último
+    assert libro.niveles_bid == {0.45: 3.0}
+    assert (libro.vol_total_bid, libro.vol_total_ask) == (3.0, 4.0)
+    assert libro._cambios_desde_resync == 0
@@ -0,0 +1,42 @@
+import json
+
+from Rastreador_Polymarket import RastreadorPolymarket
+
+def snapshot(asset_id, bid, ask):
+    return json.dumps({"event_type": "book", "asset_id": asset_id,
+                       "bids": [{"price": f"{bid:.2f}", "size": "100"}],
+                       "asks": [{"price": f"{ask:.2f}", "size": "100"}]})
+
+def trade(asset_id, precio):
+    return json.dumps({"event_type": "last_trade_price", "asset_id": asset_id, "price": f"{precio:.2f}",
+                       "timestamp": "1765197000000"})
+
+class RegistroTrades:
+    """Sustituto del estimador de Kappa por trades que guarda con qué mid se midió cada trade."""
+    def __init__(self):
+        self.trades = []
+
+    def registrar_trade(self, precio, mid, instante):
+        self.trades.append((precio, mid))
+
+def crear_tracker():
+    return RastreadorPolymarket("prueba", catalogo=object()) # Sin red: el catálogo no se consulta
+
+def test_trades_del_lote_se_miden_con_el_libro_del_lote():
+    tracker = crear_tracker()
+    tracker._procesar_lote([snapshot("111", 0.49, 0.51)])
+    registro = tracker.estimadores_kappa_trades["111"] = RegistroTrades()
+
+    # El trade llega en el mismo lote que un snapshot que mueve el libro
+    tracker._procesar_lote([trade("111", 0.60), snapshot("111", 0.59, 0.61)])
+    assert registro.trades == [(0.60, 0.60)]
+
+def test_precios_trade_solo_de_activos_seguidos_y_se_consumen():
+    tracker = crear_tracker()
+    tracker.registrar_interes("111")
+    tracker._procesar_lote([snapshot("111", 0.49, 0.51), snapshot("222", 0.49, 0.51),
+                            trade("111", 0.50), trade("111", 0.51), trade("222", 0.50)])
+
+    assert tracker.consumir_precios_trade("111") == {0.50, 0.51}
+    assert tracker.consumir_precios_trade("111") == set()
+    assert tracker.consumir_precios_trade("222") == set()
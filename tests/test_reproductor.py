@@ -0,0 +1,69 @@
+import json
+import random
+import asyncio
+
+from Grabador_Mercado import GrabadorMercado
+from Rastreador_Polymarket import RastreadorPolymarket
+from Reproductor_Mercado import ReproductorMercado, catalogo_de_captura
+
+INICIO_NS = 1765197000 * 10**9
+EVENTO = {"title": "prueba", "markets": [{"question": "q", "clobTokenIds": json.dumps(["111", "222"]),
+                                          "outcomes": json.dumps(["Up", "Down"])}]}
+
+def crear_captura(directorio, huecos=(6.0, 6.0), frames_por_tramo=20):
+    """Tramos de frames cada 50 ms separados por 'huecos' segundos sin mensajes."""
+    grabador = GrabadorMercado(str(directorio))
+    grabador.registrar_mercado("btc-updown-15m-1765197000", EVENTO)
+    rnd = random.Random(1)
+    t, mid, lote = INICIO_NS, 0.5, []
+    for tramo in range(len(huecos) + 1):
+        if tramo: t += int(huecos[tramo - 1] * 1e9)
+        for i in range(frames_por_tramo):
+            t += 50_000_000
+            if i % 10 == 0:
+                mid = round(mid + rnd.choice([-0.01, 0.0, 0.01]), 2)
+                niveles = lambda signo: [{"price": f"{mid + signo * 0.01 * k:.2f}", "size": f"{rnd.uniform(10, 500):.2f}"}
+                                         for k in range(1, 6)]
+                frame = {"event_type": "book", "asset_id": "111", "bids": niveles(-1), "asks": niveles(1)}
+            else:
+                lado = rnd.choice(["BUY", "SELL"])
+                precio = mid - 0.01 * rnd.randint(1, 5) if lado == "BUY" else mid + 0.01 * rnd.randint(1, 5)
+                frame = {"event_type": "price_change", "price_changes": [
+                    {"asset_id": "111", "price": f"{precio:.2f}", "size": f"{rnd.uniform(0, 500):.2f}", "side": lado}]}
+            lote.append((t, json.dumps(frame)))
+    grabador._escribir_lote(lote)
+    return (t - INICIO_NS) / 1e9
+
+async def reproducir(directorio, velocidad, duracion):
+    """
+    Reproduce la captura con un consumidor como el del modo por eventos (espera de
+    cambios con timeout virtual) y devuelve lo que ve: (instante virtual, versión, WMP).
+    """
+    tracker = RastreadorPolymarket("btc updown 15m 1765197000", catalogo=catalogo_de_captura(str(directorio)))
+    assert tracker.obtener_datos_evento() and tracker.seleccionar_sub_mercado(0)
+    ReproductorMercado(str(directorio), velocidad=velocidad).instalar(tracker)
+    tracker.registrar_interes("Up")
+    escucha = asyncio.create_task(tracker.conectar_y_escuchar())
+
+    await tracker.esperar_libro("Up")
+    reloj, fin = tracker.reloj, tracker.reloj.ahora() + duracion
+    vistos, version = [], 0
+    while reloj.ahora() < fin:
+        nueva = await tracker.esperar_actualizacion("Up", version, timeout=1.0)
+        if nueva is not None: version = nueva
+        vistos.append((reloj.ahora(), nueva, tracker.obtener_wmp_l2("Up")))
+        await reloj.dormir(0.2)
+
+    await tracker.detener_escucha()
+    escucha.cancel()
+    await asyncio.gather(escucha, return_exceptions=True)
+    return vistos, tracker.estadisticas["frames_recibidos"]
+
+def test_reproduccion_igual_a_cualquier_velocidad(tmp_path):
+    # Huecos de más de 5 s: a velocidad real superan el timeout de lectura del rastreador
+    duracion = crear_captura(tmp_path, huecos=(6.0, 6.0))
+    rapida = asyncio.run(asyncio.wait_for(reproducir(tmp_path, None, duracion), 30))
+    tiempo_real = asyncio.run(asyncio.wait_for(reproducir(tmp_path, 1.0, duracion), duracion + 30))
+
+    assert rapida[1] == 60
+    assert tiempo_real == rapida